@@ -1,25 +1,59 @@
 # File: agentic-document-extraction/app/agent_loop.py
-from document_processor import process_document
-from extraction import classify_document, extract_fields, validate_extraction
+from document_processor import process_document, processing_version
+from extraction import classify_document, classify_and_extract, extract_fields_with_votes, extract_fields_chunked, validate_extraction
+from extraction import FIELD_MAPPING, classification_version, field_version, text_version
+from artifact_store import ArtifactStore, DocumentArtifacts, file_hash, ARTIFACT_STORE_ENABLED
+from layout_templates import LayoutTemplate, load_templates, TEMPLATES_ENABLED
+from chunking import CHUNKED_EXTRACTION_MIN_CHARS
 from confidence import ConfidenceCalculator
-from schemas import ExtractionResult, FieldSchema, QAReport
-from typing import List
-
-def agentic_extraction(file_path: str, fields: List[str] = None, auto_detect: bool = True) -> ExtractionResult:
-    processed_doc = process_document(file_path)
-    doc_type = "invoice"
-    if auto_detect:
-        doc_type = classify_document(processed_doc.text)
-    extracted_data = extract_fields(processed_doc.text, doc_type, fields)
+from schemas import ExtractionResult, FieldSchema, QAReport, ProcessedDocument
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from telemetry import TELEMETRY_TIMINGS
+import telemetry
+from scheduler import document_deadline, DOCUMENT_DEADLINE_S
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# "separate": classify, then self-consistency extraction (up to 1 + N calls).
+# "combined": one structured-output call returns both the type and the fields.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "separate").lower()
+
+artifact_store = ArtifactStore() if ARTIFACT_STORE_ENABLED else None
+template_index = load_templates() if TEMPLATES_ENABLED else None
+
+def classify_stage(processed_doc: ProcessedDocument, auto_detect: bool = True,
+                   mode: str = PIPELINE_MODE) -> Optional[str]:
+    """Document type from the classifier, or None when extraction will decide it."""
+    if mode == "combined":
+        return None if auto_detect else "invoice"
+    return classify_document(processed_doc.text) if auto_detect else "invoice"
+
+def extract_stage(processed_doc: ProcessedDocument, doc_type: Optional[str], fields: List[str] = None,
+                  mode: str = PIPELINE_MODE) -> Tuple[str, Dict[str, str], Dict[str, float]]:
+    if mode == "combined":
+        doc_type, extracted_data = classify_and_extract(processed_doc.text, fields, doc_type)
+        return doc_type, extracted_data, {}
+    if len(processed_doc.text) > CHUNKED_EXTRACTION_MIN_CHARS:
+        extracted_data, agreement = extract_fields_chunked(processed_doc.pages, doc_type, fields)
+    else:
+        extracted_data, agreement = extract_fields_with_votes(processed_doc.text, doc_type, fields)
+    return doc_type, extracted_data, agreement
+
+def build_result(processed_doc: ProcessedDocument, doc_type: str, extracted_data: Dict[str, str],
+                 agreement: Dict[str, float]) -> ExtractionResult:
     validation_report = validate_extraction(extracted_data, processed_doc.text)
     field_schemas = []
     for name, value in extracted_data.items():
-        confidence = ConfidenceCalculator.field_confidence(name, value, processed_doc)
-        field_schemas.append(FieldSchema(
-            name=name,
-            value=value,
-            confidence=confidence
-        ))
+        confidence = ConfidenceCalculator.field_confidence(
+            name, value, processed_doc, agreement.get(name)
+        )
+        field = FieldSchema(name=name, value=value, confidence=confidence)
+        location = processed_doc.locate_value(value)
+        if location is not None:
+            field.source = {"page": location["page"], "bbox": location["bbox"]}
+        field_schemas.append(field)
     overall_confidence = ConfidenceCalculator.overall_confidence(field_schemas, validation_report)
     return ExtractionResult(
         doc_type=doc_type,
@@ -27,3 +61,189 @@ def agentic_extraction(file_path: str, fields: List[str] = None, auto_detect: bo
         overall_confidence=overall_confidence,
         qa=validation_report
     )
+
+def open_artifacts(file_path: str, reuse: bool = True) -> Optional[DocumentArtifacts]:
+    """The stored artifacts of a file, or fresh ones to fill when ``reuse`` is off; None without a store."""
+    if artifact_store is None:
+        return None
+    return artifact_store.load(file_path) if reuse else DocumentArtifacts(file_hash(file_path))
+
+def save_artifacts(file_path: str, artifacts: Optional[DocumentArtifacts]) -> None:
+    if artifacts is None:
+        return
+    try:
+        artifact_store.save(artifacts)
+    except OSError as e:
+        # Never let a failed save replace the result or the original error.
+        logger.warning(f"Could not save artifacts for {file_path}: {e}")
+
+def process_stage(file_path: str, artifacts: Optional[DocumentArtifacts],
+                  on_page: Optional[Callable[[dict], None]] = None) -> ProcessedDocument:
+    """OCR, or the stored processed document when the processing settings are unchanged."""
+    with telemetry.span("process_document"):
+        version = processing_version()
+        processed_doc = artifacts.document(version, file_path) if artifacts is not None else None
+        if processed_doc is None:
+            processed_doc = process_document(file_path, on_page=on_page)
+            if artifacts is not None:
+                artifacts.set_document(version, processed_doc)
+        elif on_page is not None:
+            for page in processed_doc.pages:
+                on_page(page)
+    return processed_doc
+
+def detect_stage(processed_doc: ProcessedDocument, auto_detect: bool, mode: str,
+                 artifacts: Optional[DocumentArtifacts]) -> Tuple[Optional[LayoutTemplate], Optional[str]]:
+    """The matching layout template, if any, and the document type (None when extraction decides it)."""
+    with telemetry.span("template_match"):
+        template = _template_stage(processed_doc, auto_detect)
+    with telemetry.span("classify"):
+        # A known layout already tells the document type.
+        doc_type = template.doc_type if template is not None else _classify_stage(
+            processed_doc, auto_detect, mode, artifacts
+        )
+    return template, doc_type
+
+def fields_stage(processed_doc: ProcessedDocument, doc_type: Optional[str], template: Optional[LayoutTemplate],
+                 fields: List[str], auto_detect: bool, mode: str, artifacts: Optional[DocumentArtifacts]
+                 ) -> Tuple[str, Dict[str, str], Dict[str, float], Dict[str, str]]:
+    """(doc_type, values, agreement, values read from the template) of the requested fields."""
+    with telemetry.span("extract"):
+        requested = fields or FIELD_MAPPING.get(doc_type, [])
+        templated = _template_values(template, processed_doc, requested) if template is not None else {}
+        remaining = [field for field in requested if field not in templated] if templated else fields
+        extracted_data, agreement = {}, {}
+        if not templated or remaining:
+            if artifacts is None:
+                doc_type, extracted_data, agreement = extract_stage(processed_doc, doc_type, remaining, mode)
+            else:
+                doc_type, extracted_data, agreement = _extract_incremental(
+                    processed_doc, doc_type, remaining, mode, artifacts, auto_detect
+                )
+        if templated:
+            extracted_data = {field: templated.get(field, extracted_data.get(field, "")) for field in requested}
+            agreement = dict(agreement, **{field: 1.0 for field in templated})
+    return doc_type, extracted_data, agreement, templated
+
+def result_stage(processed_doc: ProcessedDocument, doc_type: str, extracted_data: Dict[str, str],
+                 agreement: Dict[str, float], templated: Dict[str, str]) -> ExtractionResult:
+    """Validate and score the values, then learn the layout from the result."""
+    with telemetry.span("validate"):
+        result = build_result(processed_doc, doc_type, extracted_data, agreement)
+    _learn_template(processed_doc, result, templated)
+    return result
+
+def _classify_stage(processed_doc: ProcessedDocument, auto_detect: bool, mode: str,
+                    artifacts: Optional[DocumentArtifacts]) -> Optional[str]:
+    if artifacts is None or not auto_detect:
+        return classify_stage(processed_doc, auto_detect, mode)
+    version = classification_version(mode, text_version(processed_doc.text))
+    doc_type = artifacts.doc_type(version)
+    if doc_type is None:
+        doc_type = classify_stage(processed_doc, auto_detect, mode)
+        if doc_type is not None:
+            artifacts.set_doc_type(version, doc_type)
+    return doc_type
+
+def _extract_incremental(processed_doc: ProcessedDocument, doc_type: Optional[str], fields: List[str],
+                         mode: str, artifacts: DocumentArtifacts,
+                         auto_detect: bool) -> Tuple[str, Dict[str, str], Dict[str, float]]:
+    """Extract only the requested fields that have no stored answer for the current prompt and OCR text."""
+    source = text_version(processed_doc.text)
+    if doc_type is None:
+        # Combined mode decides the type in the extraction call itself.
+        doc_type, extracted_data, agreement = extract_stage(processed_doc, None, fields, mode)
+        if auto_detect:
+            artifacts.set_doc_type(classification_version(mode, source), doc_type)
+        versions = {f: field_version(f, mode, source) for f in extracted_data}
+        artifacts.set_fields(doc_type, versions, extracted_data, agreement)
+        return doc_type, extracted_data, agreement
+    requested = fields or FIELD_MAPPING.get(doc_type, [])
+    versions = {field: field_version(field, mode, source) for field in requested}
+    stored = artifacts.fields(doc_type, versions)
+    missing = [field for field in requested if field not in stored]
+    if missing:
+        _, values, new_agreement = extract_stage(processed_doc, doc_type, missing, mode)
+        artifacts.set_fields(doc_type, versions, values, new_agreement)
+        stored.update({field: (values.get(field, ""), new_agreement.get(field)) for field in missing})
+    extracted_data = {field: stored[field][0] for field in requested}
+    agreement = {field: stored[field][1] for field in requested if stored[field][1] is not None}
+    return doc_type, extracted_data, agreement
+
+def _template_stage(processed_doc: ProcessedDocument, auto_detect: bool) -> Optional[LayoutTemplate]:
+    if template_index is None:
+        return None
+    template = template_index.match(processed_doc)
+    if template is not None and not auto_detect and template.doc_type != "invoice":
+        return None
+    return template
+
+def _template_values(template: LayoutTemplate, processed_doc: ProcessedDocument,
+                     requested: List[str]) -> Dict[str, str]:
+    """Fields read from the template's regions; a value failing its format rule goes to the LLM instead."""
+    values = template.read(processed_doc, requested)
+    report = validate_extraction(values, processed_doc.text)
+    valid = {
+        field: value for field, value in values.items()
+        if not any(rule.endswith(f"_{field}") for rule in report.failed_rules)
+    }
+    telemetry.count("template_fields_total", len(valid), result="read")
+    telemetry.count("template_fields_total", len(requested) - len(valid), result="llm")
+    return valid
+
+def _learn_template(processed_doc: ProcessedDocument, result: ExtractionResult, templated: Dict[str, str]) -> None:
+    if template_index is None:
+        return
+    try:
+        # Values read from a template are not evidence for it.
+        template_index.learn(processed_doc, result, exclude=templated)
+    except Exception as e:
+        logger.warning(f"Layout template learning failed: {e}")
+
+def _run_stages(file_path: str, fields: List[str], auto_detect: bool, mode: str,
+                on_event: Optional[Callable[[str, Any], None]], reuse: bool) -> ExtractionResult:
+    emit = on_event or (lambda kind, payload: None)
+    on_page = (lambda page: on_event("page", page)) if on_event else None
+    artifacts = open_artifacts(file_path, reuse)
+    try:
+        with document_deadline(DOCUMENT_DEADLINE_S), telemetry.span("total"):
+            emit("stage", "ocr")
+            processed_doc = process_stage(file_path, artifacts, on_page)
+            emit("stage", "classify")
+            template, doc_type = detect_stage(processed_doc, auto_detect, mode, artifacts)
+            emit("stage", "extract")
+            doc_type, extracted_data, agreement, templated = fields_stage(
+                processed_doc, doc_type, template, fields, auto_detect, mode, artifacts
+            )
+            emit("stage", "validate")
+            return result_stage(processed_doc, doc_type, extracted_data, agreement, templated)
+    finally:
+        # Whatever finished is kept, so a run that failed during extraction
+        # does not have to OCR the document again.
+        save_artifacts(file_path, artifacts)
+
+def agentic_extraction(file_path: str, fields: List[str] = None, auto_detect: bool = True,
+                       mode: str = PIPELINE_MODE, timings: bool = TELEMETRY_TIMINGS,
+                       on_event: Optional[Callable[[str, Any], None]] = None,
+                       reuse: bool = True) -> ExtractionResult:
+    """Run the full pipeline on one file.
+
+    With the artifact store enabled, the processed document, its type and each
+    field's answer are stored under the file's hash; a later call on the same
+    file only runs the stages whose output is missing or was produced by an
+    older prompt version. ``reuse=False`` recomputes everything and overwrites
+    the stored artifacts.
+
+    When the first page matches a learned layout template, its type is taken
+    from the template and fields with a confirmed region are read from the
+    page; only the rest go to the LLM. Every result is fed back to learn templates.
+
+    ``on_event(kind, payload)`` receives ("stage", name) as each stage starts and
+    ("page", page dict) as each page finishes OCR.
+    """
+    if not timings:
+        return _run_stages(file_path, fields, auto_detect, mode, on_event, reuse)
+    with telemetry.trace() as trace:
+        result = _run_stages(file_path, fields, auto_detect, mode, on_event, reuse)
+    result.timings = trace.summary()
+    return result
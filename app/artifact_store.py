@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+from schemas import ProcessedDocument
+from page_source import PageHandle, PDF_DPI
+from word_table import WordTable
+from file_store import atomic_write_json, file_lock
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_STORE_ENABLED = os.getenv("ARTIFACT_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Under the project root, like the scheduler DB, so the UI and batch runs share one store.
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", os.path.join(_ROOT, ".cache", "artifacts"))
+ARTIFACT_STORE_MAX_DOCUMENTS = int(os.getenv("ARTIFACT_STORE_MAX_DOCUMENTS", "1000"))
+
+_HASH_CHUNK = 1024 * 1024
+# Eviction trims to this share of the document cap, so the directory is not rescanned on every save.
+EVICT_TO = 0.9
+
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dump_document(doc: ProcessedDocument) -> Dict:
+    return {
+        "text": doc.text,
+        "pages": [dict(page, words=page["words"].to_json()) for page in doc.pages],
+        "gemini_output": doc.gemini_output,
+    }
+
+
+def _load_document(data: Dict, file_path: str) -> ProcessedDocument:
+    pages = [dict(page, words=WordTable.from_json(page["words"])) for page in data["pages"]]
+    confidences = np.concatenate(
+        [page["words"].confidences for page in pages] or [np.zeros(0, dtype=np.float32)]
+    )
+    return ProcessedDocument(
+        text=data["text"],
+        pages=pages,
+        images=[PageHandle(file_path, page["page"], PDF_DPI) for page in pages],
+        ocr_confidences=confidences,
+        gemini_output=data.get("gemini_output", "")
+    )
+
+
+def _count(stage: str, hit: bool) -> None:
+    telemetry.count("artifact_store_requests_total", stage=stage, result="hit" if hit else "miss")
+
+
+class DocumentArtifacts:
+    """Everything derived from one file: the processed document, its type and each field's answer.
+
+    Every artifact carries the version of the settings or prompt that produced
+    it; an artifact whose version no longer matches is treated as missing.
+    """
+
+    def __init__(self, key: str, data: Optional[Dict] = None):
+        self.key = key
+        self.data = data or {}
+        self.data.setdefault("fields", {})
+        self.changed = False
+
+    def document(self, version: str, file_path: str) -> Optional[ProcessedDocument]:
+        stored = self.data.get("document")
+        doc = None
+        if stored is not None and stored.get("version") == version:
+            try:
+                doc = _load_document(stored, file_path)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable stored document {self.key}: {e}")
+        _count("document", doc is not None)
+        return doc
+
+    def set_document(self, version: str, doc: ProcessedDocument) -> None:
+        self.data["document"] = dict(_dump_document(doc), version=version)
+        self.changed = True
+
+    def doc_type(self, version: str) -> Optional[str]:
+        stored = self.data.get("classification")
+        doc_type = stored["doc_type"] if stored and stored.get("version") == version else None
+        _count("classification", doc_type is not None)
+        return doc_type
+
+    def set_doc_type(self, version: str, doc_type: str) -> None:
+        self.data["classification"] = {"version": version, "doc_type": doc_type}
+        self.changed = True
+
+    def fields(self, doc_type: str, versions: Dict[str, str]) -> Dict[str, Tuple[str, Optional[float]]]:
+        """Stored (value, agreement) of the requested fields whose version matches."""
+        stored = self.data["fields"].get(doc_type, {})
+        found = {}
+        for field, version in versions.items():
+            entry = stored.get(field)
+            if entry is not None and entry.get("version") == version:
+                found[field] = (entry["value"], entry.get("agreement"))
+            _count("field", field in found)
+        return found
+
+    def set_fields(self, doc_type: str, versions: Dict[str, str], values: Dict[str, str],
+                   agreement: Dict[str, float]) -> None:
+        stored = self.data["fields"].setdefault(doc_type, {})
+        for field, value in values.items():
+            stored[field] = {"version": versions[field], "value": value, "agreement": agreement.get(field)}
+        self.changed = True
+
+
+class ArtifactStore:
+    """On-disk JSON store of DocumentArtifacts keyed by file hash, evicting the least recently used documents.
+
+    The directory is the only index, so every process sharing it sees the
+    documents the others stored. Loading touches a file's mtime; eviction
+    removes the oldest files.
+    """
+
+    def __init__(self, directory: str = ARTIFACT_STORE_DIR, max_documents: int = ARTIFACT_STORE_MAX_DOCUMENTS):
+        self.directory = directory
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        # Documents on disk at the last scan plus this process's saves since; None until first saved to.
+        self._documents: Optional[int] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def load(self, file_path: str) -> DocumentArtifacts:
+        key = file_hash(file_path)
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return DocumentArtifacts(key)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable artifacts {key}: {e}")
+            return DocumentArtifacts(key)
+        return DocumentArtifacts(key, data)
+
+    def save(self, artifacts: DocumentArtifacts) -> None:
+        """Write artifacts back, merged with anything another run stored for the same file meanwhile."""
+        if not artifacts.changed:
+            return
+        path = self._path(artifacts.key)
+        # The file lock covers other worker processes saving the same document.
+        with self._lock, file_lock(os.path.join(self.directory, ".lock")):
+            data = artifacts.data
+            new = not os.path.exists(path)
+            if not new:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = _merge(json.load(f), data)
+                except (OSError, ValueError):
+                    pass
+            atomic_write_json(path, data)
+            if self._documents is None or (new and self._documents + 1 > self.max_documents):
+                self._evict()
+            elif new:
+                self._documents += 1
+        artifacts.changed = False
+
+    def _evict(self) -> None:
+        """Count the documents on disk and remove the least recently used ones while over the cap."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    found.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+        found.sort()
+        keep = max(1, self.max_documents)
+        if len(found) > keep:
+            keep = max(1, int(keep * EVICT_TO))
+            for _, path in found[:len(found) - keep]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._documents = min(len(found), keep)
+
+
+def _merge(stored: Dict, update: Dict) -> Dict:
+    merged = dict(stored, **{k: v for k, v in update.items() if k != "fields"})
+    fields = {doc_type: dict(values) for doc_type, values in stored.get("fields", {}).items()}
+    for doc_type, values in update.get("fields", {}).items():
+        fields.setdefault(doc_type, {}).update(values)
+    merged["fields"] = fields
+    return merged
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from agent_loop import (open_artifacts, save_artifacts, process_stage, detect_stage, fields_stage, result_stage,
+                        PIPELINE_MODE)
+from schemas import ExtractionResult
+from scheduler import document_deadline, DeadlineExceeded, DOCUMENT_DEADLINE_S
+from telemetry import TELEMETRY_TIMINGS
+import telemetry
+
+OCR_STAGE_CONCURRENCY = int(os.getenv("OCR_STAGE_CONCURRENCY", "2"))
+CLASSIFY_STAGE_CONCURRENCY = int(os.getenv("CLASSIFY_STAGE_CONCURRENCY", "4"))
+EXTRACT_STAGE_CONCURRENCY = int(os.getenv("EXTRACT_STAGE_CONCURRENCY", "4"))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class _Item:
+    __slots__ = ("job", "artifacts", "processed_doc", "template", "doc_type", "result", "error", "deadline",
+                 "trace", "started")
+
+    def __init__(self, job: Dict, timings: bool):
+        self.job = job
+        self.artifacts = None
+        self.processed_doc = None
+        self.template = None
+        self.doc_type = None
+        self.result = None
+        self.error = None
+        self.deadline = None
+        self.trace = telemetry.Trace() if timings else None
+        self.started = None
+
+    @property
+    def auto_detect(self) -> bool:
+        auto_detect = self.job.get("auto_detect")
+        return True if auto_detect is None else bool(auto_detect)
+
+
+async def _stage(worker, inbox: asyncio.Queue, outbox: asyncio.Queue, concurrency: int) -> None:
+    """Run `concurrency` workers that move items from inbox to outbox.
+
+    Items that already failed upstream are forwarded untouched. The bounded
+    outbox blocks fast stages once the slower downstream stage falls behind.
+    """
+    async def run() -> None:
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                # Let sibling workers see the sentinel too.
+                await inbox.put(_DONE)
+                return
+            if item.error is None:
+                try:
+                    await worker(item)
+                except Exception as e:
+                    item.error = e
+            await outbox.put(item)
+
+    await asyncio.gather(*(run() for _ in range(max(1, concurrency))))
+    await outbox.put(_DONE)
+
+
+async def run_pipeline(jobs: Iterable[Dict], mode: str = PIPELINE_MODE,
+                       ocr_concurrency: int = OCR_STAGE_CONCURRENCY,
+                       classify_concurrency: int = CLASSIFY_STAGE_CONCURRENCY,
+                       extract_concurrency: int = EXTRACT_STAGE_CONCURRENCY,
+                       queue_size: int = STAGE_QUEUE_SIZE, timings: bool = TELEMETRY_TIMINGS,
+                       reuse: bool = True
+                       ) -> AsyncIterator[Tuple[Dict, Optional[ExtractionResult], Optional[Exception]]]:
+    """Stream documents through OCR -> classify -> extract with the stages overlapping.
+
+    Each job is a dict with ``file_path`` and optional ``fields``/``auto_detect``.
+    Yields ``(job, result, error)`` in completion order. The stages are the ones
+    agentic_extraction runs, so the artifact store, layout templates, document
+    deadline and timings apply the same way.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=ocr_concurrency + classify_concurrency + extract_concurrency)
+
+    def run_with_deadline(item: _Item, fn, *args):
+        # The deadline starts with OCR and spans all stages of the document,
+        # including time spent queued between them.
+        with telemetry.trace(item.trace) if item.trace is not None else nullcontext():
+            if DOCUMENT_DEADLINE_S <= 0:
+                return fn(*args)
+            remaining = item.deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{item.job['file_path']}: document deadline exceeded")
+            with document_deadline(remaining):
+                return fn(*args)
+
+    def call(item: _Item, fn, *args):
+        return loop.run_in_executor(executor, run_with_deadline, item, fn, *args)
+
+    async def ocr(item: _Item) -> None:
+        item.started = time.perf_counter()
+        item.deadline = time.monotonic() + DOCUMENT_DEADLINE_S
+        item.artifacts = await call(item, open_artifacts, item.job["file_path"], reuse)
+        item.processed_doc = await call(item, process_stage, item.job["file_path"], item.artifacts)
+
+    async def classify(item: _Item) -> None:
+        item.template, item.doc_type = await call(
+            item, detect_stage, item.processed_doc, item.auto_detect, mode, item.artifacts
+        )
+
+    async def extract(item: _Item) -> None:
+        doc_type, extracted_data, agreement, templated = await call(
+            item, fields_stage, item.processed_doc, item.doc_type, item.template, item.job.get("fields"),
+            item.auto_detect, mode, item.artifacts
+        )
+        # Validation and value location run off the event loop as well.
+        item.result = await call(item, result_stage, item.processed_doc, doc_type, extracted_data, agreement,
+                                 templated)
+        # The OCR artifacts are no longer needed once the result is built.
+        item.processed_doc = None
+
+    async def finish(item: _Item) -> None:
+        # Whatever finished is kept, as in agentic_extraction, even when a later stage failed.
+        await loop.run_in_executor(executor, save_artifacts, item.job["file_path"], item.artifacts)
+        item.artifacts = None
+        if item.started is not None:
+            with telemetry.trace(item.trace) if item.trace is not None else nullcontext():
+                telemetry.record("total", time.perf_counter() - item.started)
+        if item.result is not None and item.trace is not None:
+            item.result.timings = item.trace.summary()
+
+    inbox = asyncio.Queue(maxsize=queue_size)
+    ocr_out = asyncio.Queue(maxsize=queue_size)
+    classify_out = asyncio.Queue(maxsize=queue_size)
+    results = asyncio.Queue(maxsize=queue_size)
+
+    async def feed() -> None:
+        for job in jobs:
+            await inbox.put(_Item(job, timings))
+        await inbox.put(_DONE)
+
+    tasks = [
+        asyncio.create_task(feed()),
+        asyncio.create_task(_stage(ocr, inbox, ocr_out, ocr_concurrency)),
+        asyncio.create_task(_stage(classify, ocr_out, classify_out, classify_concurrency)),
+        asyncio.create_task(_stage(extract, classify_out, results, extract_concurrency)),
+    ]
+    try:
+        while True:
+            item = await results.get()
+            if item is _DONE:
+                break
+            await finish(item)
+            yield item.job, item.result, item.error
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_many(jobs: Iterable[Dict], **kwargs) -> List[Tuple[Dict, Optional[ExtractionResult], Optional[Exception]]]:
+    """Synchronous helper that drains run_pipeline into a list."""
+    async def collect():
+        return [entry async for entry in run_pipeline(jobs, **kwargs)]
+    return asyncio.run(collect())
@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import (FIRST_COMPLETED, BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait)
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from utils.constants import SUPPORTED_FILE_TYPES
+from clients import load_env
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 25
+
+
+def iter_directory(directory: str) -> Iterator[Dict]:
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_FILE_TYPES:
+                path = os.path.join(root, name)
+                yield {"id": os.path.relpath(path, directory), "file_path": path}
+
+
+def iter_manifest(manifest_path: str) -> Iterator[Dict]:
+    """Read jobs from a JSONL manifest; relative paths resolve against the manifest's directory."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            file_path = record.get("file_path") or record.get("path")
+            if not file_path:
+                logger.warning(f"Manifest line {line_no} has no file_path; skipping")
+                continue
+            if not os.path.isabs(file_path):
+                file_path = os.path.join(base, file_path)
+            yield {
+                "id": str(record.get("id") or record.get("request_id") or file_path),
+                "file_path": file_path,
+                "fields": record.get("fields"),
+                "auto_detect": record.get("auto_detect"),
+            }
+
+
+def iter_jobs(source: str) -> Iterator[Dict]:
+    if os.path.isdir(source):
+        return iter_directory(source)
+    return iter_manifest(source)
+
+
+def completed_ids(out_path: str) -> Set[str]:
+    """Ids already written successfully to the output sink, used as the resume checkpoint."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from an interrupted run; the document is redone.
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def make_record(job: Dict, result=None, error: Optional[BaseException] = None, elapsed: Optional[float] = None) -> Dict:
+    record = {"id": job["id"], "file_path": job["file_path"]}
+    if error is None:
+        record.update(status="ok", result=result.model_dump(mode="json"))
+    else:
+        record.update(status="error", error=f"{type(error).__name__}: {error}")
+    if elapsed is not None:
+        record["elapsed_s"] = round(elapsed, 3)
+    return record
+
+
+def run_job(job: Dict) -> Dict:
+    """Process one document; failures are reported in the record instead of raised."""
+    start = time.perf_counter()
+    try:
+        from agent_loop import agentic_extraction
+
+        auto_detect = job.get("auto_detect")
+        result = agentic_extraction(
+            job["file_path"],
+            job.get("fields"),
+            True if auto_detect is None else bool(auto_detect)
+        )
+        return make_record(job, result, elapsed=time.perf_counter() - start)
+    except Exception as e:
+        return make_record(job, error=e, elapsed=time.perf_counter() - start)
+
+
+def run_pipelined(jobs: Iterable[Dict], write: Callable[[Dict], None]) -> None:
+    """Run the jobs through the async pipeline, whose stages overlap across documents."""
+    from async_pipeline import run_pipeline
+
+    async def consume() -> None:
+        async for job, result, error in run_pipeline(jobs):
+            write(make_record(job, result, error))
+    asyncio.run(consume())
+
+
+def _run_pool(pool_cls, workers: int, jobs: Iterable[Dict], write: Callable[[Dict], None],
+              flush: Callable[[], None]) -> None:
+    max_pending = max(1, workers) * 2
+    pool = pool_cls(max_workers=max(1, workers))
+    pending: Dict[Future, Dict] = {}
+
+    def drain(return_when) -> None:
+        nonlocal pool
+        finished, _ = wait(pending, return_when=return_when)
+        broken = False
+        while finished:
+            for future in finished:
+                job = pending.pop(future)
+                try:
+                    record = future.result()
+                except BrokenExecutor as e:
+                    # A worker died, e.g. killed for memory; the documents in flight are failed, not the batch.
+                    broken = True
+                    record = make_record(job, error=e)
+                write(record)
+            # A broken pool fails everything still in flight; record those before replacing it.
+            finished = wait(pending)[0] if broken else set()
+        flush()
+        if broken:
+            logger.warning("Worker pool broke; starting a new one")
+            pool.shutdown(wait=False)
+            pool = pool_cls(max_workers=max(1, workers))
+
+    try:
+        for job in jobs:
+            pending[pool.submit(run_job, job)] = job
+            if len(pending) >= max_pending:
+                drain(FIRST_COMPLETED)
+        while pending:
+            drain(FIRST_COMPLETED)
+    finally:
+        pool.shutdown()
+
+
+def run_batch(source: str, out_path: str, workers: int = 4, executor: str = "process",
+              fields: Optional[List[str]] = None, auto_detect: Optional[bool] = None,
+              resume: bool = True) -> Dict:
+    skip = completed_ids(out_path) if resume else set()
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    stats = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    def report() -> None:
+        done = stats["ok"] + stats["error"]
+        minutes = (time.perf_counter() - start) / 60
+        rate = done / minutes if minutes > 0 else 0.0
+        logger.info(f"{done} processed ({stats['error']} failed, {stats['skipped']} skipped), {rate:.1f} docs/min")
+
+    def write(record: Dict) -> None:
+        sink.write(json.dumps(record) + "\n")
+        stats[record["status"]] += 1
+        if record["status"] == "error":
+            logger.warning(f"{record['id']}: {record['error']}")
+        if (stats["ok"] + stats["error"]) % PROGRESS_EVERY == 0:
+            report()
+
+    def jobs() -> Iterator[Dict]:
+        for job in iter_jobs(source):
+            if job["id"] in skip:
+                stats["skipped"] += 1
+                continue
+            if fields and not job.get("fields"):
+                job["fields"] = fields
+            if auto_detect is not None and job.get("auto_detect") is None:
+                job["auto_detect"] = auto_detect
+            yield job
+
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as sink:
+        if executor == "async":
+            def write_flushed(record: Dict) -> None:
+                write(record)
+                sink.flush()
+            run_pipelined(jobs(), write_flushed)
+        else:
+            _run_pool(pool_cls, workers, jobs(), write, sink.flush)
+
+    elapsed = time.perf_counter() - start
+    done = stats["ok"] + stats["error"]
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["docs_per_min"] = round(done / (elapsed / 60), 2) if elapsed > 0 else 0.0
+    if executor != "process":
+        # Worker processes keep their own totals; thread and async runs upload from this one.
+        from preprocessing import upload_stats
+
+        stats["ocr_uploads"] = upload_stats.summary()
+    report()
+    return stats
+
+
+def revalidate(out_path: str) -> Dict:
+    """Re-run QA on every successful record of a sink in place, in one batched pass, e.g. after the rules changed."""
+    from confidence import ConfidenceCalculator
+    from schemas import FieldSchema
+    from validation import validate_batch
+
+    with open(out_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    ok = [record for record in records if record.get("status") == "ok"]
+    reports = validate_batch([{field["name"]: field["value"] for field in r["result"]["fields"]} for r in ok])
+    failed: Dict[str, int] = {}
+    for record, report in zip(ok, reports):
+        fields = [FieldSchema(**field) for field in record["result"]["fields"]]
+        record["result"]["qa"] = report.model_dump(mode="json")
+        record["result"]["overall_confidence"] = ConfidenceCalculator.overall_confidence(fields, report)
+        for rule in report.failed_rules:
+            failed[rule] = failed.get(rule, 0) + 1
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as sink:
+        for record in records:
+            sink.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, out_path)
+    return {
+        "revalidated": len(ok),
+        "with_failures": sum(1 for report in reports if report.failed_rules),
+        "failed_rules": dict(sorted(failed.items(), key=lambda item: -item[1])),
+    }
+
+
+def export(out_path: str, export_path: str) -> Dict:
+    from results_export import export_results, iter_sink
+
+    return export_results(iter_sink(out_path), export_path)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch document extraction to JSONL")
+    parser.add_argument("source", nargs="?", help="Directory of documents or JSONL manifest with file_path per line")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL sink, one ExtractionResult per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--executor", choices=["process", "thread", "async"],
+                        help="Worker pool (default: process, or thread with --metrics); async overlaps the"
+                             " OCR, classify and extract stages across documents instead of using --workers")
+    parser.add_argument("--fields", help="Comma separated fields for documents that do not set their own")
+    parser.add_argument("--no-auto-detect", action="store_true", help="Treat documents as invoices")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the sink instead of resuming")
+    parser.add_argument("--metrics", help="Write Prometheus metrics here when done; needs thread workers")
+    parser.add_argument("--revalidate", action="store_true", help="Re-run QA on the results in --out instead of extracting")
+    parser.add_argument("--export", help="Also write the results in --out as a columnar field table (.parquet or .arrow)"
+                                         " plus a per-field summary table next to it")
+    args = parser.parse_args(argv)
+    if not args.source and not args.revalidate:
+        parser.error("source is required unless --revalidate is given")
+    if args.metrics and args.executor == "process":
+        # Counters would stay in the worker processes and the metrics file would be empty.
+        parser.error("--metrics requires --executor thread")
+    executor = args.executor or ("thread" if args.metrics else "process")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_env()
+    if args.revalidate:
+        stats = revalidate(args.out)
+        if args.export:
+            stats["export"] = export(args.out, args.export)
+        print(json.dumps(stats))
+        return 0
+    if args.metrics:
+        import telemetry
+
+        telemetry.TELEMETRY_ENABLED = True
+    fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
+    stats = run_batch(
+        args.source,
+        args.out,
+        workers=args.workers,
+        executor=executor,
+        fields=fields,
+        auto_detect=False if args.no_auto_detect else None,
+        resume=not args.no_resume
+    )
+    if args.metrics:
+        telemetry.write_prometheus(args.metrics)
+    if args.export:
+        stats["export"] = export(args.out, args.export)
+    print(json.dumps(stats))
+    return 1 if stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
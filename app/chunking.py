@@ -0,0 +1,118 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "6000"))
+# Documents longer than this go through map-reduce extraction instead of one prompt.
+CHUNKED_EXTRACTION_MIN_CHARS = int(os.getenv("CHUNKED_EXTRACTION_MIN_CHARS", "16000"))
+EXTRACTION_TOKEN_BUDGET = int(os.getenv("EXTRACTION_TOKEN_BUDGET", "8000"))
+CHARS_PER_TOKEN = 4
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+# Words that tend to label a field's value on the page but do not appear in its name.
+FIELD_TERM_SYNONYMS = {
+    "amount": ["total", "due", "balance", "sum"],
+    "charges": ["total", "charge", "amount"],
+    "date": ["dated", "on"],
+    "number": ["no", "num", "id"],
+    "vendor": ["from", "seller", "supplier"],
+    "customer": ["bill", "to", "buyer"],
+    "dob": ["birth", "born"],
+    "prescriber": ["dr", "physician", "doctor"],
+    "medication": ["rx", "mg", "tablet", "capsule"],
+    "refills": ["refill"],
+    "line": ["qty", "quantity", "description", "price"],
+}
+
+
+class Chunk(NamedTuple):
+    pages: List[int]
+    text: str
+
+
+def split_pages(pages: List[Dict], max_chars: int = CHUNK_MAX_CHARS) -> List[Chunk]:
+    """Pack consecutive pages into chunks of at most max_chars, splitting oversize pages on paragraphs."""
+    pieces = []
+    for page in pages:
+        if page.get("skipped") or page.get("duplicate_of"):
+            continue
+        text = page.get("text", "")
+        if len(text) <= max_chars:
+            pieces.append((page["page"], text))
+            continue
+        buffer = ""
+        for paragraph in re.split(r"\n\s*\n", text):
+            if buffer and len(buffer) + len(paragraph) + 2 > max_chars:
+                pieces.append((page["page"], buffer))
+                buffer = ""
+            while len(paragraph) > max_chars:
+                pieces.append((page["page"], paragraph[:max_chars]))
+                paragraph = paragraph[max_chars:]
+            buffer = f"{buffer}\n\n{paragraph}" if buffer else paragraph
+        if buffer:
+            pieces.append((page["page"], buffer))
+    chunks = []
+    current_pages, current_text = [], ""
+    for page_number, text in pieces:
+        if current_text and len(current_text) + len(text) + 2 > max_chars:
+            chunks.append(Chunk(current_pages, current_text))
+            current_pages, current_text = [], ""
+        if page_number not in current_pages:
+            current_pages.append(page_number)
+        current_text = f"{current_text}\n\n{text}" if current_text else text
+    if current_text:
+        chunks.append(Chunk(current_pages, current_text))
+    return chunks
+
+
+def field_terms(field: str) -> List[str]:
+    parts = field.lower().split("_")
+    terms = list(parts)
+    for part in parts:
+        terms.extend(FIELD_TERM_SYNONYMS.get(part, []))
+    return list(dict.fromkeys(terms))
+
+
+def score_chunks(chunks: List[Chunk], fields: List[str]) -> List[float]:
+    """Relevance of each chunk to the requested fields (sum over fields of the best term TF-IDF)."""
+    counts = [Counter(_TOKEN_RE.findall(chunk.text.lower())) for chunk in chunks]
+    n = len(chunks)
+    scores = []
+    terms_by_field = {field: field_terms(field) for field in fields}
+    idf = {}
+    for terms in terms_by_field.values():
+        for term in terms:
+            if term not in idf:
+                df = sum(1 for c in counts if term in c)
+                idf[term] = math.log((n + 1) / (df + 0.5))
+    for i, c in enumerate(counts):
+        length = max(1, sum(c.values()))
+        score = 0.0
+        for terms in terms_by_field.values():
+            score += max((math.sqrt(c[t] / length) * idf[t] for t in terms), default=0.0)
+        # Headers and totals usually sit on the first and last pages.
+        if i == 0 or i == n - 1:
+            score *= 1.2
+        scores.append(score)
+    return scores
+
+
+def select_chunks(chunks: List[Chunk], fields: List[str],
+                  token_budget: int = EXTRACTION_TOKEN_BUDGET) -> List[Chunk]:
+    """Highest-scoring chunks that fit the token budget, returned in document order."""
+    if not chunks:
+        return []
+    scores = score_chunks(chunks, fields)
+    budget = token_budget * CHARS_PER_TOKEN
+    chosen = []
+    used = 0
+    for i in sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True):
+        size = len(chunks[i].text)
+        if chosen and used + size > budget:
+            continue
+        chosen.append(i)
+        used += size
+    return [chunks[i] for i in sorted(chosen)]
@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from utils.constants import DEFAULT_FIELDS
+
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.9"))
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", os.path.join(".cache", "classifier.json"))
+CLASSIFIER_MAX_CHARS = 3000
+# Caps how many matched features count as independent evidence, so a long page
+# of generic words cannot push the posterior to 1.0 on its own.
+EVIDENCE_CAP = 20
+SEED_WEIGHT = 2.0
+
+SEED_KEYWORDS = {
+    "invoice": [
+        "invoice", "tax invoice", "bill to", "ship to", "subtotal", "qty", "unit price",
+        "amount due", "balance due", "gst", "vat", "purchase order", "remit to", "payment terms"
+    ],
+    "medical_bill": [
+        "patient", "statement", "diagnosis", "procedure", "cpt", "icd", "insurance", "claim",
+        "hospital", "admission", "discharge", "copay", "deductible", "provider", "charges"
+    ],
+    "prescription": [
+        "rx", "prescription", "sig", "tablet", "capsule", "mg", "dispense", "refill", "refills",
+        "take", "daily", "pharmacy", "prescriber", "dea", "substitution"
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]*")
+
+
+def featurize(text: str) -> Counter:
+    """Unigram and bigram counts over lower-cased alphanumeric tokens."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+class KeywordClassifier:
+    """Multinomial naive Bayes over keyword/n-gram features."""
+
+    def __init__(self, labels: List[str], alpha: float = 1.0):
+        self.labels = list(labels)
+        self.alpha = alpha
+        self.counts: Dict[str, Counter] = {label: Counter() for label in self.labels}
+        self.doc_counts: Dict[str, float] = {label: 0.0 for label in self.labels}
+        self._log_probs = None
+
+    @classmethod
+    def seeded(cls, field_mapping: Dict[str, List[str]] = None) -> "KeywordClassifier":
+        """Build a classifier whose vocabulary comes from the known field names per type."""
+        field_mapping = field_mapping or {}
+        labels = list(dict.fromkeys(list(DEFAULT_FIELDS) + list(field_mapping)))
+        model = cls(labels)
+        for label in labels:
+            phrases = DEFAULT_FIELDS.get(label, []) + field_mapping.get(label, [])
+            vocab = Counter()
+            for phrase in phrases + SEED_KEYWORDS.get(label, []):
+                vocab.update(featurize(phrase.replace("_", " ")))
+            model.update(vocab, label, SEED_WEIGHT)
+        return model
+
+    def update(self, features: Counter, label: str, weight: float = 1.0) -> None:
+        if label not in self.counts:
+            self.labels.append(label)
+            self.counts[label] = Counter()
+            self.doc_counts[label] = 0.0
+        for feature, count in features.items():
+            self.counts[label][feature] += count * weight
+        self.doc_counts[label] += weight
+        self._log_probs = None
+
+    def fit(self, texts: Iterable[str], labels: Iterable[str]) -> "KeywordClassifier":
+        for text, label in zip(texts, labels):
+            self.update(featurize(text[:CLASSIFIER_MAX_CHARS]), label)
+        return self
+
+    def _compile(self) -> None:
+        vocab = set()
+        for counts in self.counts.values():
+            vocab.update(counts)
+        vocab_size = max(1, len(vocab))
+        total_docs = sum(self.doc_counts.values()) or 1.0
+        self._vocab = vocab
+        self._log_probs = {}
+        self._log_unseen = {}
+        self._log_priors = {}
+        for label in self.labels:
+            counts = self.counts[label]
+            denom = sum(counts.values()) + self.alpha * vocab_size
+            self._log_probs[label] = {f: math.log((c + self.alpha) / denom) for f, c in counts.items()}
+            self._log_unseen[label] = math.log(self.alpha / denom)
+            self._log_priors[label] = math.log((self.doc_counts[label] + 1) / (total_docs + len(self.labels)))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Return the most likely label and its posterior probability."""
+        if self._log_probs is None:
+            self._compile()
+        features = [(f, c) for f, c in featurize(text[:CLASSIFIER_MAX_CHARS]).items() if f in self._vocab]
+        matched = sum(c for _, c in features)
+        if not matched:
+            return self.labels[0], 0.0
+        scale = min(matched, EVIDENCE_CAP) / matched
+        scores = {}
+        for label in self.labels:
+            log_probs = self._log_probs[label]
+            unseen = self._log_unseen[label]
+            likelihood = sum(log_probs.get(f, unseen) * c for f, c in features)
+            scores[label] = self._log_priors[label] + likelihood * scale
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+    def to_dict(self) -> dict:
+        return {
+            "labels": self.labels,
+            "alpha": self.alpha,
+            "counts": {label: dict(counts) for label, counts in self.counts.items()},
+            "doc_counts": self.doc_counts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KeywordClassifier":
+        model = cls(data["labels"], data.get("alpha", 1.0))
+        model.counts = {label: Counter(counts) for label, counts in data["counts"].items()}
+        model.doc_counts = dict(data["doc_counts"])
+        return model
+
+    def save(self, path: str = CLASSIFIER_MODEL_PATH) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+
+def load_classifier(field_mapping: Dict[str, List[str]] = None,
+                    path: str = CLASSIFIER_MODEL_PATH) -> KeywordClassifier:
+    """Load a trained model from disk, falling back to the vocabulary-seeded one."""
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return KeywordClassifier.from_dict(json.load(f))
+    return KeywordClassifier.seeded(field_mapping)
+
+
+def train_from_jsonl(history_path: str, field_mapping: Dict[str, List[str]] = None,
+                     text_key: str = "text", label_key: str = "doc_type") -> KeywordClassifier:
+    """Fit the seeded classifier on labeled history, one JSON object per line."""
+    model = KeywordClassifier.seeded(field_mapping)
+    texts, labels = [], []
+    with open(history_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get(text_key) and record.get(label_key):
+                texts.append(record[text_key])
+                labels.append(record[label_key])
+    return model.fit(texts, labels)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the local document classifier from labeled history")
+    parser.add_argument("history", help="JSONL file with 'text' and 'doc_type' keys")
+    parser.add_argument("--out", default=CLASSIFIER_MODEL_PATH)
+    args = parser.parse_args()
+    train_from_jsonl(args.history).save(args.out)
+    print(f"Saved classifier to {args.out}")
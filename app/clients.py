@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "0"))
+
+_lock = threading.RLock()
+_instances: Dict[Hashable, Any] = {}
+_env_loaded = False
+_chat_factory: Optional[Callable[..., Any]] = None
+
+
+def load_env() -> None:
+    """Load .env once; entry points call this before importing modules that read config."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            import dotenv
+
+            dotenv.load_dotenv()
+            _env_loaded = True
+
+
+def require_env(name: str) -> str:
+    load_env()
+    value = os.getenv(name)
+    if not value:
+        raise EnvironmentError(f"{name} environment variable is not set")
+    return value
+
+
+def shared(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """Instance registered under key, constructed by factory on first request."""
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = _instances[key] = factory()
+    return instance
+
+
+def reset() -> None:
+    """Drop every shared client; the next request builds fresh ones."""
+    with _lock:
+        _instances.clear()
+
+
+def set_chat_model_factory(factory: Optional[Callable[..., Any]]) -> None:
+    """Substitute the chat model class (called with model= and temperature=), e.g. a local or fake model."""
+    global _chat_factory
+    with _lock:
+        _chat_factory = factory
+        for key in [k for k in _instances if isinstance(k, tuple) and k[0] == "chat"]:
+            del _instances[key]
+
+
+def _build_chat_model(model: str, temperature: float):
+    if _chat_factory is not None:
+        return _chat_factory(model=model, temperature=temperature)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # Retries and backoff belong to the ProviderScheduler, which needs to see every 429/5xx.
+    return ChatGoogleGenerativeAI(
+        model=model, temperature=temperature, google_api_key=require_env("GOOGLE_API_KEY"), max_retries=0
+    )
+
+
+def chat_model(model: str, temperature: float):
+    """One LangChain chat model per (model, temperature), shared across threads."""
+    return shared(("chat", model, temperature), lambda: _build_chat_model(model, temperature))
+
+
+def genai_client():
+    def build():
+        from google import genai
+
+        return genai.Client(api_key=require_env("GOOGLE_API_KEY"))
+    return shared("genai", build)
+
+
+def http_session():
+    """requests.Session with a connection pool sized for the OCR workers."""
+    def build():
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                              max_retries=HTTP_MAX_RETRIES)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    return shared("http", build)
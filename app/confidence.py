@@ -1,21 +1,35 @@
 # File: agentic-document-extraction/app/confidence.py
 from schemas import ProcessedDocument, FieldSchema, QAReport
 from typing import List, Dict
-import datetime
-import re
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from utils.helpers import validate_date, validate_amount
 
 class ConfidenceCalculator:
     @staticmethod
-    def field_confidence(field_name: str, field_value: str, doc: ProcessedDocument) -> float:
+    def field_confidence(field_name: str, field_value: str, doc: ProcessedDocument,
+                         agreement: float = None) -> float:
         presence_conf = 1.0 if field_value else 0.2
         length_conf = min(1.0, len(field_value) / 20)
-        ocr_conf = doc.get_word_confidence([0, 0, 0, 0])
+        location = doc.locate_value(field_value)
+        if location is not None:
+            ocr_conf = location["confidence"]
+        else:
+            ocr_conf = doc.get_word_confidence([0, 0, 0, 0])
         type_boost = 1.0
         if "date" in field_name and validate_date(field_value):
             type_boost = 1.2
         elif ("amount" in field_name or "total" in field_name) and validate_amount(field_value):
             type_boost = 1.2
         confidence = (presence_conf * 0.4) + (length_conf * 0.3) + (ocr_conf * 0.3)
+        if agreement is not None:
+            # Share of self-consistency samples that produced this value.
+            confidence *= 0.7 + (0.3 * agreement)
         return min(1.0, confidence * type_boost)
 
     @staticmethod
@@ -38,13 +52,3 @@ class ConfidenceCalculator:
         if qa.failed_rules:
             validation_factor = max(0.7, 1.0 - (len(qa.failed_rules) * 0.1))
         return min(1.0, base_confidence * validation_factor)
-
-def validate_date(date_str: str) -> bool:
-    try:
-        datetime.datetime.strptime(date_str, "%Y-%m-%d")
-        return True
-    except:
-        return False
-
-def validate_amount(amount_str: str) -> bool:
-    return bool(re.match(r"^\$?\d{1,3}(?:,\d{3})*(?:\.\d{2})?$", amount_str))
@@ -1,142 +1,277 @@
 # File: agentic-document-extraction/app/document_processor.py
-import pdf2image
-import requests
 import io
 import os
 from PIL import Image
 from schemas import ProcessedDocument
-import time
+from scheduler import ProviderScheduler, DeadlineExceeded
+from chunking import CHARS_PER_TOKEN
+from page_source import PageHandle, iter_page_images, PDF_DPI, PDF_RENDER_WINDOW
+from ocr_cache import OCRCache, OCR_CACHE_ENABLED
+from llm_cache import fingerprint
+from ocr_engines import OCREngine, RemoteOCREngine, build_engine, OCR_ENGINE, DEFAULT_WORD_CONFIDENCE
+from word_table import WordTable
+from page_filter import PageFilter, PAGE_FILTER_ENABLED, BLANK_INK_RATIO, SPARSE_INK_RATIO, BLANK, DUPLICATE, SPARSE
+from preprocessing import prepare_for_upload, map_overlay_to_source, OCR_PREPROCESS_ENABLED, PREPROCESS_PARAMS
+import telemetry
+import clients
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import threading
 import logging
-import dotenv
-from google import genai
-from google.genai import types
-
-dotenv.load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-OCR_API_KEY = os.getenv("OCR_API_KEY")
-if not OCR_API_KEY:
-    raise EnvironmentError("OCR_API_KEY environment variable is not set")
+OCR_API_ENDPOINT = os.getenv("OCR_API_ENDPOINT", "https://api.ocr.space/parse/image")
 
-OCR_API_ENDPOINT = "https://api.ocr.space/parse/image"
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+OCR_REQUESTS_PER_SECOND = float(os.getenv("OCR_REQUESTS_PER_SECOND", "1"))
+OCR_BURST = int(os.getenv("OCR_BURST", "1"))
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", str(OCR_MAX_WORKERS)))
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise EnvironmentError("GOOGLE_API_KEY environment variable is not set")
+# The free-form Gemini pass is not used by the extraction pipeline; enable it only
+# when the raw key-value output is wanted alongside the structured result.
+GEMINI_PASS_ENABLED = os.getenv("GEMINI_PASS_ENABLED", "false").lower() in ("1", "true", "yes")
 
-gemini_client = genai.Client(api_key=GOOGLE_API_KEY)
+# Keep the raw OCR overlay JSON on every page; only useful when debugging layout issues.
+OCR_KEEP_LAYOUT = os.getenv("OCR_KEEP_LAYOUT", "false").lower() in ("1", "true", "yes")
 
+OCR_REQUEST_PARAMS = {
+    "language": "eng",
+    "isOverlayRequired": "true",
+    "detectOrientation": "true",
+    "isTable": "true",
+    "OCREngine": "2"
+}
 
-def ocr_with_api(image: Image) -> dict:
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format="JPEG", quality=85)
-    img_byte_arr = img_byte_arr.getvalue()
-    files = {"file": ("image.jpg", img_byte_arr, "image/jpeg")}
-    data = {
-        "language": "eng",
-        "isOverlayRequired": "true",
-        "detectOrientation": "true",
-        "isTable": "true",
-        "OCREngine": "2"
-    }
-    try:
-        response = requests.post(
+ocr_cache = OCRCache() if OCR_CACHE_ENABLED else None
+
+
+def processing_version(gemini_pass: bool = GEMINI_PASS_ENABLED) -> str:
+    """Version of the settings that shape a ProcessedDocument; stored documents of another version are redone."""
+    return fingerprint(OCR_ENGINE, OCR_REQUEST_PARAMS, PREPROCESS_PARAMS, PDF_DPI, PAGE_FILTER_ENABLED,
+                       BLANK_INK_RATIO, SPARSE_INK_RATIO, OCR_KEEP_LAYOUT, gemini_pass)
+
+ocr_scheduler = ProviderScheduler(
+    "ocr",
+    rpm=OCR_REQUESTS_PER_SECOND * 60,
+    burst=OCR_BURST,
+    max_concurrency=OCR_MAX_IN_FLIGHT
+)
+
+
+def _post_image(payload: bytes) -> dict:
+    with telemetry.span("ocr_upload"):
+        response = clients.http_session().post(
             OCR_API_ENDPOINT,
-            headers={"apikey": OCR_API_KEY},
-            files=files,
-            data=data,
+            headers={"apikey": clients.require_env("OCR_API_KEY")},
+            files={"file": ("image.jpg", payload, "image/jpeg")},
+            data=dict(OCR_REQUEST_PARAMS),
             timeout=60
         )
-        response.raise_for_status()
-        result = response.json()
-        if result.get("IsErroredOnProcessing"):
-            err = result.get("ErrorMessage", "Unknown OCR error")
-            raise RuntimeError(f"OCR API failed: {err}")
+    telemetry.count("ocr_requests_total", status=str(response.status_code))
+    response.raise_for_status()
+    result = response.json()
+    if result.get("IsErroredOnProcessing"):
+        err = result.get("ErrorMessage", "Unknown OCR error")
+        raise RuntimeError(f"OCR API failed: {err}")
+    return result
+
+
+def ocr_with_api(image: Image) -> dict:
+    import requests
+
+    prepared = None
+    with telemetry.span("ocr_encode"):
+        if OCR_PREPROCESS_ENABLED:
+            prepared = prepare_for_upload(image)
+            img_byte_arr = prepared.payload
+        else:
+            img_byte_arr = io.BytesIO()
+            image.save(img_byte_arr, format="JPEG", quality=85)
+            img_byte_arr = img_byte_arr.getvalue()
+    telemetry.count("ocr_upload_bytes_total", len(img_byte_arr))
+    try:
+        # Throttled and transient failures are retried by the scheduler with the
+        # already-encoded payload; only the last failure reaches this handler.
+        result = ocr_scheduler.call(_post_image, img_byte_arr)
+        if prepared is not None:
+            result = map_overlay_to_source(result, prepared)
         return result
     except requests.exceptions.RequestException as e:
         logger.error(f"OCR API error: {e}")
         raise RuntimeError("OCR processing failed") from e
 
 
-def process_with_gemini(text: str) -> str:
+def _remote_engine() -> OCREngine:
+    clients.require_env("OCR_API_KEY")
+    return RemoteOCREngine(ocr_with_api, {**OCR_REQUEST_PARAMS, **PREPROCESS_PARAMS})
+
+
+def get_ocr_engine() -> OCREngine:
+    """The configured OCR engine, built on first use so importing needs no credentials."""
+    return clients.shared(("ocr_engine", OCR_ENGINE), lambda: build_engine(OCR_ENGINE, _remote_engine))
+
+
+def _generate(prompt: str, max_output_tokens: int):
+    from google.genai import types
+
+    return clients.genai_client().models.generate_content(
+        model="gemini-2.0-flash",  # or gemini-2.5-flash if enabled
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0.2,
+            max_output_tokens=max_output_tokens,
+        ),
+    )
+
+
+def process_with_gemini(text: str, max_output_tokens: int = 1024) -> str:
     """Send OCR text to Gemini and return structured extraction."""
+    # Shares the extraction calls' quota, retries and document deadline.
+    from extraction import llm_scheduler
+
+    prompt = (
+        "Extract structured key-value information from this document text. "
+        "Return JSON with clear keys and values only.\n\n"
+        f"{text}"
+    )
     try:
-        prompt = (
-            "Extract structured key-value information from this document text. "
-            "Return JSON with clear keys and values only.\n\n"
-            f"{text}"
-        )
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",  # or gemini-2.5-flash if enabled
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.2,
-                max_output_tokens=1024,
-            ),
+        response = llm_scheduler.call(
+            _generate, prompt, max_output_tokens,
+            tokens=len(prompt) // CHARS_PER_TOKEN + max_output_tokens
         )
         if response.candidates:
             return response.candidates[0].content.parts[0].text
         return ""
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Gemini API error: {e}")
         return ""
 
 
-def process_document(file_path: str) -> ProcessedDocument:
-    if file_path.lower().endswith(".pdf"):
-        images = pdf2image.convert_from_path(file_path, dpi=300)
+def _parse_page(page_num: int, ocr_data: dict, size: tuple) -> dict:
+    parsed_results = ocr_data.get("ParsedResults", [])
+    if parsed_results:
+        page_text = parsed_results[0].get("ParsedText", "")
+        overlay = parsed_results[0].get("TextOverlay", {}).get("Lines", [])
     else:
-        images = [Image.open(file_path)]
-    processed_pages = []
-    all_text = []
-    confidences = []
-    for page_num, img in enumerate(images):
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        ocr_data = ocr_with_api(img)
-        parsed_results = ocr_data.get("ParsedResults", [])
-        if parsed_results:
-            page_text = parsed_results[0].get("ParsedText", "")
-            overlay = parsed_results[0].get("TextOverlay", {}).get("Lines", [])
-        else:
-            page_text, overlay = "", []
-        all_text.append(page_text)
-        words_info = []
-        page_confidences = []
-        for line in overlay:
-            for word in line.get("Words", []):
-                text = word.get("WordText", "").strip()
-                if text:
-                    confidence = 0.9
-                    bbox = [
-                        word.get("Left", 0),
-                        word.get("Top", 0),
-                        word.get("Left", 0) + word.get("Width", 0),
-                        word.get("Top", 0) + word.get("Height", 0),
-                    ]
-                    words_info.append({
-                        "text": text,
-                        "confidence": confidence,
-                        "bbox": bbox
-                    })
-                    page_confidences.append(confidence)
-        confidences.extend(page_confidences)
-        processed_pages.append({
-            "page": page_num + 1,
-            "text": page_text,
-            "words": words_info,
-            "layout": overlay
-        })
-        time.sleep(1)
+        page_text, overlay = "", []
+    return {
+        "page": page_num + 1,
+        "text": page_text,
+        "words": WordTable.from_overlay(overlay, DEFAULT_WORD_CONFIDENCE),
+        "layout": overlay if OCR_KEEP_LAYOUT else [],
+        "size": list(size)
+    }
+
+
+def _ocr_page(page_num: int, img: Image) -> dict:
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    ocr_engine = get_ocr_engine()
+    cache_key = None
+    if ocr_cache is not None:
+        cache_key = OCRCache.key(img, ocr_engine.cache_params())
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            return _parse_page(page_num, cached, img.size)
+    with telemetry.span("ocr"):
+        ocr_data = ocr_engine.recognize(img)
+    if ocr_cache is not None:
+        ocr_cache.put(cache_key, ocr_data)
+    return _parse_page(page_num, ocr_data, img.size)
+
+
+def _skipped_page(page_num: int) -> dict:
+    return {
+        "page": page_num + 1,
+        "text": "",
+        "words": WordTable.empty(),
+        "layout": [],
+        "skipped": BLANK
+    }
+
+
+def _notify(on_page: Optional[Callable[[dict], None]], page: dict) -> None:
+    try:
+        on_page(page)
+    except Exception as e:
+        logger.warning(f"Page callback failed on page {page.get('page')}: {e}")
+
+
+def _page_done(on_page: Callable[[dict], None], future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        _notify(on_page, future.result())
+
+
+def process_document(file_path: str, gemini_pass: bool = GEMINI_PASS_ENABLED,
+                     on_page: Optional[Callable[[dict], None]] = None) -> ProcessedDocument:
+    """OCR every page of a document.
+
+    ``on_page`` is called with each page dict as soon as it is available, in
+    completion order and possibly from an OCR worker thread.
+    """
+    # Bound the number of decoded pages alive at once: the render window plus
+    # whatever is queued or in flight in the OCR pool. Each image is dropped as
+    # soon as its OCR request completes.
+    workers = max(1, OCR_MAX_WORKERS)
+    pending = threading.BoundedSemaphore(workers + max(1, PDF_RENDER_WINDOW))
+    page_filter = PageFilter() if PAGE_FILTER_ENABLED else None
+    entries = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        ocr_page = telemetry.bind(_ocr_page)
+        for page_num, img in telemetry.timed_iter(iter_page_images(file_path), "rasterize"):
+            with telemetry.span("page_filter"):
+                verdict, twin = page_filter.check(page_num, img) if page_filter else (None, None)
+            telemetry.count("pages_total", verdict=verdict or "ocr")
+            if verdict in (None, SPARSE):
+                verdict = None
+                pending.acquire()
+                future = executor.submit(ocr_page, page_num, img)
+                future.add_done_callback(lambda _: pending.release())
+                if on_page is not None:
+                    future.add_done_callback(lambda f: _page_done(on_page, f))
+                entries.append((page_num, verdict, future))
+            else:
+                entries.append((page_num, verdict, twin))
+                if on_page is not None:
+                    page = _skipped_page(page_num)
+                    if verdict == DUPLICATE:
+                        page = {"page": page_num + 1, "text": "", "duplicate_of": twin + 1}
+                    _notify(on_page, page)
+            del img
+        # Pages are assembled in submission order, so they stay in page order
+        # regardless of which OCR request finished first. A duplicate reuses the
+        # OCR result of the earlier page it matched.
+        by_index = {}
+        processed_pages = []
+        for page_num, verdict, ref in entries:
+            if verdict is None:
+                page = ref.result()
+            elif verdict == BLANK:
+                page = _skipped_page(page_num)
+            else:
+                page = dict(by_index[ref], page=page_num + 1, duplicate_of=ref + 1)
+            by_index[page_num] = page
+            processed_pages.append(page)
+
+    all_text = [page["text"] for page in processed_pages]
+    confidences = np.concatenate(
+        [page["words"].confidences for page in processed_pages] or [np.zeros(0, dtype=np.float32)]
+    )
 
     full_text = "\n\n".join(all_text)
-    gemini_output = process_with_gemini(full_text)
+    gemini_output = ""
+    if gemini_pass:
+        with telemetry.span("gemini_pass"):
+            gemini_output = process_with_gemini(full_text)
 
     return ProcessedDocument(
         text=full_text,
         pages=processed_pages,
-        images=images,
+        images=[PageHandle(file_path, page["page"], PDF_DPI) for page in processed_pages],
         ocr_confidences=confidences,
         gemini_output=gemini_output
     )
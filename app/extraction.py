@@ -1,10 +1,19 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import HumanMessage, SystemMessage
 from pydantic import create_model, Field
-from typing import List, Dict, Callable
-import re
-import datetime
+from typing import List, Dict, Tuple, Literal
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+import logging
 from schemas import QAReport
+from validation import compile_plan
+from llm_cache import build_cache, fingerprint, text_hash, LLMCache
+from classifier import load_classifier, CLASSIFIER_THRESHOLD
+from pre_extraction import pre_extract, PRE_EXTRACTION_ENABLED
+from chunking import split_pages, select_chunks, EXTRACTION_TOKEN_BUDGET, CHARS_PER_TOKEN
+from scheduler import ProviderScheduler, DeadlineExceeded
+import telemetry
+import clients
+
+logger = logging.getLogger(__name__)
 
 DOCUMENT_TYPES = ["invoice", "medical_bill", "prescription"]
 
@@ -17,83 +26,289 @@ FIELD_MAPPING = {
                      "medication", "dosage", "quantity", "refills", "issue_date"]
 }
 
-VALIDATION_RULES: Dict[str, Callable[[str], bool]] = {
-    "date": lambda val: validate_date(val),
-    "amount": lambda val: validate_amount(val),
-    "charges": lambda val: validate_amount(val),
-    "total": lambda val: validate_amount(val),
-}
+MODEL_NAME = "gemini-2.0-flash"
+TEMPERATURE = 0
+VOTE_SAMPLES = int(os.getenv("EXTRACTION_SAMPLES", "3"))
+# Stop sampling once this many completed samples agree on every field; 0 disables early exit.
+VOTE_EARLY_EXIT = int(os.getenv("EXTRACTION_EARLY_EXIT_AGREEMENT", "2"))
+# Provider quota for the Gemini project; 0 disables a limit.
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+LLM_BURST = float(os.getenv("LLM_BURST", "5"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Rough allowance for the structured answer when estimating a call's token cost.
+LLM_OUTPUT_TOKENS = 512
+
+CLASSIFY_SYSTEM_PROMPT = "You are an expert document classifier. Classify the document as one of: invoice, medical_bill, prescription."
+CLASSIFY_TEXT_LIMIT = 2000
+FIELD_DESCRIPTION = "Extracted value for {field}"
+COMBINED_SYSTEM_PROMPT = (
+    "You are an expert document analyst. Classify the document as one of: "
+    "invoice, medical_bill, prescription, and extract the requested fields. "
+    "Leave a field empty when it does not apply to the document type or is not present."
+)
+
+CLASSIFY_VERSION = fingerprint(CLASSIFY_SYSTEM_PROMPT, CLASSIFY_TEXT_LIMIT, DOCUMENT_TYPES)
+EXTRACT_VERSION = fingerprint(FIELD_DESCRIPTION, FIELD_MAPPING, VOTE_SAMPLES, VOTE_EARLY_EXIT, "votes")
+COMBINED_VERSION = fingerprint(COMBINED_SYSTEM_PROMPT, FIELD_DESCRIPTION, FIELD_MAPPING, DOCUMENT_TYPES)
+
+def classification_version(mode: str, source: str = "") -> str:
+    """Version of the prompt that decides the document type in the given pipeline mode.
+
+    ``source`` identifies the document text the answer was derived from (see text_version).
+    """
+    return fingerprint(COMBINED_VERSION if mode == "combined" else CLASSIFY_VERSION, source)
+
+def field_version(field: str, mode: str, source: str = "") -> str:
+    """Version of everything that shapes one field's answer, so stored values of unchanged fields stay valid."""
+    if mode == "combined":
+        return fingerprint(MODEL_NAME, TEMPERATURE, COMBINED_SYSTEM_PROMPT, FIELD_DESCRIPTION.format(field=field),
+                           source)
+    return fingerprint(MODEL_NAME, TEMPERATURE, FIELD_DESCRIPTION.format(field=field), VOTE_SAMPLES,
+                       VOTE_EARLY_EXIT, PRE_EXTRACTION_ENABLED, source)
+
+def text_version(doc_text: str) -> str:
+    """Identifies OCR output: answers derived from other text, e.g. before an OCR settings change, are stale."""
+    return text_hash(doc_text)[:16]
+
+llm_cache = build_cache()
+if llm_cache is not None:
+    # Answers produced under an older prompt or FIELD_MAPPING can never be hit again.
+    llm_cache.invalidate("classify", keep_version=CLASSIFY_VERSION)
+    llm_cache.invalidate("extract", keep_version=EXTRACT_VERSION)
+    llm_cache.invalidate("combined", keep_version=COMBINED_VERSION)
+
+local_classifier = load_classifier(FIELD_MAPPING)
+
+llm_scheduler = ProviderScheduler(
+    "gemini",
+    rpm=LLM_RPM,
+    tpm=LLM_TPM,
+    burst=LLM_BURST,
+    max_concurrency=LLM_MAX_CONCURRENCY
+)
+
+def _messages(system: str, human: str) -> list:
+    # LangChain is only imported once a model is actually called.
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    return [SystemMessage(content=system), HumanMessage(content=human)]
 
-def classify_document(text: str) -> str:
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-    messages = [
-        SystemMessage(content="You are an expert document classifier. Classify the document as one of: invoice, medical_bill, prescription."),
-        HumanMessage(content=f"Document content:\n{text[:2000]}\n\nClassification:")
-    ]
-    response = llm.invoke(messages)
+def _estimate_tokens(payload) -> int:
+    if isinstance(payload, str):
+        chars = len(payload)
+    else:
+        chars = sum(len(str(getattr(message, "content", message))) for message in payload)
+    return chars // CHARS_PER_TOKEN + LLM_OUTPUT_TOKENS
+
+def _invoke(runnable, payload, namespace: str):
+    """Call the model through the LLM scheduler, counting calls and timing them as the llm_<namespace> stage."""
+    try:
+        with telemetry.span(f"llm_{namespace}"):
+            response = llm_scheduler.call(runnable.invoke, payload, tokens=_estimate_tokens(payload))
+    except Exception:
+        telemetry.count("llm_calls_total", namespace=namespace, outcome="error")
+        raise
+    telemetry.count("llm_calls_total", namespace=namespace, outcome="ok")
+    return response
+
+def classify_document(text: str, threshold: float = CLASSIFIER_THRESHOLD) -> str:
+    label, probability = local_classifier.predict(text)
+    if label in DOCUMENT_TYPES and probability >= threshold:
+        telemetry.count("local_classifier_total", result="accepted")
+        return label
+    telemetry.count("local_classifier_total", result="deferred")
+    snippet = text[:CLASSIFY_TEXT_LIMIT]
+    cache_key = LLMCache.key("classify", MODEL_NAME, TEMPERATURE, CLASSIFY_VERSION, snippet)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    llm = clients.chat_model(MODEL_NAME, TEMPERATURE)
+    messages = _messages(CLASSIFY_SYSTEM_PROMPT, f"Document content:\n{snippet}\n\nClassification:")
+    response = _invoke(llm, messages, "classify")
     classification = response.content.strip().lower()
-    for doc_type in DOCUMENT_TYPES:
-        if doc_type in classification:
-            return doc_type
-    return DOCUMENT_TYPES[0]
+    doc_type = DOCUMENT_TYPES[0]
+    for candidate in DOCUMENT_TYPES:
+        if candidate in classification:
+            doc_type = candidate
+            break
+    if llm_cache is not None:
+        llm_cache.set(cache_key, doc_type)
+    return doc_type
 
-def extract_fields(doc_text: str, doc_type: str, fields: List[str] = None) -> Dict:
-    if not fields:
-        fields = FIELD_MAPPING.get(doc_type, [])
-    field_definitions = {
-        field: (str, Field(..., description=f"Extracted value for {field}"))
-        for field in fields
-    }
-    DynamicSchema = create_model("DynamicSchema", **field_definitions)
-    results = []
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-    for _ in range(3):
-        structured_llm = llm.with_structured_output(DynamicSchema)
-        try:
-            result = structured_llm.invoke(doc_text)
-            results.append(result.dict())
-        except Exception:
-            continue
+def _vote(results: List[Dict], fields: List[str], count_empty: bool = True) -> Tuple[Dict[str, str], Dict[str, float]]:
     final_result = {}
+    agreement = {}
     for field in fields:
         values = {}
         for res in results:
             if field in res and res[field]:
                 value = res[field]
                 values[value] = values.get(value, 0) + 1
-        final_result[field] = max(values, key=values.get) if values else ""
-    return final_result
+        if values:
+            final_result[field] = max(values, key=values.get)
+            voters = len(results) if count_empty else sum(values.values())
+            agreement[field] = values[final_result[field]] / voters
+        else:
+            final_result[field] = ""
+            agreement[field] = 0.0
+    return final_result, agreement
+
+def _samples_agree(results: List[Dict], fields: List[str], threshold: int) -> bool:
+    if threshold <= 0 or len(results) < threshold:
+        return False
+    for field in fields:
+        counts = {}
+        for res in results:
+            value = res.get(field) or ""
+            counts[value] = counts.get(value, 0) + 1
+        if max(counts.values()) < threshold:
+            return False
+    return True
+
+def _sample_fields(doc_text: str, doc_type: str, fields: List[str],
+                   samples: int = VOTE_SAMPLES) -> Tuple[Dict[str, str], Dict[str, float]]:
+    cache_key = LLMCache.key("extract", MODEL_NAME, TEMPERATURE, EXTRACT_VERSION, doc_type, fields, samples, doc_text)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached["values"]), dict(cached["agreement"])
+    field_definitions = {
+        field: (str, Field(..., description=FIELD_DESCRIPTION.format(field=field)))
+        for field in fields
+    }
+    DynamicSchema = create_model("DynamicSchema", **field_definitions)
+    structured_llm = clients.chat_model(MODEL_NAME, TEMPERATURE).with_structured_output(DynamicSchema)
+    results = []
+    failures = []
+    # Only as many samples as can agree go out first; the rest are requested when those disagree.
+    first = min(samples, VOTE_EARLY_EXIT) if VOTE_EARLY_EXIT > 0 else samples
+    executor = ThreadPoolExecutor(max_workers=max(1, samples))
+    try:
+        sample = telemetry.bind(lambda: _invoke(structured_llm, doc_text, "extract"))
+        pending = {executor.submit(sample) for _ in range(first)}
+        submitted = first
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results.append(future.result().dict())
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    # Throttling and transient errors were already retried by the scheduler.
+                    logger.warning(f"Extraction sample failed after retries: {e}")
+                    failures.append(e)
+            if _samples_agree(results, fields, VOTE_EARLY_EXIT):
+                break
+            if not pending and submitted < samples:
+                pending = {executor.submit(sample) for _ in range(samples - submitted)}
+                submitted = samples
+        telemetry.count("extraction_samples_total", submitted)
+    finally:
+        # Only reached with samples in flight when a deadline expired; their answers are discarded.
+        executor.shutdown(wait=False, cancel_futures=True)
+    if not results:
+        # Voting over zero samples would silently return empty fields.
+        raise RuntimeError(f"All {samples} extraction samples failed") from failures[-1]
+    if failures:
+        telemetry.count("extraction_samples_failed_total", len(failures))
+    final_result, agreement = _vote(results, fields)
+    if llm_cache is not None and results:
+        llm_cache.set(cache_key, {"values": final_result, "agreement": agreement})
+    return final_result, agreement
+
+def extract_fields_with_votes(doc_text: str, doc_type: str, fields: List[str] = None,
+                              pre_extraction: bool = PRE_EXTRACTION_ENABLED) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Self-consistency extraction; returns the voted values and per-field agreement ratios.
+
+    Fields resolved by the deterministic pre-extraction rules are not sent to
+    the LLM; when every field is resolved the LLM is skipped entirely.
+    """
+    if not fields:
+        fields = FIELD_MAPPING.get(doc_type, [])
+    prefilled = pre_extract(doc_text, fields) if pre_extraction else {}
+    telemetry.count("pre_extracted_fields_total", len(prefilled))
+    remaining = [field for field in fields if field not in prefilled]
+    values, agreement = _sample_fields(doc_text, doc_type, remaining) if remaining else ({}, {})
+    values.update(prefilled)
+    agreement.update({field: 1.0 for field in prefilled})
+    return {field: values[field] for field in fields}, {field: agreement[field] for field in fields}
+
+def extract_fields_chunked(pages: List[Dict], doc_type: str, fields: List[str] = None,
+                           token_budget: int = EXTRACTION_TOKEN_BUDGET,
+                           pre_extraction: bool = PRE_EXTRACTION_ENABLED) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Map-reduce extraction for long documents.
+
+    Pages are packed into chunks, the chunks most relevant to the requested
+    fields are chosen within the token budget, each is extracted once in
+    parallel, and the per-chunk answers are merged with the usual vote.
+    """
+    if not fields:
+        fields = FIELD_MAPPING.get(doc_type, [])
+    doc_text = "\n\n".join(page.get("text", "") for page in pages)
+    prefilled = pre_extract(doc_text, fields) if pre_extraction else {}
+    telemetry.count("pre_extracted_fields_total", len(prefilled))
+    remaining = [field for field in fields if field not in prefilled]
+    values, agreement = {}, {}
+    chunks = select_chunks(split_pages(pages), remaining, token_budget) if remaining else []
+    if chunks:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            answers = list(executor.map(
+                telemetry.bind(lambda chunk: _sample_fields(chunk.text, doc_type, remaining, samples=1)[0]), chunks
+            ))
+        # A chunk that does not mention a field abstains rather than voting for "".
+        values, agreement = _vote(answers, remaining, count_empty=False)
+    values.update(prefilled)
+    agreement.update({field: 1.0 for field in prefilled})
+    return (
+        {field: values.get(field, "") for field in fields},
+        {field: agreement.get(field, 0.0) for field in fields}
+    )
+
+def extract_fields(doc_text: str, doc_type: str, fields: List[str] = None) -> Dict:
+    return extract_fields_with_votes(doc_text, doc_type, fields)[0]
+
+def _all_fields() -> List[str]:
+    fields = []
+    for doc_fields in FIELD_MAPPING.values():
+        fields.extend(f for f in doc_fields if f not in fields)
+    return fields
+
+def classify_and_extract(doc_text: str, fields: List[str] = None, doc_type: str = None) -> Tuple[str, Dict[str, str]]:
+    """Classify and extract in a single structured-output call.
+
+    When ``doc_type`` is given, classification is skipped. Without an explicit
+    field list the schema covers every FIELD_MAPPING field and the answer is
+    narrowed to the fields of the detected type.
+    """
+    schema_fields = fields or (FIELD_MAPPING.get(doc_type, []) if doc_type else _all_fields())
+    cache_key = LLMCache.key("combined", MODEL_NAME, TEMPERATURE, COMBINED_VERSION, doc_type, fields, doc_text)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached["doc_type"], dict(cached["values"])
+    field_definitions = {
+        field: (str, Field("", description=FIELD_DESCRIPTION.format(field=field)))
+        for field in schema_fields
+    }
+    if doc_type is None:
+        field_definitions["document_type"] = (
+            Literal[tuple(DOCUMENT_TYPES)],
+            Field(..., description="Type of the document")
+        )
+    CombinedSchema = create_model("CombinedSchema", **field_definitions)
+    structured_llm = clients.chat_model(MODEL_NAME, TEMPERATURE).with_structured_output(CombinedSchema)
+    messages = _messages(COMBINED_SYSTEM_PROMPT, doc_text)
+    result = _invoke(structured_llm, messages, "combined").dict()
+    detected_type = doc_type or result.get("document_type") or DOCUMENT_TYPES[0]
+    requested = fields or FIELD_MAPPING.get(detected_type, [])
+    values = {field: result.get(field) or "" for field in requested}
+    if llm_cache is not None:
+        llm_cache.set(cache_key, {"doc_type": detected_type, "values": values})
+    return detected_type, values
 
 def validate_extraction(extraction: Dict, doc_text: str) -> QAReport:
-    report = QAReport()
-    low_confidence_fields = []
-    for field, value in extraction.items():
-        if not value:
-            low_confidence_fields.append(field)
-            continue
-        for keyword, rule in VALIDATION_RULES.items():
-            if keyword in field.lower():
-                if not rule(value):
-                    report.failed_rules.append(f"{keyword}_format_{field}")
-                else:
-                    report.passed_rules.append(f"{keyword}_format_{field}")
-    if "line_items" in extraction and "total_amount" in extraction:
-        if "calculated_total" in doc_text.lower():
-            report.passed_rules.append("totals_match")
-        else:
-            report.failed_rules.append("totals_match")
-    if low_confidence_fields:
-        report.notes = f"{len(low_confidence_fields)} low-confidence fields: {', '.join(low_confidence_fields)}"
-    return report
-
-def validate_date(date_str: str) -> bool:
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
-        try:
-            datetime.datetime.strptime(date_str, fmt)
-            return True
-        except ValueError:
-            continue
-    return False
-
-def validate_amount(amount_str: str) -> bool:
-    return bool(re.match(r"^\$?\d{1,3}(?:,\d{3})*(?:\.\d{2})?$", amount_str))
+    # doc_text is kept for callers; every rule now works on the extracted values alone.
+    return compile_plan(tuple(extraction)).validate(extraction)
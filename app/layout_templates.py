@@ -0,0 +1,464 @@
+import hashlib
+import json
+import logging
+import multiprocessing.util
+import os
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from schemas import ExtractionResult, ProcessedDocument
+from spatial_index import normalize_token, tokenize
+from word_table import WordTable
+from file_store import atomic_write_json, file_lock
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_ENABLED = os.getenv("TEMPLATES_ENABLED", "true").lower() in ("1", "true", "yes")
+TEMPLATE_STORE_PATH = os.getenv("TEMPLATE_STORE_PATH", os.path.join(".cache", "templates.json"))
+# Share of a template's static text that must appear on a page for the layout to match.
+TEMPLATE_MATCH_THRESHOLD = float(os.getenv("TEMPLATE_MATCH_THRESHOLD", "0.75"))
+# Documents that must agree on a field's region before it is read without the LLM.
+TEMPLATE_MIN_SUPPORT = int(os.getenv("TEMPLATE_MIN_SUPPORT", "2"))
+# Field confidence an extracted value needs before its location is learned.
+TEMPLATE_LEARN_MIN_CONFIDENCE = float(os.getenv("TEMPLATE_LEARN_MIN_CONFIDENCE", "0.7"))
+TEMPLATE_MAX_TEMPLATES = int(os.getenv("TEMPLATE_MAX_TEMPLATES", "1000"))
+# Learned documents, or seconds, after which pending template changes are written to the store.
+TEMPLATE_SAVE_EVERY = int(os.getenv("TEMPLATE_SAVE_EVERY", "20"))
+TEMPLATE_SAVE_INTERVAL_S = float(os.getenv("TEMPLATE_SAVE_INTERVAL_S", "30"))
+
+FINGERPRINT_DIMS = 1024
+# Word positions are bucketed into a GRID x GRID raster of the page before hashing.
+GRID = 6
+# Fraction of the page added around a learned region when reading it.
+REGION_MARGIN = 0.01
+# Label words directly left of a value that its region is anchored to.
+ANCHOR_WORDS = 3
+# Documents remembered per template so re-running one file does not count as new support.
+SEEN_DOCUMENTS = 50
+
+Region = Dict
+
+
+def page_frame(page: Dict) -> Optional[Tuple[float, float, float, float]]:
+    """The page as (left, top, width, height); regions are stored relative to it.
+
+    Pages without a recorded image size fall back to the extent of their words.
+    """
+    words = page.get("words")
+    if not isinstance(words, WordTable) or len(words) == 0:
+        return None
+    if page.get("size"):
+        width, height = page["size"]
+        return 0.0, 0.0, float(width), float(height)
+    boxes = words.bboxes
+    left, top = float(boxes[:, 0].min()), float(boxes[:, 1].min())
+    width, height = float(boxes[:, 2].max()) - left, float(boxes[:, 3].max()) - top
+    if width <= 0 or height <= 0:
+        return None
+    return left, top, width, height
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % FINGERPRINT_DIMS
+
+
+def layout_features(page: Dict, exclude: Set[str] = frozenset()) -> Optional[np.ndarray]:
+    """Hashed (word, position) features of the alphabetic words on a page.
+
+    Amounts, dates and reference numbers never count, and ``exclude`` drops the
+    words of known field values, so what is left is the layout's static text.
+    Positioned features weigh 1 and position-free ones 0.5, so a block that
+    shifts between documents still partly matches.
+    """
+    frame = page_frame(page)
+    if frame is None:
+        return None
+    left, top, width, height = frame
+    words = page["words"]
+    features = np.zeros(FINGERPRINT_DIMS, dtype=np.float32)
+    centers = ((words.bboxes[:, :2] + words.bboxes[:, 2:]) / 2).tolist()
+    for text, (cx, cy) in zip(words.texts(), centers):
+        token = normalize_token(text)
+        if len(token) < 3 or not token.isalpha() or token in exclude:
+            continue
+        gx = min(GRID - 1, max(0, int((cx - left) / width * GRID)))
+        gy = min(GRID - 1, max(0, int((cy - top) / height * GRID)))
+        features[_hash(f"{token}@{gx},{gy}")] = 1.0
+        free = _hash(token)
+        features[free] = max(features[free], 0.5)
+    return features if features.any() else None
+
+
+def _to_frame(bbox: Sequence[float], frame: Tuple[float, float, float, float]) -> List[float]:
+    left, top, width, height = frame
+    return [(bbox[0] - left) / width, (bbox[1] - top) / height, (bbox[2] - left) / width, (bbox[3] - top) / height]
+
+
+def _region_indices(page: Dict, box: Sequence[float], margin: float = REGION_MARGIN) -> List[int]:
+    """Indices of the words whose centres fall inside a frame-relative box, in OCR reading order."""
+    frame = page_frame(page)
+    if frame is None:
+        return []
+    left, top, width, height = frame
+    x0, y0 = left + (box[0] - margin) * width, top + (box[1] - margin) * height
+    x1, y1 = left + (box[2] + margin) * width, top + (box[3] + margin) * height
+    boxes = page["words"].bboxes
+    cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+    return np.nonzero((cx >= x0) & (cx <= x1) & (cy >= y0) & (cy <= y1))[0].tolist()
+
+
+def _anchor_before(page: Dict, indices: List[int]) -> List[int]:
+    """The label words immediately preceding a value on its line, e.g. "Total Amount Due:"."""
+    words = page["words"]
+    value_top, value_bottom = words.bboxes[indices, 1].min(), words.bboxes[indices, 3].max()
+    anchor = []
+    i = indices[0] - 1
+    while i >= 0 and len(anchor) < ANCHOR_WORDS:
+        top, bottom = words.bboxes[i, 1], words.bboxes[i, 3]
+        token = normalize_token(words.text(i))
+        if bottom < value_top or top > value_bottom or not token or any(ch.isdigit() for ch in token):
+            break
+        anchor.insert(0, i)
+        i -= 1
+    return anchor
+
+
+def _find_anchor(page: Dict, tokens: List[str], near: Sequence[float]) -> Optional[Tuple[float, float]]:
+    """Frame-relative top-left of the run of words matching tokens that lies closest to near."""
+    frame = page_frame(page)
+    if frame is None or not tokens:
+        return None
+    left, top, width, height = frame
+    words = page["words"]
+    texts = [normalize_token(text) for text in words.texts()]
+    best, best_distance = None, None
+    for start in range(len(texts) - len(tokens) + 1):
+        if texts[start:start + len(tokens)] != tokens:
+            continue
+        x, y = (words.bboxes[start, 0] - left) / width, (words.bboxes[start, 1] - top) / height
+        distance = (x - near[0]) ** 2 + (y - near[1]) ** 2
+        if best_distance is None or distance < best_distance:
+            best, best_distance = (float(x), float(y)), distance
+    return best
+
+
+def region_box(page: Dict, region: Region) -> List[float]:
+    """Where a region is on this page: relative to its anchor label when found, else at its learned position."""
+    anchor = region.get("anchor")
+    if anchor:
+        expected = (region["box"][0] - region["offset"][0], region["box"][1] - region["offset"][1])
+        origin = _find_anchor(page, anchor, expected)
+        if origin is not None:
+            dx0, dy0, dx1, dy1 = region["offset"]
+            return [origin[0] + dx0, origin[1] + dy0, origin[0] + dx1, origin[1] + dy1]
+    return list(region["box"])
+
+
+def read_region(page: Dict, region: Region) -> str:
+    words = page["words"]
+    return " ".join(words.text(i) for i in _region_indices(page, region_box(page, region)))
+
+
+def _union(a: Sequence[float], b: Sequence[float]) -> List[float]:
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def _overlaps(a: Sequence[float], b: Sequence[float], margin: float = REGION_MARGIN) -> bool:
+    return a[0] - margin <= b[2] and b[0] - margin <= a[2] and a[1] - margin <= b[3] and b[1] - margin <= a[3]
+
+
+def _anchor_page(doc: ProcessedDocument) -> Optional[Dict]:
+    """The page a layout is recognised by: the first one with OCR words."""
+    for page in doc.pages:
+        if page_frame(page) is not None:
+            return page
+    return None
+
+
+def _page(doc: ProcessedDocument, page_number: int) -> Optional[Dict]:
+    for page in doc.pages:
+        if page["page"] == page_number:
+            return page
+    return None
+
+
+def _learn_region(doc: ProcessedDocument, value: str) -> Optional[Region]:
+    """Region of a value located in the OCR words, kept only if reading it back gives the value."""
+    location = doc.locate_value(value)
+    page = _page(doc, location["page"]) if location is not None else None
+    frame = page_frame(page) if page is not None else None
+    if frame is None:
+        return None
+    box = _to_frame(location["bbox"], frame)
+    indices = _region_indices(page, box, margin=0.0)
+    if not indices:
+        return None
+    region = {"page": location["page"], "box": box, "anchor": [], "offset": None}
+    anchor = _anchor_before(page, indices)
+    if anchor:
+        x, y = _to_frame(page["words"].bboxes[anchor[0]].tolist(), frame)[:2]
+        region["anchor"] = [normalize_token(page["words"].text(i)) for i in anchor]
+        region["offset"] = [box[0] - x, box[1] - y, box[2] - x, box[3] - y]
+    if tokenize(read_region(page, region)) != tokenize(value):
+        return None
+    return region
+
+
+class LayoutTemplate:
+    """A learned layout: its static-text profile, document type and where each field sits.
+
+    ``weights`` holds, per layout feature, the share of the template's documents
+    that had it; text that changes between documents fades out as more are seen.
+    """
+
+    def __init__(self, template_id: str, doc_type: str, weights: np.ndarray,
+                 fields: Optional[Dict[str, Region]] = None, documents: int = 1, last_used: float = 0.0,
+                 seen: Optional[List[str]] = None):
+        self.id = template_id
+        self.doc_type = doc_type
+        self.weights = weights
+        self.fields = fields or {}
+        self.documents = documents
+        self.last_used = last_used or time.time()
+        self.seen = seen or []
+
+    def read(self, doc: ProcessedDocument, fields: Iterable[str],
+             min_support: int = TEMPLATE_MIN_SUPPORT) -> Dict[str, str]:
+        """Values of the requested fields that have a confirmed region; fields reading as empty are left out."""
+        values = {}
+        for name in fields:
+            region = self.fields.get(name)
+            if region is None or region["support"] < min_support:
+                continue
+            page = _page(doc, region["page"])
+            value = read_region(page, region) if page is not None and page_frame(page) is not None else ""
+            if value:
+                values[name] = value
+        return values
+
+    def observe(self, doc_id: str, features: np.ndarray, regions: Dict[str, Region]) -> bool:
+        """Fold another document of this layout into the template; False if it was already counted."""
+        if doc_id in self.seen:
+            return False
+        self.seen = (self.seen + [doc_id])[-SEEN_DOCUMENTS:]
+        self.weights = (self.weights * self.documents + features) / (self.documents + 1)
+        self.documents += 1
+        for name, region in regions.items():
+            known = self.fields.get(name)
+            if known is not None and known["page"] == region["page"] and known["anchor"] == region["anchor"] and (
+                _overlaps(known["offset"], region["offset"]) if region["anchor"] else _overlaps(known["box"], region["box"])
+            ):
+                merged = dict(known, box=_union(known["box"], region["box"]), support=known["support"] + 1)
+                if region["anchor"]:
+                    merged["offset"] = _union(known["offset"], region["offset"])
+                self.fields[name] = merged
+            else:
+                # First sighting, or the field moved: start counting support again.
+                self.fields[name] = dict(region, support=1)
+        return True
+
+    def to_dict(self) -> Dict:
+        nonzero = np.nonzero(self.weights)[0]
+        return {
+            "id": self.id,
+            "doc_type": self.doc_type,
+            "weights": {str(i): round(float(self.weights[i]), 4) for i in nonzero.tolist()},
+            "fields": self.fields,
+            "documents": self.documents,
+            "last_used": self.last_used,
+            "seen": self.seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LayoutTemplate":
+        weights = np.zeros(FINGERPRINT_DIMS, dtype=np.float32)
+        for i, value in data["weights"].items():
+            weights[int(i)] = value
+        return cls(data["id"], data["doc_type"], weights, data.get("fields"),
+                   data.get("documents", 1), data.get("last_used", 0.0), data.get("seen"))
+
+
+class TemplateIndex:
+    """Nearest-neighbour lookup of page layouts over the learned templates.
+
+    A page scores against a template by the weighted share of the template's
+    features it contains. Template rows are stored L1-normalized, so one
+    matrix-vector product scores a page against every template at once.
+
+    Learned changes are written in batches. A save merges them into the store
+    under a file lock, so processes sharing the store keep each other's templates.
+    """
+
+    def __init__(self, templates: Optional[List[LayoutTemplate]] = None, path: Optional[str] = TEMPLATE_STORE_PATH,
+                 threshold: float = TEMPLATE_MATCH_THRESHOLD, max_templates: int = TEMPLATE_MAX_TEMPLATES):
+        self.templates = list(templates or [])
+        self.path = path
+        self.threshold = threshold
+        self.max_templates = max_templates
+        self._lock = threading.Lock()
+        self._matrix = None
+        # Ids of templates changed since the last save.
+        self._dirty: Set[str] = set()
+        self._pending = 0
+        self._saved_at = time.monotonic()
+        self._flush_pid = None
+
+    def _nearest(self, features: np.ndarray, doc_type: Optional[str] = None) -> Tuple[Optional[LayoutTemplate], float]:
+        if self._matrix is None:
+            rows = [t.weights / max(float(t.weights.sum()), 1e-9) for t in self.templates]
+            self._matrix = np.stack(rows) if rows else np.zeros((0, FINGERPRINT_DIMS), dtype=np.float32)
+        if not len(self._matrix):
+            return None, 0.0
+        scores = self._matrix @ (features > 0).astype(np.float32)
+        if doc_type is not None:
+            scores = np.where([t.doc_type == doc_type for t in self.templates], scores, -1.0)
+        best = int(np.argmax(scores))
+        return self.templates[best], float(scores[best])
+
+    def match(self, doc: ProcessedDocument) -> Optional[LayoutTemplate]:
+        """The learned template of this document's layout, if any is close enough."""
+        page = _anchor_page(doc)
+        features = layout_features(page) if page is not None else None
+        if features is None:
+            return None
+        with self._lock:
+            template, score = self._nearest(features)
+            if template is None or score < self.threshold:
+                telemetry.count("template_matches_total", result="miss")
+                return None
+            template.last_used = time.time()
+        telemetry.count("template_matches_total", result="hit")
+        logger.info(f"Layout matched template {template.id} ({template.doc_type}, score {score:.3f})")
+        return template
+
+    def learn(self, doc: ProcessedDocument, result: ExtractionResult, exclude: Iterable[str] = (),
+              min_confidence: float = TEMPLATE_LEARN_MIN_CONFIDENCE) -> Optional[LayoutTemplate]:
+        """Record where the confidently extracted, validated fields of a result sit on the page.
+
+        Fields in ``exclude`` (e.g. values read from a template) are not used as evidence.
+        """
+        page = _anchor_page(doc)
+        if page is None:
+            return None
+        skip = set(exclude)
+        failed = result.qa.failed_rules
+        regions = {}
+        for field in result.fields:
+            if field.name in skip or not field.value or field.confidence < min_confidence:
+                continue
+            if any(rule.endswith(f"_{field.name}") for rule in failed):
+                continue
+            region = _learn_region(doc, field.value)
+            if region is not None:
+                regions[field.name] = region
+        if not regions:
+            return None
+        values = {token for field in result.fields for token in tokenize(field.value)}
+        features = layout_features(page, exclude=values)
+        if features is None:
+            return None
+        doc_id = hashlib.sha1(doc.text.encode("utf-8")).hexdigest()
+        with self._lock:
+            template, score = self._nearest(features, result.doc_type)
+            if template is not None and score >= self.threshold:
+                if not template.observe(doc_id, features, regions):
+                    return template
+            else:
+                template = LayoutTemplate(uuid.uuid4().hex[:12], result.doc_type, features,
+                                          {name: dict(region, support=1) for name, region in regions.items()},
+                                          seen=[doc_id])
+                self.templates.append(template)
+                self._evict()
+            self._matrix = None
+            due = self._mark_dirty(template)
+        if due:
+            self.flush()
+        telemetry.count("template_learned_fields_total", len(regions))
+        return template
+
+    def _evict(self) -> None:
+        if len(self.templates) > self.max_templates:
+            self.templates.sort(key=lambda t: t.last_used, reverse=True)
+            del self.templates[self.max_templates:]
+
+    def _mark_dirty(self, template: LayoutTemplate) -> bool:
+        """Record a changed template; True once enough changes are pending to save them."""
+        if not self.path:
+            return False
+        self._dirty.add(template.id)
+        self._pending += 1
+        if self._flush_pid != os.getpid():
+            # Runs at interpreter exit, and also when a multiprocessing worker exits.
+            multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+            self._flush_pid = os.getpid()
+        return (self._pending >= TEMPLATE_SAVE_EVERY
+                or time.monotonic() - self._saved_at >= TEMPLATE_SAVE_INTERVAL_S)
+
+    def flush(self) -> None:
+        """Write pending template changes into the store, merged with what other processes saved since.
+
+        Templates are merged by id: the changed ones replace their stored copy,
+        the rest of the store is kept, and templates other processes added are
+        picked up by this index too.
+        """
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            changed = {t.id: t.to_dict() for t in self.templates if t.id in self._dirty}
+            self._dirty.clear()
+            self._pending = 0
+            self._saved_at = time.monotonic()
+        try:
+            with file_lock(f"{self.path}.lock"):
+                stored = {data["id"]: data for data in _read_store(self.path)}
+                stored.update(changed)
+                merged = sorted(stored.values(), key=lambda data: data.get("last_used", 0.0), reverse=True)
+                merged = merged[:self.max_templates]
+                atomic_write_json(self.path, merged)
+        except OSError as e:
+            logger.warning(f"Could not save template store {self.path}: {e}")
+            with self._lock:
+                self._dirty.update(changed)
+            return
+        with self._lock:
+            known = {t.id: i for i, t in enumerate(self.templates)}
+            adopted = False
+            for data in merged:
+                i = known.get(data["id"])
+                if i is None:
+                    self.templates.append(LayoutTemplate.from_dict(data))
+                    adopted = True
+                elif data["id"] not in self._dirty and data.get("documents", 1) > self.templates[i].documents:
+                    # Another process has seen more documents of this layout.
+                    self.templates[i] = LayoutTemplate.from_dict(data)
+                    adopted = True
+            if adopted:
+                self._evict()
+                self._matrix = None
+
+
+def _read_store(path: str) -> List[Dict]:
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable template store {path}: {e}")
+        return []
+    return [item for item in data if isinstance(item, dict) and "id" in item] if isinstance(data, list) else []
+
+
+def load_templates(path: str = TEMPLATE_STORE_PATH) -> TemplateIndex:
+    """Templates learned by earlier runs, or an empty index."""
+    templates = []
+    for data in _read_store(path):
+        try:
+            templates.append(LayoutTemplate.from_dict(data))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable template {data.get('id')} in {path}: {e}")
+    return TemplateIndex(templates, path)
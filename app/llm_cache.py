@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import telemetry
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm.sqlite3"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of prompts, schemas or mappings that shape an LLM answer."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def text_hash(*inputs: Any) -> str:
+    digest = hashlib.sha256()
+    for item in inputs:
+        data = item if isinstance(item, str) else json.dumps(item, sort_keys=True, default=str)
+        digest.update(data.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[str, str, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[2], entry[3]
+
+    def set(self, key: str, namespace: str, version: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (namespace, version, time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate(self, namespace: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        with self._lock:
+            stale = [
+                key for key, (ns, version, _, _) in self._data.items()
+                if (namespace is None or ns == namespace)
+                and (keep_version is None or version != keep_version)
+            ]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+
+class SQLiteBackend:
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, namespace TEXT, version TEXT, created_at REAL, value TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, namespace: str, version: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, namespace, version, created_at, value) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, version, time.time(), json.dumps(value))
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def invalidate(self, namespace: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        clauses, args = [], []
+        if namespace is not None:
+            clauses.append("namespace = ?")
+            args.append(namespace)
+        if keep_version is not None:
+            clauses.append("version != ?")
+            args.append(keep_version)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM llm_cache{where}", args)
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class LLMCache:
+    """Memoizes LLM answers keyed by model, temperature, prompt/schema version and document text."""
+
+    def __init__(self, backend, ttl: float = LLM_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(namespace: str, model: str, temperature: float, version: str, *inputs: Any) -> str:
+        return f"{namespace}:{model}:{temperature}:{version}:{text_hash(*inputs)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        namespace = key.split(":", 1)[0]
+        entry = self.backend.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if self.ttl <= 0 or time.time() - created_at <= self.ttl:
+                self.hits += 1
+                telemetry.count("llm_cache_requests_total", namespace=namespace, result="hit")
+                return value
+            self.backend.delete(key)
+        self.misses += 1
+        telemetry.count("llm_cache_requests_total", namespace=namespace, result="miss")
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        namespace, _, _, version, _ = key.split(":", 4)
+        self.backend.set(key, namespace, version, value)
+
+    def invalidate(self, namespace: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        """Drop cached answers, optionally only those of a namespace built from another version."""
+        return self.backend.invalidate(namespace, keep_version)
+
+
+def build_cache() -> Optional[LLMCache]:
+    if LLM_CACHE_BACKEND == "memory":
+        return LLMCache(MemoryBackend())
+    if LLM_CACHE_BACKEND == "sqlite":
+        return LLMCache(SQLiteBackend())
+    return None
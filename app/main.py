@@ -1,64 +1,43 @@
 import streamlit as st
-import tempfile
+import io
 import json
-import os
-from dotenv import load_dotenv
-from agent_loop import agentic_extraction
+from clients import load_env
 
-load_dotenv()
+# Module-level settings are read from the environment at import time.
+load_env()
+
+from schemas import ExtractionResult
+from ui_jobs import JobManager, QUEUED, RUNNING, DONE, FAILED
 
 st.set_page_config(page_title="DocuExtract AI", layout="wide")
 
-st.title("📄 Agentic Document Extraction")
-st.caption("Extract structured data from documents with AI-powered validation")
 
-with st.sidebar:
-    st.header("Configuration")
-    uploaded_file = st.file_uploader(
-        "Upload document", 
-        type=["pdf", "png", "jpg", "jpeg"],
-        accept_multiple_files=False
-    )
-    fields_input = st.text_input(
-        "Fields to extract (comma separated, leave blank for auto-detection)"
-    )
-    auto_detect = st.checkbox("Auto-detect document type", True)
-    st.divider()
-    st.markdown("**Advanced Options**")
-    show_debug = st.checkbox("Show debug information", False)
-    run_button = st.button("Extract Data", type="primary")
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    # One pool per server process: jobs keep running, and finished results stay
+    # available, across reruns and browser sessions.
+    return JobManager()
 
-if uploaded_file and run_button:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        file_path = tmp_file.name
-    
-    fields = [f.strip() for f in fields_input.split(",")] if fields_input else None
-    
-    with st.spinner("Processing document..."):
-        try:
-            result = agentic_extraction(file_path, fields, auto_detect)
-        except Exception as e:
-            st.error(f"Error during extraction: {str(e)}")
-            st.stop()
-    
+
+def render_result(result: ExtractionResult, show_debug: bool, key: str) -> None:
     st.subheader("Extraction Results")
     st.json(result.model_dump())
-    
+
     st.download_button(
         label="Download JSON",
         data=json.dumps(result.model_dump(), indent=2),
         file_name="extraction_result.json",
-        mime="application/json"
+        mime="application/json",
+        key=f"download-{key}"
     )
-    
+
     st.subheader("Confidence Analysis")
     col1, col2 = st.columns([1, 3])
     with col1:
         st.metric("Overall Confidence", f"{result.overall_confidence*100:.1f}%")
     with col2:
         st.progress(result.overall_confidence)
-    
+
     for field in result.fields:
         col1, col2 = st.columns([2, 4])
         with col1:
@@ -67,7 +46,7 @@ if uploaded_file and run_button:
         with col2:
             st.caption(f"Confidence: {field.confidence*100:.1f}%")
             st.progress(field.confidence)
-    
+
     st.subheader("Validation Report")
     if result.qa.passed_rules:
         st.success(f"**Passed rules:** {', '.join(result.qa.passed_rules)}")
@@ -75,18 +54,110 @@ if uploaded_file and run_button:
         st.error(f"**Failed rules:** {', '.join(result.qa.failed_rules)}")
     if result.qa.notes:
         st.warning(result.qa.notes)
-    
+
     if show_debug:
         st.subheader("Debug Information")
         st.json(result.model_dump(mode="json"))
 
+
+def fields_parquet(results: list) -> bytes:
+    # Built only when the button is clicked.
+    from results_export import ResultsWriter
+
+    buffer = io.BytesIO()
+    with ResultsWriter(buffer) as writer:
+        for name, result in results:
+            writer.write(name, result)
+    return buffer.getvalue()
+
+
+def render_progress(job: dict) -> None:
+    if job["status"] == QUEUED:
+        st.caption("Waiting for a free worker...")
+        return
+    total = max(1, job["pages_total"])
+    done = min(job["pages_done"], total)
+    stage = job["stage"] or "starting"
+    st.progress(done / total, text=f"{stage}: {done}/{total} pages OCR'd")
+    if job["preview"]:
+        st.caption("Preliminary values found on the pages so far")
+        st.table([{"field": name, "value": value} for name, value in job["preview"].items()])
+
+
+st.title("📄 Agentic Document Extraction")
+st.caption("Extract structured data from documents with AI-powered validation")
+
+with st.sidebar:
+    st.header("Configuration")
+    uploaded_files = st.file_uploader(
+        "Upload documents",
+        type=["pdf", "png", "jpg", "jpeg"],
+        accept_multiple_files=True
+    )
+    fields_input = st.text_input(
+        "Fields to extract (comma separated, leave blank for auto-detection)"
+    )
+    auto_detect = st.checkbox("Auto-detect document type", True)
+    st.divider()
+    st.markdown("**Advanced Options**")
+    show_debug = st.checkbox("Show debug information", False)
+    run_button = st.button("Extract Data", type="primary")
+    if st.session_state.get("job_ids") and st.button("Clear results"):
+        st.session_state["job_ids"] = []
+
+manager = get_job_manager()
+job_ids = st.session_state.setdefault("job_ids", [])
+
+if uploaded_files and run_button:
+    fields = [f.strip() for f in fields_input.split(",")] if fields_input else None
+    for uploaded_file in uploaded_files:
+        # Re-submitting an unchanged file returns the existing job instead of re-running it.
+        job_id = manager.submit(uploaded_file.getvalue(), uploaded_file.name, fields, auto_detect)
+        if job_id not in job_ids:
+            job_ids.append(job_id)
+
+
+@st.fragment(run_every=1.0)
+def jobs_panel() -> None:
+    jobs = [job for job in (manager.get(job_id) for job_id in job_ids) if job is not None]
+    active = sum(1 for job in jobs if job["status"] in (QUEUED, RUNNING))
+    finished = [job for job in jobs if job["status"] == DONE]
+    st.caption(f"{len(finished)} done, {active} in progress, {len(jobs) - len(finished) - active} failed")
+    if finished:
+        st.download_button(
+            label="Download all results (JSONL)",
+            data="\n".join(json.dumps({"file": job["name"], **job["result"]}) for job in finished),
+            file_name="extraction_results.jsonl",
+            mime="application/json",
+            key="download-all"
+        )
+        st.download_button(
+            label="Download all fields (Parquet)",
+            data=lambda: fields_parquet([(job["name"], job["result"]) for job in finished]),
+            file_name="extraction_fields.parquet",
+            mime="application/vnd.apache.parquet",
+            key="download-parquet"
+        )
+    for job in jobs:
+        label = f"{job['name']} — {job['status']} ({job['elapsed_s']:.1f}s)"
+        with st.expander(label, expanded=len(jobs) == 1 or job["status"] != DONE):
+            if job["status"] == DONE:
+                render_result(ExtractionResult.model_validate(job["result"]), show_debug, job["id"])
+            elif job["status"] == FAILED:
+                st.error(f"Error during extraction: {job['error']}")
+            else:
+                render_progress(job)
+
+
+if job_ids:
+    jobs_panel()
 else:
-    st.info("Upload a document and click 'Extract Data' to begin")
+    st.info("Upload one or more documents and click 'Extract Data' to begin")
     with st.expander("Sample Document Formats"):
         st.markdown("""
-        - **Invoices**: Should contain vendor info, line items, totals  
-        - **Medical Bills**: Patient info, provider, charges, insurance  
-        - **Prescriptions**: Patient info, medication, dosage, refills  
+        - **Invoices**: Should contain vendor info, line items, totals
+        - **Medical Bills**: Patient info, provider, charges, insurance
+        - **Prescriptions**: Patient info, medication, dosage, refills
         """)
 
 if __name__ == "__main__":
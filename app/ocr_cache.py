@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from file_store import atomic_write_json, file_lock
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(".cache", "ocr"))
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+
+# Eviction deletes down to this share of the size cap, so the directory is not rescanned on every write.
+EVICT_TO = 0.9
+
+
+class OCRCache:
+    """Content-addressed on-disk store of OCR responses with size-bounded LRU eviction.
+
+    The directory is the only index, so processes sharing it see each other's
+    entries. A hit touches the entry's mtime and eviction removes the oldest
+    files, keeping the directory as a whole under ``max_bytes``.
+    """
+
+    def __init__(self, directory: str = OCR_CACHE_DIR, max_bytes: int = int(OCR_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Size of the directory at the last scan plus this process's writes since; None until first written to.
+        self._total_bytes: Optional[int] = None
+
+    @staticmethod
+    def key(image: Image.Image, params: Dict[str, str]) -> str:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        digest = hashlib.sha256()
+        digest.update(f"{image.width}x{image.height}".encode())
+        digest.update(image.tobytes())
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """(mtime, path, size) of every entry on disk, least recently used first."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # evicted by another process meanwhile
+                found.append((stat.st_mtime, path, stat.st_size))
+        found.sort()
+        return found
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        telemetry.count("ocr_cache_requests_total", result="miss")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self._miss()
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable OCR cache entry {key}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._miss()
+            return None
+        with self._lock:
+            self.hits += 1
+        telemetry.count("ocr_cache_requests_total", result="hit")
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        path = self._path(key)
+        atomic_write_json(path, result)
+        size = os.path.getsize(path)
+        with self._lock:
+            due = self._total_bytes is None or self._total_bytes + size > self.max_bytes
+            if not due:
+                self._total_bytes += size
+        if due:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries of the whole directory until it is back under the cap."""
+        evicted = 0
+        with file_lock(os.path.join(self.directory, ".lock")):
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            if total > self.max_bytes:
+                for _, path, size in entries[:-1]:
+                    if total <= self.max_bytes * EVICT_TO:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._total_bytes = total
+            self.evictions += evicted
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._scan()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+            }
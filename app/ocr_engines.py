@@ -0,0 +1,214 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+OCR_ENGINE = os.getenv("OCR_ENGINE", "ocrspace").lower()
+OCR_FALLBACK_THRESHOLD = float(os.getenv("OCR_FALLBACK_THRESHOLD", "0.6"))
+OCR_FALLBACK_MIN_CHARS = int(os.getenv("OCR_FALLBACK_MIN_CHARS", "20"))
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+TESSERACT_CONFIG = os.getenv("TESSERACT_CONFIG", "--oem 1 --psm 3")
+TESSERACT_PROCESSES = int(os.getenv("TESSERACT_PROCESSES", str(os.cpu_count() or 2)))
+
+DEFAULT_WORD_CONFIDENCE = 0.9
+
+
+class OCREngine(ABC):
+    """Produces OCR.space-shaped responses: ParsedResults[0] with ParsedText and TextOverlay.Lines."""
+
+    name = "base"
+
+    def cache_params(self) -> Dict[str, str]:
+        return {"engine": self.name}
+
+    @abstractmethod
+    def recognize(self, image: Image.Image) -> dict:
+        ...
+
+    @staticmethod
+    def mean_confidence(result: dict) -> Optional[float]:
+        """Mean of the word confidences the engine reported; None when it reports none, as OCR.space does."""
+        confidences = [
+            word["Confidence"]
+            for parsed in result.get("ParsedResults", [])
+            for line in parsed.get("TextOverlay", {}).get("Lines", [])
+            for word in line.get("Words", [])
+            if "Confidence" in word
+        ]
+        return sum(confidences) / len(confidences) if confidences else None
+
+    @staticmethod
+    def text_length(result: dict) -> int:
+        """Non-whitespace characters in ParsedText."""
+        return sum(len("".join(parsed.get("ParsedText", "").split())) for parsed in result.get("ParsedResults", []))
+
+
+class RemoteOCREngine(OCREngine):
+    """OCR.space HTTP API; quota, retries and backoff are handled inside ocr_fn by the OCR scheduler."""
+
+    name = "ocrspace"
+
+    def __init__(self, ocr_fn: Callable[[Image.Image], dict], params: Dict[str, str]):
+        self.ocr_fn = ocr_fn
+        self.params = params
+
+    def cache_params(self) -> Dict[str, str]:
+        return {"engine": self.name, **self.params}
+
+    def recognize(self, image: Image.Image) -> dict:
+        return self.ocr_fn(image)
+
+
+def tesseract_to_overlay(data: Dict[str, List]) -> dict:
+    """Convert pytesseract.image_to_data output into the OCR.space response shape."""
+    lines = {}
+    for i, text in enumerate(data["text"]):
+        text = (text or "").strip()
+        conf = float(data["conf"][i])
+        if not text or conf < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append({
+            "WordText": text,
+            "Left": int(data["left"][i]),
+            "Top": int(data["top"][i]),
+            "Width": int(data["width"][i]),
+            "Height": int(data["height"][i]),
+            "Confidence": round(conf / 100.0, 4),
+        })
+    overlay_lines = []
+    text_lines = []
+    previous_block = None
+    for key in sorted(lines):
+        words = lines[key]
+        line_text = " ".join(word["WordText"] for word in words)
+        if previous_block is not None and key[0] != previous_block:
+            text_lines.append("")
+        previous_block = key[0]
+        text_lines.append(line_text)
+        overlay_lines.append({
+            "LineText": line_text,
+            "Words": words,
+            "MaxHeight": max(word["Height"] for word in words),
+            "MinTop": min(word["Top"] for word in words),
+        })
+    return {
+        "ParsedResults": [{
+            "ParsedText": "\n".join(text_lines),
+            "TextOverlay": {"Lines": overlay_lines, "HasOverlay": bool(overlay_lines)},
+        }],
+        "IsErroredOnProcessing": False,
+    }
+
+
+def _run_tesseract(image: Image.Image, lang: str, config: str) -> dict:
+    import pytesseract
+
+    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    return tesseract_to_overlay(data)
+
+
+class TesseractEngine(OCREngine):
+    """In-process Tesseract, fanned out over a process pool shared by all documents."""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = TESSERACT_LANG, config: str = TESSERACT_CONFIG,
+                 processes: int = TESSERACT_PROCESSES):
+        self.lang = lang
+        self.config = config
+        self.processes = max(1, processes)
+        self._pool = None
+
+    def cache_params(self) -> Dict[str, str]:
+        return {"engine": self.name, "language": self.lang, "config": self.config}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        return self._pool
+
+    def recognize(self, image: Image.Image) -> dict:
+        return self._executor().submit(_run_tesseract, image, self.lang, self.config).result()
+
+
+class FallbackOCREngine(OCREngine):
+    """Runs the primary engine and retries on the fallback when the primary's page looks unusable.
+
+    That is when the primary raises, reports a failed or partial parse (OCRExitCode
+    above 1), returns fewer than ``min_chars`` characters of text, or, for engines
+    that report word confidence, when the mean confidence is below ``threshold``.
+    """
+
+    def __init__(self, primary: OCREngine, fallback: OCREngine, threshold: float = OCR_FALLBACK_THRESHOLD,
+                 min_chars: int = OCR_FALLBACK_MIN_CHARS):
+        self.primary = primary
+        self.fallback = fallback
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def cache_params(self) -> Dict[str, str]:
+        return {
+            "engine": self.name,
+            "threshold": str(self.threshold),
+            "min_chars": str(self.min_chars),
+            "primary": str(sorted(self.primary.cache_params().items())),
+            "fallback": str(sorted(self.fallback.cache_params().items())),
+        }
+
+    def fallback_reason(self, result: dict) -> Optional[str]:
+        """Why the primary's result should be redone on the fallback, or None to keep it."""
+        exit_code = int(result.get("OCRExitCode", 1))
+        if result.get("IsErroredOnProcessing") or exit_code > 1:
+            return f"exit code {exit_code}"
+        chars = self.text_length(result)
+        if chars < self.min_chars:
+            return f"returned {chars} characters"
+        confidence = self.mean_confidence(result)
+        if confidence is not None and confidence < self.threshold:
+            return f"confidence {confidence:.2f} below {self.threshold}"
+        return None
+
+    def recognize(self, image: Image.Image) -> dict:
+        try:
+            result = self.primary.recognize(image)
+        except Exception as e:
+            result, reason = None, f"failed: {e}"
+        else:
+            reason = self.fallback_reason(result)
+            if reason is None:
+                return result
+        logger.info(f"{self.primary.name} {reason}; using {self.fallback.name}")
+        try:
+            return self.fallback.recognize(image)
+        except Exception as e:
+            if result is None:
+                raise
+            logger.warning(f"Fallback OCR engine {self.fallback.name} failed: {e}")
+            return result
+
+
+def build_engine(spec: str, remote_factory: Callable[[], OCREngine]) -> OCREngine:
+    """Build an engine from a spec such as "ocrspace", "tesseract" or "tesseract+ocrspace".
+
+    The remote engine is only constructed when the spec names it, so offline
+    deployments need no OCR.space credentials.
+    """
+    engines = []
+    for name in spec.split("+"):
+        name = name.strip()
+        if name == "tesseract":
+            engines.append(TesseractEngine())
+        elif name == "ocrspace":
+            engines.append(remote_factory())
+        else:
+            raise ValueError(f"Unknown OCR engine: {name}")
+    engine = engines[0]
+    for fallback in engines[1:]:
+        engine = FallbackOCREngine(engine, fallback)
+    return engine
@@ -0,0 +1,125 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+PAGE_FILTER_ENABLED = os.getenv("PAGE_FILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Share of dark pixels below which a page counts as blank and is not OCR'd. A single
+# short line such as a signature or "Total Due" on a letter page is around 2e-4.
+BLANK_INK_RATIO = float(os.getenv("BLANK_INK_RATIO", "0.0001"))
+# Pages below this share are sparse: still OCR'd, but never treated as duplicates,
+# since a few lines on an otherwise white page look alike at thumbnail size.
+SPARSE_INK_RATIO = float(os.getenv("SPARSE_INK_RATIO", "0.01"))
+# Maximum differing bits (of 256) between perceptual hashes of duplicate pages.
+DUPLICATE_HASH_DISTANCE = int(os.getenv("DUPLICATE_HASH_DISTANCE", "6"))
+# Maximum mean absolute difference (0-255) between 64x64 thumbnails of duplicate pages.
+DUPLICATE_PIXEL_DIFF = float(os.getenv("DUPLICATE_PIXEL_DIFF", "3.0"))
+INK_THRESHOLD = 160
+ANALYSIS_WIDTH = 512
+HASH_SIZE = 16
+THUMB_SIZE = 64
+
+BLANK = "blank"
+DUPLICATE = "duplicate"
+SPARSE = "sparse"
+
+
+class PageFilterStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.blank = 0
+        self.duplicates = 0
+        self.sparse = 0
+
+    def record(self, verdict: Optional[str]) -> None:
+        with self._lock:
+            self.pages += 1
+            if verdict == BLANK:
+                self.blank += 1
+            elif verdict == DUPLICATE:
+                self.duplicates += 1
+            elif verdict == SPARSE:
+                self.sparse += 1
+
+    @property
+    def ocr_calls_avoided(self) -> int:
+        return self.blank + self.duplicates
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "blank": self.blank,
+                "duplicates": self.duplicates,
+                "sparse": self.sparse,
+                "ocr_calls_avoided": self.blank + self.duplicates,
+            }
+
+
+page_filter_stats = PageFilterStats()
+
+
+def _gray(image: Image.Image) -> Image.Image:
+    factor = image.width // ANALYSIS_WIDTH
+    if factor > 1:
+        # Box-reduce first so the colour conversion runs on the small image.
+        image = image.reduce(factor)
+    gray = image.convert("L")
+    if gray.width > ANALYSIS_WIDTH:
+        height = max(1, int(gray.height * ANALYSIS_WIDTH / gray.width))
+        gray = gray.resize((ANALYSIS_WIDTH, height), Image.BILINEAR)
+    return gray
+
+
+def ink_ratio(gray: Image.Image) -> float:
+    return float((np.asarray(gray) < INK_THRESHOLD).mean())
+
+
+def dhash(gray: Image.Image, size: int = HASH_SIZE) -> np.ndarray:
+    """Difference hash: sign of horizontal gradients on a (size+1) x size thumbnail."""
+    pixels = np.asarray(gray.resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+class PageFilter:
+    """Per-document pre-OCR filter that flags blank pages and near-duplicates of earlier pages."""
+
+    def __init__(self, blank_ratio: float = BLANK_INK_RATIO,
+                 max_distance: int = DUPLICATE_HASH_DISTANCE,
+                 max_pixel_diff: float = DUPLICATE_PIXEL_DIFF,
+                 sparse_ratio: float = SPARSE_INK_RATIO):
+        self.blank_ratio = blank_ratio
+        self.sparse_ratio = sparse_ratio
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self._seen: List[Tuple[int, np.ndarray, np.ndarray]] = []
+
+    def check(self, page_num: int, image: Image.Image) -> Tuple[Optional[str], Optional[int]]:
+        """Returns (BLANK, None), (DUPLICATE, twin page index), (SPARSE, None) or (None, None).
+
+        Only BLANK and DUPLICATE pages skip OCR. SPARSE pages are OCR'd; the
+        upload preprocessing crops them to their ink, so they stay cheap.
+        """
+        gray = _gray(image)
+        verdict, twin = None, None
+        ratio = ink_ratio(gray)
+        if ratio < self.blank_ratio:
+            verdict = BLANK
+        elif ratio < self.sparse_ratio:
+            verdict = SPARSE
+        else:
+            bits = dhash(gray)
+            thumb = np.asarray(gray.resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR), dtype=np.float32)
+            for seen_page, seen_bits, seen_thumb in self._seen:
+                # The hash narrows candidates cheaply; the thumbnail diff guards against
+                # distinct pages that share a template (e.g. consecutive line-item pages).
+                if int(np.count_nonzero(bits != seen_bits)) <= self.max_distance \
+                        and float(np.abs(thumb - seen_thumb).mean()) <= self.max_pixel_diff:
+                    verdict, twin = DUPLICATE, seen_page
+                    break
+            else:
+                self._seen.append((page_num, bits, thumb))
+        page_filter_stats.record(verdict)
+        return verdict, twin
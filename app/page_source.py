@@ -0,0 +1,63 @@
+import os
+from typing import Iterator, Tuple
+import pdf2image
+from PIL import Image
+
+PDF_DPI = int(os.getenv("PDF_DPI", "300"))
+PDF_RENDER_WINDOW = int(os.getenv("PDF_RENDER_WINDOW", "2"))
+
+
+def is_pdf(file_path: str) -> bool:
+    return file_path.lower().endswith(".pdf")
+
+
+def page_count(file_path: str) -> int:
+    if is_pdf(file_path):
+        return int(pdf2image.pdfinfo_from_path(file_path)["Pages"])
+    return 1
+
+
+def render_pages(file_path: str, first_page: int, last_page: int, dpi: int = PDF_DPI) -> list:
+    """Render the 1-based inclusive page range of a PDF."""
+    return pdf2image.convert_from_path(
+        file_path, dpi=dpi, first_page=first_page, last_page=last_page
+    )
+
+
+class PageHandle:
+    """Lazy reference to one page of a document; pixels are decoded only on load()."""
+
+    def __init__(self, file_path: str, page_number: int, dpi: int = PDF_DPI):
+        self.file_path = file_path
+        self.page_number = page_number
+        self.dpi = dpi
+
+    def load(self) -> Image.Image:
+        if is_pdf(self.file_path):
+            return render_pages(self.file_path, self.page_number, self.page_number, self.dpi)[0]
+        img = Image.open(self.file_path)
+        img.load()
+        return img
+
+    def __repr__(self) -> str:
+        return f"PageHandle({self.file_path!r}, page={self.page_number})"
+
+
+def iter_page_images(file_path: str, dpi: int = PDF_DPI,
+                     window: int = PDF_RENDER_WINDOW) -> Iterator[Tuple[int, Image.Image]]:
+    """Yield (0-based page index, image) pairs, rasterizing at most `window` pages at a time."""
+    if not is_pdf(file_path):
+        img = Image.open(file_path)
+        img.load()
+        yield 0, img
+        return
+    total = page_count(file_path)
+    window = max(1, window)
+    for first in range(1, total + 1, window):
+        last = min(total, first + window - 1)
+        batch = render_pages(file_path, first, last, dpi)
+        for offset in range(len(batch)):
+            img = batch[offset]
+            batch[offset] = None
+            yield first - 1 + offset, img
+            del img
@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from utils.helpers import normalize_date, extract_currency, extract_email, extract_phone
+
+PRE_EXTRACTION_ENABLED = os.getenv("PRE_EXTRACTION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+DATE = (
+    r"\d{4}-\d{2}-\d{2}"
+    r"|\d{1,2}[/.-]\d{1,2}[/.-]\d{4}"
+    r"|[A-Z][a-z]{2,8} \d{1,2}, \d{4}"
+    r"|\d{1,2} [A-Z][a-z]{2,8} \d{4}"
+)
+AMOUNT = r"\$?\d{1,3}(?:,\d{3})+(?:\.\d{2})?(?![\d,])|\$?\d+\.\d{2}(?!\d)"
+# Must contain a digit and must not be a date, e.g. the date printed next to an "INVOICE" heading.
+IDENTIFIER = rf"(?!(?:{DATE})(?![A-Za-z0-9/-]))(?=[A-Za-z0-9/-]*\d)[A-Za-z0-9][A-Za-z0-9/-]{{2,}}"
+NAME = r"(?:Dr\. )?[A-Z][A-Za-z'.-]+(?: [A-Z][A-Za-z'.-]*){1,3}"
+EMAIL = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+PHONE = r"\+?\(?\d{1,4}\)?[-. ]?\d{3,4}[-. ]?\d{3,4}"
+SMALL_INT = r"\d{1,3}(?!\d)"
+PERCENT = r"\d{1,2}(?:\.\d{1,2})? ?%"
+
+# Separators allowed between a label and its value, e.g. "Invoice No.: INV-42".
+SEPARATOR = r"(?i:[ \t]*[:#.\-]?[ \t]*(?:no\.?|number|#)?[ \t]*[:#.\-]?[ \t]*)"
+
+
+class FieldRule(NamedTuple):
+    label: str
+    value: str
+    normalize: Optional[Callable[[str], str]] = None
+
+
+def _amount(value: str) -> str:
+    return value.replace(" ", "")
+
+
+def _checked(extractor: Callable[[str], str]) -> Callable[[str], str]:
+    return lambda value: extractor(value) or ""
+
+
+FIELD_RULES: Dict[str, FieldRule] = {}
+
+
+@lru_cache(maxsize=64)
+def _compile(names: tuple) -> "re.Pattern":
+    # One alternation over the requested rules; the value of rule i lands in group f{i}.
+    alternatives = [
+        rf"\b(?i:{FIELD_RULES[name].label}){SEPARATOR}(?P<f{i}>{FIELD_RULES[name].value})"
+        for i, name in enumerate(names)
+    ]
+    return re.compile("|".join(alternatives))
+
+
+def register_rule(field: str, label: str, value: str, normalize: Callable[[str], str] = None) -> None:
+    """Register a label/value pattern for a field name from DEFAULT_FIELDS."""
+    FIELD_RULES[field] = FieldRule(label, value, normalize)
+    _compile.cache_clear()
+
+
+# A bare "invoice" is usually the document heading; the number follows "No.", "Number", "#" or ":".
+register_rule("invoice_number", r"invoice(?=[ \t]*(?:no\b|no\.|number|#|:))", IDENTIFIER)
+register_rule("invoice_date", r"invoice[ \t]*date", DATE, normalize_date)
+register_rule("due_date", r"(?:due[ \t]*date|payment[ \t]*due)", DATE, normalize_date)
+register_rule("purchase_order_number", r"(?:purchase[ \t]*order|p\.?o\.?)", IDENTIFIER)
+register_rule("subtotal", r"sub[ \t-]*total", AMOUNT, _amount)
+register_rule("tax_rate", r"tax[ \t]*rate", PERCENT)
+register_rule("tax_amount", r"(?:total[ \t]*)?(?:tax|vat|gst)(?:[ \t]*amount)?(?:[ \t]*\(\d{1,2}(?:\.\d{1,2})?[ \t]*%\))?", AMOUNT, _amount)
+register_rule("shipping_charges", r"(?:shipping|freight|delivery)(?:[ \t]*charges?)?", AMOUNT, _amount)
+register_rule("discount", r"discount", AMOUNT, _amount)
+register_rule("amount_due", r"(?:amount|balance)[ \t]*due", AMOUNT, _amount)
+register_rule("amount_paid", r"amount[ \t]*paid", AMOUNT, _amount)
+register_rule("total_charges", r"total[ \t]*charges", AMOUNT, _amount)
+register_rule("total_amount", r"(?:grand[ \t]*)?total(?:[ \t]*amount)?(?:[ \t]*due)?", AMOUNT, _amount)
+register_rule("currency", r"currency", r"[A-Z]{3}|[$£¥]", _checked(extract_currency))
+register_rule("vendor_email", r"(?:vendor|seller|supplier)[ \t]*e-?mail", EMAIL, _checked(extract_email))
+register_rule("customer_email", r"(?:customer|buyer|client)[ \t]*e-?mail", EMAIL, _checked(extract_email))
+register_rule("vendor_phone", r"(?:vendor|seller|supplier)[ \t]*(?:phone|tel)", PHONE, _checked(extract_phone))
+register_rule("customer_phone", r"(?:customer|buyer|client)[ \t]*(?:phone|tel)", PHONE, _checked(extract_phone))
+
+register_rule("patient_name", r"(?:patient[ \t]*name|patient(?=[ \t]*:))", NAME)
+register_rule("patient_id", r"(?:patient[ \t]*id|mrn)", IDENTIFIER)
+register_rule("patient_dob", r"(?:dob|d\.o\.b\.|date[ \t]*of[ \t]*birth|birth[ \t]*date)", DATE, normalize_date)
+register_rule("bill_number", r"(?:bill|statement|account)", IDENTIFIER)
+register_rule("bill_date", r"(?:bill|statement)[ \t]*date", DATE, normalize_date)
+register_rule("service_date", r"(?:date[ \t]*of[ \t]*service|service[ \t]*date|dos)", DATE, normalize_date)
+register_rule("admission_date", r"(?:admission|admit)[ \t]*date", DATE, normalize_date)
+register_rule("discharge_date", r"discharge[ \t]*date", DATE, normalize_date)
+register_rule("insurance_claim_number", r"claim", IDENTIFIER)
+register_rule("insurance_policy_number", r"policy", IDENTIFIER)
+
+register_rule("prescription_number", r"(?:rx|prescription)", IDENTIFIER)
+register_rule("prescriber_license_number", r"(?:license|lic\.?|dea)", IDENTIFIER)
+register_rule("issue_date", r"(?:issue[ \t]*date|date[ \t]*issued|date[ \t]*written)", DATE, normalize_date)
+register_rule("valid_until", r"(?:valid[ \t]*until|expir(?:y|es|ation)(?:[ \t]*date)?)", DATE, normalize_date)
+register_rule("refill_count", r"refills?(?:[ \t]*allowed)?", SMALL_INT)
+register_rule("quantity", r"(?:qty|quantity|disp(?:ense)?)", SMALL_INT)
+
+# Field names used by extraction.FIELD_MAPPING that differ from DEFAULT_FIELDS.
+FIELD_ALIASES = {
+    "claim_number": "insurance_claim_number",
+    "prescriber_license": "prescriber_license_number",
+    "refills": "refill_count",
+}
+
+
+def pre_extract(text: str, fields: List[str]) -> Dict[str, str]:
+    """Fill the requested fields that have a rule, scanning the text once.
+
+    The first occurrence of each field's label/value pattern wins. Fields
+    without a rule or without a match are left out of the result.
+    """
+    wanted = {FIELD_ALIASES.get(field, field): field for field in fields}
+    wanted = {name: field for name, field in wanted.items() if name in FIELD_RULES}
+    if not wanted:
+        return {}
+    names = tuple(sorted(wanted))
+    pattern = _compile(names)
+    found = {}
+    for match in pattern.finditer(text):
+        index = int(match.lastgroup[1:])
+        name = names[index]
+        field = wanted.get(name)
+        if field is None or field in found:
+            continue
+        value = match.group(match.lastgroup).strip()
+        normalize = FIELD_RULES[name].normalize
+        if normalize:
+            value = normalize(value)
+        if value:
+            found[field] = value
+            if len(found) == len(wanted):
+                break
+    return found
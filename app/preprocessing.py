@@ -0,0 +1,237 @@
+import io
+import logging
+import math
+import os
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+OCR_PREPROCESS_ENABLED = os.getenv("OCR_PREPROCESS_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_PREPROCESS_REPORT = os.getenv("OCR_PREPROCESS_REPORT", "false").lower() in ("1", "true", "yes")
+# OCR.space rejects uploads above 1 MB on the free tier.
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_BYTES", str(1024 * 1024)))
+# Target height in pixels of a text line (ascender to descender) after downscaling.
+OCR_TARGET_LINE_HEIGHT = int(os.getenv("OCR_TARGET_LINE_HEIGHT", "32"))
+OCR_DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "3"))
+JPEG_MAX_QUALITY = 85
+JPEG_MIN_QUALITY = 35
+INK_THRESHOLD = 160
+CROP_MARGIN = 16
+ANALYSIS_WIDTH = 800
+
+PREPROCESS_PARAMS = {
+    "preprocess": str(OCR_PREPROCESS_ENABLED),
+    "max_upload_bytes": str(OCR_MAX_UPLOAD_BYTES),
+    "target_line_height": str(OCR_TARGET_LINE_HEIGHT),
+    "deskew_max_angle": str(OCR_DESKEW_MAX_ANGLE),
+    # Bumped when map_overlay_to_source changes, so cached and stored boxes are redone.
+    "box_mapping": "2",
+}
+
+
+class PreparedImage(NamedTuple):
+    payload: bytes
+    quality: int
+    scale: float
+    offset: Tuple[int, int]
+    angle: float
+    size: Tuple[int, int]
+    bytes_before: Optional[int]
+
+
+class UploadStats:
+    """Running totals of OCR upload sizes after preprocessing, and before it where that was measured.
+
+    The size before preprocessing costs an extra full-page JPEG encode, so it is
+    only measured with OCR_PREPROCESS_REPORT on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.bytes_after = 0
+        self.measured_pages = 0
+        self.measured_before = 0
+        self.measured_after = 0
+
+    def record(self, before: Optional[int], after: int) -> None:
+        with self._lock:
+            self.pages += 1
+            self.bytes_after += after
+            if before is not None:
+                self.measured_pages += 1
+                self.measured_before += before
+                self.measured_after += after
+
+    def summary(self) -> Dict[str, float]:
+        """Pages and bytes per page uploaded; the before/after comparison only covers measured pages."""
+        with self._lock:
+            summary = {"pages": self.pages, "bytes_per_page_after": self.bytes_after / max(1, self.pages)}
+            if self.measured_pages:
+                summary.update(
+                    measured_pages=self.measured_pages,
+                    bytes_per_page_before=self.measured_before / self.measured_pages,
+                    reduction=1 - self.measured_after / max(1, self.measured_before),
+                )
+            return summary
+
+
+upload_stats = UploadStats()
+
+
+def encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    return gray < INK_THRESHOLD
+
+
+def content_box(gray: np.ndarray, margin: int = CROP_MARGIN) -> Tuple[int, int, int, int]:
+    """Bounding box of inked pixels plus a margin; the whole image when the page is blank."""
+    mask = ink_mask(gray)
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    height, width = gray.shape
+    if not len(rows) or not len(cols):
+        return 0, 0, width, height
+    return (
+        max(0, int(cols[0]) - margin),
+        max(0, int(rows[0]) - margin),
+        min(width, int(cols[-1]) + margin + 1),
+        min(height, int(rows[-1]) + margin + 1),
+    )
+
+
+def estimate_skew(gray_image: Image.Image, max_angle: float = OCR_DESKEW_MAX_ANGLE, step: float = 0.5) -> float:
+    """Angle that maximizes the variance of the row ink profile, searched on a thumbnail."""
+    if max_angle <= 0:
+        return 0.0
+    factor = min(1.0, ANALYSIS_WIDTH / gray_image.width)
+    thumb = gray_image.resize((max(1, int(gray_image.width * factor)), max(1, int(gray_image.height * factor))))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = np.asarray(thumb.rotate(float(angle), fillcolor=255))
+        score = float(ink_mask(rotated).sum(axis=1).var())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def estimate_line_height(gray: np.ndarray) -> Optional[float]:
+    """Median height of runs of inked rows, i.e. the typical text line height."""
+    inked = ink_mask(gray).mean(axis=1) > 0.002
+    edges = np.diff(np.concatenate(([0], inked.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    heights = ends - starts
+    heights = heights[heights >= 4]
+    return float(np.median(heights)) if len(heights) else None
+
+
+def prepare_for_upload(image: Image.Image, byte_budget: int = OCR_MAX_UPLOAD_BYTES,
+                       report: bool = OCR_PREPROCESS_REPORT) -> PreparedImage:
+    """Grayscale, deskew, crop margins, downscale to the target line height and fit the byte budget."""
+    bytes_before = len(encode_jpeg(image.convert("RGB"), JPEG_MAX_QUALITY)) if report else None
+    gray_image = image.convert("L")
+    angle = estimate_skew(gray_image)
+    if angle:
+        gray_image = gray_image.rotate(angle, resample=Image.BICUBIC, fillcolor=255)
+    gray = np.asarray(gray_image)
+    left, top, right, bottom = content_box(gray)
+    gray_image = gray_image.crop((left, top, right, bottom))
+    line_height = estimate_line_height(gray[top:bottom, left:right])
+    scale = 1.0
+    if line_height and line_height > OCR_TARGET_LINE_HEIGHT:
+        scale = OCR_TARGET_LINE_HEIGHT / line_height
+    payload, quality = b"", JPEG_MAX_QUALITY
+    while True:
+        if scale < 1.0:
+            size = (max(1, int(gray_image.width * scale)), max(1, int(gray_image.height * scale)))
+            resized = gray_image.resize(size, Image.LANCZOS)
+        else:
+            resized = gray_image
+        payload, quality = _fit_quality(resized, byte_budget)
+        if len(payload) <= byte_budget or scale < 0.2:
+            break
+        # Even the lowest quality is too large: give up resolution instead.
+        scale *= 0.8
+    upload_stats.record(bytes_before, len(payload))
+    if bytes_before is not None:
+        logger.debug(f"OCR upload {bytes_before} -> {len(payload)} bytes (q={quality}, scale={scale:.2f}, angle={angle})")
+    return PreparedImage(payload, quality, scale, (left, top), angle, image.size, bytes_before)
+
+
+def _fit_quality(image: Image.Image, byte_budget: int) -> Tuple[bytes, int]:
+    """Highest JPEG quality whose encoding fits the budget, by binary search."""
+    best = encode_jpeg(image, JPEG_MAX_QUALITY)
+    if len(best) <= byte_budget:
+        return best, JPEG_MAX_QUALITY
+    low, high = JPEG_MIN_QUALITY, JPEG_MAX_QUALITY - 1
+    best, best_quality = encode_jpeg(image, low), low
+    if len(best) > byte_budget:
+        return best, low
+    while low < high:
+        mid = (low + high + 1) // 2
+        payload = encode_jpeg(image, mid)
+        if len(payload) <= byte_budget:
+            best, best_quality, low = payload, mid, mid
+        else:
+            high = mid - 1
+    return best, best_quality
+
+
+def _unrotate(prepared: PreparedImage) -> Callable[[float, float], Tuple[float, float]]:
+    """Maps a point of the deskewed page back onto the original; PIL rotated it about the centre."""
+    theta = math.radians(prepared.angle)
+    cos, sin = math.cos(theta), math.sin(theta)
+    cx, cy = prepared.size[0] / 2.0, prepared.size[1] / 2.0
+
+    def point(x: float, y: float) -> Tuple[float, float]:
+        dx, dy = x - cx, y - cy
+        return cx + dx * cos - dy * sin, cy + dx * sin + dy * cos
+
+    return point
+
+
+def map_overlay_to_source(result: dict, prepared: PreparedImage) -> dict:
+    """Convert word boxes from the uploaded image back to the original page's pixel space.
+
+    Undoes the scaling, the margin crop and the deskew rotation; a rotated
+    word box becomes the axis-aligned box around its four corners.
+    """
+    if prepared.scale == 1.0 and prepared.offset == (0, 0) and not prepared.angle:
+        return result
+    dx, dy = prepared.offset
+    inverse = 1.0 / prepared.scale
+    unrotate = _unrotate(prepared) if prepared.angle else None
+    for parsed in result.get("ParsedResults", []) or []:
+        for line in parsed.get("TextOverlay", {}).get("Lines", []):
+            words = line.get("Words", [])
+            for word in words:
+                left = word.get("Left", 0) * inverse + dx
+                top = word.get("Top", 0) * inverse + dy
+                right = left + word.get("Width", 0) * inverse
+                bottom = top + word.get("Height", 0) * inverse
+                if unrotate is not None:
+                    corners = [unrotate(x, y) for x in (left, right) for y in (top, bottom)]
+                    left, top = min(x for x, _ in corners), min(y for _, y in corners)
+                    right, bottom = max(x for x, _ in corners), max(y for _, y in corners)
+                word["Left"] = int(round(left))
+                word["Top"] = int(round(top))
+                word["Width"] = int(round(right - left))
+                word["Height"] = int(round(bottom - top))
+            if words:
+                line["MinTop"] = min(word["Top"] for word in words)
+                line["MaxHeight"] = max(word["Top"] + word["Height"] for word in words) - line["MinTop"]
+            else:
+                if "MinTop" in line:
+                    line["MinTop"] = int(round(line["MinTop"] * inverse)) + dy
+                if "MaxHeight" in line:
+                    line["MaxHeight"] = int(round(line["MaxHeight"] * inverse))
+    return result
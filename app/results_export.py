@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from schemas import ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "65536"))
+# Fields below this confidence count as low-confidence in the summary table.
+EXPORT_LOW_CONFIDENCE = float(os.getenv("EXPORT_LOW_CONFIDENCE", "0.5"))
+
+FORMATS = ("parquet", "arrow")
+
+# Running aggregate -> (column it is computed from, Arrow aggregation); partial
+# results of each row group merge with sum/min/max, so memory stays bounded.
+_AGGREGATES = {
+    "rows": ("confidence", "count"),
+    "filled": ("filled", "sum"),
+    "failed": ("failed", "sum"),
+    "low_confidence": ("low_confidence", "sum"),
+    "confidence_sum": ("confidence", "sum"),
+    "confidence_min": ("confidence", "min"),
+    "confidence_max": ("confidence", "max"),
+}
+_MERGE = {"confidence_min": min, "confidence_max": max}
+
+
+def fields_schema():
+    import pyarrow as pa
+
+    # Parquet dictionary-encodes the repetitive string columns by itself.
+    text = pa.string()
+    return pa.schema([
+        ("id", pa.string()),
+        ("doc_type", text),
+        ("overall_confidence", pa.float32()),
+        ("field", text),
+        ("value", pa.string()),
+        ("confidence", pa.float32()),
+        ("page", pa.int32()),
+        ("bbox_x0", pa.int32()),
+        ("bbox_y0", pa.int32()),
+        ("bbox_x1", pa.int32()),
+        ("bbox_y1", pa.int32()),
+        ("rules_passed", pa.list_(text)),
+        ("rules_failed", pa.list_(text)),
+        ("document_rules_failed", pa.list_(text)),
+    ])
+
+
+def summary_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("doc_type", pa.string()),
+        ("field", pa.string()),
+        ("rows", pa.int64()),
+        ("fill_rate", pa.float64()),
+        ("failure_rate", pa.float64()),
+        ("low_confidence_rate", pa.float64()),
+        ("mean_confidence", pa.float64()),
+        ("min_confidence", pa.float64()),
+        ("max_confidence", pa.float64()),
+    ])
+
+
+def _field_rules(rules: List[str], field: str) -> List[str]:
+    suffix = f"_format_{field}"
+    return [rule for rule in rules if rule.endswith(suffix)]
+
+
+def _document_rules(rules: List[str]) -> List[str]:
+    return [rule for rule in rules if "_format_" not in rule]
+
+
+_NO_LOCATION = (None, [None] * 4)
+
+
+def _location(source: Dict[str, Any]) -> Tuple[Optional[int], List[Optional[int]]]:
+    """(page, bbox) of a field's source; nulls when the value was never found on the page.
+
+    Fields that were not located keep the schema's placeholder source, whose bbox is all zeros.
+    """
+    bbox = list(source.get("bbox") or [])
+    if len(bbox) != 4 or not any(bbox):
+        return _NO_LOCATION
+    return source.get("page"), bbox
+
+
+class ResultsWriter:
+    """Flattens ExtractionResults to one row per field and streams them to Parquet or Arrow IPC.
+
+    Rows are buffered column-wise and written one row group of ``row_group_size``
+    rows at a time. Per (doc_type, field) aggregates are folded in per row group
+    and become the table returned by ``summary()``.
+    """
+
+    def __init__(self, where: Union[str, IO[bytes]], format: str = "parquet",
+                 row_group_size: int = EXPORT_ROW_GROUP_SIZE):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}; expected one of {FORMATS}")
+        self.where = where
+        self.format = format
+        self.row_group_size = max(1, row_group_size)
+        self.schema = fields_schema()
+        self.rows = 0
+        self.documents = 0
+        self._columns: Dict[str, List] = {name: [] for name in self.schema.names}
+        self._writer = None
+        self._sink = None
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, doc_id: str, result: Union[ExtractionResult, Dict[str, Any]]) -> None:
+        if isinstance(result, dict):
+            result = ExtractionResult.model_validate(result)
+        qa = result.qa
+        document_failed = _document_rules(qa.failed_rules)
+        columns = self._columns
+        for field in result.fields:
+            page, bbox = _location(field.source)
+            columns["id"].append(doc_id)
+            columns["doc_type"].append(result.doc_type)
+            columns["overall_confidence"].append(result.overall_confidence)
+            columns["field"].append(field.name)
+            columns["value"].append(field.value)
+            columns["confidence"].append(field.confidence)
+            columns["page"].append(page)
+            for name, coordinate in zip(("bbox_x0", "bbox_y0", "bbox_x1", "bbox_y1"), bbox):
+                columns[name].append(coordinate)
+            columns["rules_passed"].append(_field_rules(qa.passed_rules, field.name))
+            columns["rules_failed"].append(_field_rules(qa.failed_rules, field.name))
+            columns["document_rules_failed"].append(document_failed)
+        self.documents += 1
+        if len(columns["id"]) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+
+        if not self._columns["id"]:
+            return
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._columns = {name: [] for name in self.schema.names}
+        if self._writer is None:
+            self._writer = self._open(table.schema)
+        if self.format == "parquet":
+            self._writer.write_table(table, row_group_size=len(table))
+        else:
+            self._writer.write_table(table)
+        self.rows += len(table)
+        self._aggregate(table)
+
+    def _open(self, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.format == "parquet":
+            return pq.ParquetWriter(self.where, schema, compression="zstd")
+        if isinstance(self.where, str):
+            self._sink = pa.OSFile(self.where, "wb")
+        return pa.ipc.new_file(self._sink or self.where, schema)
+
+    def _aggregate(self, table) -> None:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        keyed = pa.table({
+            "doc_type": table["doc_type"],
+            "field": table["field"],
+            "confidence": table["confidence"].cast(pa.float64()),
+            "filled": pc.greater(pc.utf8_length(table["value"]), 0),
+            "failed": pc.greater(pc.list_value_length(table["rules_failed"]), 0),
+            "low_confidence": pc.less(table["confidence"], EXPORT_LOW_CONFIDENCE),
+        })
+        partial = keyed.group_by(["doc_type", "field"]).aggregate(
+            [(column, agg) for column, agg in _AGGREGATES.values()]
+        ).to_pydict()
+        for i, key in enumerate(zip(partial["doc_type"], partial["field"])):
+            totals = self._totals.get(key)
+            values = {name: partial[f"{column}_{agg}"][i] for name, (column, agg) in _AGGREGATES.items()}
+            if totals is None:
+                self._totals[key] = values
+            else:
+                for name, value in values.items():
+                    totals[name] = _MERGE.get(name, lambda a, b: a + b)(totals[name], value)
+
+    def summary(self):
+        """Per (doc_type, field) row counts and fill, failure, low-confidence and confidence aggregates."""
+        import pyarrow as pa
+
+        rows = []
+        for (doc_type, field), t in sorted(self._totals.items()):
+            n = t["rows"]
+            rows.append({
+                "doc_type": doc_type,
+                "field": field,
+                "rows": n,
+                "fill_rate": t["filled"] / n,
+                "failure_rate": t["failed"] / n,
+                "low_confidence_rate": t["low_confidence"] / n,
+                "mean_confidence": t["confidence_sum"] / n,
+                "min_confidence": t["confidence_min"],
+                "max_confidence": t["confidence_max"],
+            })
+        return pa.Table.from_pylist(rows, schema=summary_schema())
+
+    def close(self) -> None:
+        """Write the last row group and finish the file."""
+        self._flush()
+        if self._writer is None and self.rows == 0:
+            # No rows at all still leaves a readable, empty file.
+            self._writer = self._open(self.schema)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+
+def write_summary(table, where: Union[str, IO[bytes]], format: str = "parquet") -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if format == "parquet":
+        pq.write_table(table, where)
+        return
+    sink = pa.OSFile(where, "wb") if isinstance(where, str) else where
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def format_for(out_path: str) -> str:
+    return "arrow" if os.path.splitext(out_path)[1].lower() in (".arrow", ".feather", ".ipc") else "parquet"
+
+
+def summary_path(out_path: str) -> str:
+    root, ext = os.path.splitext(out_path)
+    return f"{root}.summary{ext}"
+
+
+def iter_sink(jsonl_path: str) -> Iterator[Tuple[str, Dict]]:
+    """(id, result) of each successful record in a batch JSONL sink, read one line at a time."""
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                yield record["id"], record["result"]
+
+
+def export_results(results: Iterable[Tuple[str, Union[ExtractionResult, Dict]]], out_path: str,
+                   format: str = None, row_group_size: int = EXPORT_ROW_GROUP_SIZE) -> Dict:
+    """Write the field table to ``out_path`` and the summary table next to it as ``<name>.summary.<ext>``.
+
+    The format follows the extension (.arrow/.feather/.ipc for Arrow IPC, Parquet otherwise) unless given.
+    """
+    format = format or format_for(out_path)
+    with ResultsWriter(out_path, format, row_group_size) as writer:
+        for doc_id, result in results:
+            writer.write(doc_id, result)
+    summary = writer.summary()
+    write_summary(summary, summary_path(out_path), format)
+    logger.info(f"Exported {writer.rows} field rows from {writer.documents} documents to {out_path}")
+    return {"documents": writer.documents, "rows": writer.rows, "summary_rows": summary.num_rows}
@@ -0,0 +1,292 @@
+import contextvars
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" shares quota budgets between worker processes on this host; "memory" is per process.
+SCHEDULER_BUDGET = os.getenv("SCHEDULER_BUDGET", "sqlite").lower()
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Anchored to the project root rather than the working directory, so every worker
+# on the host draws from the same budgets wherever it was started.
+SCHEDULER_DB_PATH = os.getenv("SCHEDULER_DB_PATH", os.path.join(_ROOT, ".cache", "scheduler.sqlite3"))
+SCHEDULER_MAX_RETRIES = int(os.getenv("SCHEDULER_MAX_RETRIES", "5"))
+SCHEDULER_BACKOFF_BASE = float(os.getenv("SCHEDULER_BACKOFF_BASE", "0.5"))
+SCHEDULER_BACKOFF_CAP = float(os.getenv("SCHEDULER_BACKOFF_CAP", "30"))
+# Wall-clock budget for one document across all its OCR and LLM calls; 0 disables.
+DOCUMENT_DEADLINE_S = float(os.getenv("DOCUMENT_DEADLINE_S", "300"))
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+_THROTTLE_RE = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota|too many requests", re.I)
+_TRANSIENT_RE = re.compile(r"\b50[0234]\b|unavailable|timed? ?out|deadline exceeded|connection (reset|aborted|refused)", re.I)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def document_deadline(seconds: float = DOCUMENT_DEADLINE_S) -> Iterator[None]:
+    """Bound every scheduled call made inside the block (including bound workers) by a shared deadline."""
+    if seconds <= 0:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, "response", None)
+    for value in (getattr(response, "status_code", None), getattr(exc, "status_code", None), getattr(exc, "code", None)):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def classify_error(exc: BaseException) -> str:
+    """THROTTLED (429/quota), TRANSIENT (5xx, timeouts, dropped connections) or FATAL."""
+    seen = exc
+    while seen is not None:
+        status = _status_code(seen)
+        if status == 429:
+            return THROTTLED
+        if status is not None and status >= 500:
+            return TRANSIENT
+        if isinstance(seen, (ConnectionError, TimeoutError)) and not isinstance(seen, DeadlineExceeded):
+            return TRANSIENT
+        name = type(seen).__name__
+        if name in ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError"):
+            return TRANSIENT
+        message = str(seen)
+        if _THROTTLE_RE.search(message):
+            return THROTTLED
+        if _TRANSIENT_RE.search(message):
+            return TRANSIENT
+        seen = seen.__cause__ or seen.__context__
+    return FATAL
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class MemoryBudget:
+    """Token buckets held in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+
+    def take(self, provider: str, resource: str, amount: float, rate: float, capacity: float) -> float:
+        """Take amount if available and return 0, otherwise return the seconds until it will be."""
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get((provider, resource), (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= amount:
+                self._buckets[(provider, resource)] = (tokens - amount, now)
+                return 0.0
+            self._buckets[(provider, resource)] = (tokens, now)
+            return (amount - tokens) / rate
+
+
+class SQLiteBudget:
+    """Token buckets in a SQLite file, so every worker process on the host draws from one quota."""
+
+    def __init__(self, path: str = SCHEDULER_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS budgets ("
+                "provider TEXT, resource TEXT, tokens REAL, updated REAL, "
+                "PRIMARY KEY (provider, resource))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, provider: str, resource: str, amount: float, rate: float, capacity: float) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM budgets WHERE provider = ? AND resource = ?", (provider, resource)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= amount:
+                tokens -= amount
+            else:
+                wait = (amount - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO budgets (provider, resource, tokens, updated) VALUES (?, ?, ?, ?)",
+                (provider, resource, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight calls: +1/limit per success, halved on a 429 or 5xx (at most once per cooldown)."""
+
+    def __init__(self, maximum: int, initial: Optional[int] = None, minimum: int = 1, cooldown: float = 1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(initial or self.maximum)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: Optional[str]) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome in (THROTTLED, TRANSIENT):
+                # 5xx and timeouts are how an overloaded provider answers before it starts returning 429s.
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            elif outcome is None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class ProviderScheduler:
+    """Gate for one remote provider: quota budgets, adaptive concurrency, jittered retries, deadlines.
+
+    Without an explicit budget the process-wide shared_budget() is used, so
+    schedulers of the same provider in different worker processes share quota.
+    """
+
+    def __init__(self, provider: str, rpm: float, tpm: float = 0, burst: float = 1,
+                 max_concurrency: int = 4, budget=None, max_retries: int = SCHEDULER_MAX_RETRIES):
+        self.provider = provider
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst = max(1.0, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self._budget = budget
+        self.max_retries = max_retries
+
+    @property
+    def budget(self):
+        # Resolved on first call so that constructing a scheduler touches no files.
+        if self._budget is None:
+            self._budget = shared_budget()
+        return self._budget
+
+    def _wait_for_budget(self, tokens: float) -> float:
+        waited = 0.0
+        for resource, amount, per_minute, capacity in (
+            ("requests", 1, self.rpm, self.burst),
+            ("tokens", tokens, self.tpm, self.tpm),
+        ):
+            if per_minute <= 0 or amount <= 0:
+                continue
+            amount = min(amount, capacity)
+            while True:
+                wait = self.budget.take(self.provider, resource, amount, per_minute / 60, capacity)
+                if wait <= 0:
+                    break
+                self._check_deadline(wait)
+                time.sleep(wait)
+                waited += wait
+        return waited
+
+    def _check_deadline(self, needed: float = 0.0) -> None:
+        left = time_left()
+        if left is not None and left < needed:
+            raise DeadlineExceeded(f"{self.provider}: document deadline exceeded")
+
+    def call(self, fn: Callable[..., Any], *args, tokens: float = 0, **kwargs) -> Any:
+        """Run fn under the provider's quota, retrying throttled and transient failures with jittered backoff."""
+        attempt = 0
+        while True:
+            self._check_deadline()
+            start = time.monotonic()
+            if not self.concurrency.acquire(time_left()):
+                raise DeadlineExceeded(f"{self.provider}: document deadline exceeded")
+            outcome = None
+            try:
+                self._wait_for_budget(tokens)
+                telemetry.record(f"{self.provider}_queue_wait", time.monotonic() - start)
+                result = fn(*args, **kwargs)
+            except DeadlineExceeded:
+                outcome = FATAL
+                raise
+            except Exception as e:
+                outcome = classify_error(e)
+                telemetry.count("scheduler_calls_total", provider=self.provider, outcome=outcome)
+                if outcome == FATAL or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e) or random.uniform(0, min(SCHEDULER_BACKOFF_CAP, SCHEDULER_BACKOFF_BASE * 2 ** attempt))
+                logger.warning(f"{self.provider} call {outcome} ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            finally:
+                self.concurrency.release(outcome)
+            if outcome is None:
+                telemetry.count("scheduler_calls_total", provider=self.provider, outcome="ok")
+                return result
+            telemetry.count("scheduler_retries_total", provider=self.provider)
+            self._check_deadline(delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+_budget_lock = threading.Lock()
+_shared_budget = None
+
+
+def shared_budget():
+    """The budget backend selected by SCHEDULER_BUDGET, created once per process."""
+    global _shared_budget
+    with _budget_lock:
+        if _shared_budget is None:
+            _shared_budget = SQLiteBudget() if SCHEDULER_BUDGET == "sqlite" else MemoryBudget()
+        return _shared_budget
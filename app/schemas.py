@@ -1,5 +1,8 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from spatial_index import DocumentIndex
 
 
 class FieldSchema(BaseModel):
@@ -27,6 +30,10 @@ class ExtractionResult(BaseModel):
     fields: List[FieldSchema]
     overall_confidence: float = Field(default=0.0, ge=0, le=1)
     qa: QAReport = Field(default_factory=QAReport)
+    timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Seconds spent per pipeline stage; stages run in parallel threads are summed"
+    )
 
     model_config = {"arbitrary_types_allowed": True}
 
@@ -34,13 +41,41 @@ class ExtractionResult(BaseModel):
 class ProcessedDocument(BaseModel):
     text: str
     pages: List[Dict] = Field(default_factory=list)
-    images: List[object] = Field(default_factory=list)
+    images: List[object] = Field(
+        default_factory=list,
+        description="Lazy page handles; call load() to decode a page image"
+    )
     layout: List[Dict] = Field(default_factory=list)
-    ocr_confidences: List[float] = Field(default_factory=list)
+    ocr_confidences: Any = Field(
+        default_factory=list,
+        description="Per-word OCR confidences across all pages (NumPy array or list)"
+    )
+    gemini_output: str = ""
 
     model_config = {"arbitrary_types_allowed": True}
 
-    def get_word_confidence(self, bbox: List[float]) -> float:
-        if not self.ocr_confidences:
+    _word_index: Optional[Any] = PrivateAttr(default=None)
+    _locations: Dict[str, Optional[Dict]] = PrivateAttr(default_factory=dict)
+
+    def word_index(self) -> "DocumentIndex":
+        if self._word_index is None:
+            # Imported here so that loading the schemas does not pull in NumPy.
+            from spatial_index import DocumentIndex
+
+            self._word_index = DocumentIndex(self.pages)
+        return self._word_index
+
+    def get_word_confidence(self, bbox: List[float], page: int = None) -> float:
+        if len(self.ocr_confidences) == 0:
             return 0.8
-        return sum(self.ocr_confidences) / len(self.ocr_confidences)
+        if any(bbox):
+            confidence = self.word_index().confidence(bbox, page)
+            if confidence is not None:
+                return confidence
+        return float(sum(self.ocr_confidences) / len(self.ocr_confidences))
+
+    def locate_value(self, value: str) -> Optional[Dict]:
+        """Page, bbox and matched-word confidence of an extracted value, if it appears in the OCR words."""
+        if value not in self._locations:
+            self._locations[value] = self.word_index().locate(value) if value else None
+        return self._locations[value]
@@ -0,0 +1,111 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from word_table import WordTable
+
+GRID_CELL_SIZE = 128
+
+_STRIP = ".,:;()[]{}\"'"
+_SPLIT_RE = re.compile(r"\s+")
+
+
+def normalize_token(token: str) -> str:
+    return token.strip(_STRIP).lower()
+
+
+def tokenize(value: str) -> List[str]:
+    return [t for t in (normalize_token(part) for part in _SPLIT_RE.split(value)) if t]
+
+
+def union_bbox(boxes: np.ndarray) -> List[int]:
+    return [
+        int(boxes[:, 0].min()),
+        int(boxes[:, 1].min()),
+        int(boxes[:, 2].max()),
+        int(boxes[:, 3].max()),
+    ]
+
+
+class PageIndex:
+    """Uniform-grid spatial index plus token postings over one page's OCR words."""
+
+    def __init__(self, page_number: int, words: Union[WordTable, List[Dict]], cell_size: int = GRID_CELL_SIZE):
+        if not isinstance(words, WordTable):
+            words = WordTable.from_dicts(words)
+        self.page_number = page_number
+        self.words = words
+        self.cell_size = cell_size
+        self.tokens = [normalize_token(text) for text in words.texts()]
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self.postings: Dict[str, List[int]] = {}
+        cell_bounds = (words.bboxes // cell_size).tolist()
+        for i, (cx0, cy0, cx1, cy1) in enumerate(cell_bounds):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+            if self.tokens[i]:
+                self.postings.setdefault(self.tokens[i], []).append(i)
+
+    def query(self, bbox: Sequence[float]) -> np.ndarray:
+        """Indices of words whose boxes intersect bbox."""
+        x0, y0, x1, y1 = bbox
+        size = self.cell_size
+        candidates = set()
+        for cx in range(int(x0) // size, int(x1) // size + 1):
+            for cy in range(int(y0) // size, int(y1) // size + 1):
+                candidates.update(self.cells.get((cx, cy), ()))
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.fromiter(sorted(candidates), dtype=np.int64)
+        boxes = self.words.bboxes[idx]
+        mask = (boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0)
+        return idx[mask]
+
+    def find_sequence(self, tokens: List[str]) -> Optional[List[int]]:
+        """First run of consecutive words matching tokens, found via the first token's postings."""
+        if not tokens:
+            return None
+        n = len(self.tokens)
+        for start in self.postings.get(tokens[0], ()):
+            if start + len(tokens) <= n and self.tokens[start:start + len(tokens)] == tokens:
+                return list(range(start, start + len(tokens)))
+        return None
+
+
+class DocumentIndex:
+    def __init__(self, pages: List[Dict]):
+        self.pages = {page["page"]: PageIndex(page["page"], page.get("words", [])) for page in pages}
+
+    def confidence(self, bbox: Sequence[float], page: int = None) -> Optional[float]:
+        """Mean confidence of words intersecting bbox, on one page or all pages."""
+        indexes = [self.pages[page]] if page in self.pages else list(self.pages.values())
+        total, count = 0.0, 0
+        for index in indexes:
+            hits = index.query(bbox)
+            total += float(index.words.confidences[hits].sum())
+            count += len(hits)
+        return total / count if count else None
+
+    def locate(self, value: str) -> Optional[Dict]:
+        """Find where a value appears; returns its page, bounding box and matched-word confidence."""
+        tokens = tokenize(value)
+        if not tokens:
+            return None
+        match = self._first_match(lambda index: index.find_sequence(tokens))
+        if match is None and len(tokens) > 1:
+            # OCR may split or merge words differently; settle for the most specific token.
+            longest = max(tokens, key=len)
+            match = self._first_match(lambda index: index.postings.get(longest, [])[:1])
+        return match
+
+    def _first_match(self, finder) -> Optional[Dict]:
+        for page_number in sorted(self.pages):
+            index = self.pages[page_number]
+            matched = finder(index)
+            if matched:
+                return {
+                    "page": page_number,
+                    "bbox": union_bbox(index.words.bboxes[matched]),
+                    "confidence": float(index.words.confidences[matched].mean()),
+                }
+        return None
@@ -0,0 +1,197 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "false").lower() in ("1", "true", "yes")
+# Attach a per-stage timing breakdown to every ExtractionResult.
+TELEMETRY_TIMINGS = os.getenv("TELEMETRY_TIMINGS", "false").lower() in ("1", "true", "yes")
+METRIC_PREFIX = "docextract_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL = nullcontext()
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide counters and histograms, keyed by metric name and label set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    def count(self, name: str, value: float = 1, labels: LabelKey = ()) -> None:
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: LabelKey = ()) -> None:
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if labels not in series:
+                series[labels] = Histogram()
+            series[labels].observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name in sorted(self.counters):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+            for name in sorted(self.histograms):
+                metric = METRIC_PREFIX + name
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, hist in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {_number(hist.sum)}")
+                    lines.append(f"{metric}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = Registry()
+
+
+class Trace:
+    """Per-document accumulator of stage durations, shared with worker threads via bind()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds, 6) for stage, seconds in self.seconds.items()}
+
+
+def count(name: str, value: float = 1, **labels: str) -> None:
+    if TELEMETRY_ENABLED:
+        registry.count(name, value, tuple(sorted(labels.items())))
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    if TELEMETRY_ENABLED:
+        registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def record(stage: str, seconds: float) -> None:
+    """Account time spent in a stage that was measured elsewhere (e.g. a rate-limiter wait)."""
+    current = _trace.get()
+    if current is not None:
+        current.add(stage, seconds)
+    if TELEMETRY_ENABLED:
+        registry.observe("stage_seconds", seconds, (("stage", stage),))
+
+
+@contextmanager
+def _span(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def span(stage: str):
+    """Time a pipeline stage; a shared no-op context when nothing is recording."""
+    if not TELEMETRY_ENABLED and _trace.get() is None:
+        return _NULL
+    return _span(stage)
+
+
+@contextmanager
+def trace(current: Optional[Trace] = None) -> Iterator[Trace]:
+    """Collect the stage timings of everything run inside the block, including bound workers.
+
+    Passing an existing Trace adds to it, e.g. when one document's stages run at different times.
+    """
+    current = current or Trace()
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+
+
+def bind(fn: Callable) -> Callable:
+    """Carry the caller's context variables (active trace, document deadline) into a pool thread."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        # Each call gets its own copy: one Context cannot be entered by two threads at once.
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """Yield from an iterator, timing each step (e.g. lazy page rendering) as a span."""
+    iterator = iter(iterable)
+    while True:
+        with span(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
+
+
+def write_prometheus(path: str) -> None:
+    """Write the current metrics atomically, e.g. for node_exporter's textfile collector."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
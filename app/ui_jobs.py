@@ -0,0 +1,149 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from extraction import FIELD_MAPPING
+from pre_extraction import pre_extract
+
+logger = logging.getLogger(__name__)
+
+UI_MAX_WORKERS = int(os.getenv("UI_MAX_WORKERS", "4"))
+# Finished jobs kept in memory so reruns and repeated uploads reuse their results.
+UI_MAX_FINISHED_JOBS = int(os.getenv("UI_MAX_FINISHED_JOBS", "200"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Fields previewed from OCR'd pages before the LLM runs, when the user gave no field list.
+PREVIEW_FIELDS = list(dict.fromkeys(field for fields in FIELD_MAPPING.values() for field in fields))
+
+
+class Job:
+    """State of one uploaded file, updated by a worker thread and read by the UI."""
+
+    def __init__(self, job_id: str, name: str, fields: Optional[List[str]], auto_detect: bool):
+        self.id = job_id
+        self.name = name
+        self.fields = fields
+        self.auto_detect = auto_detect
+        self.status = QUEUED
+        self.stage = ""
+        self.pages_total = 0
+        self.pages_done = 0
+        self.preview: Dict[str, str] = {}
+        self.result = None
+        self.error = ""
+        self.submitted_at = time.time()
+        self.finished_at = None
+        # The uploaded file; kept until the job is evicted, since page handles point at it.
+        self.path = ""
+        self._lock = threading.Lock()
+
+    def update(self, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+
+    def on_event(self, kind: str, payload) -> None:
+        if kind == "stage":
+            self.update(stage=payload)
+        elif kind == "page":
+            # Deterministic matches on this page, shown while the LLM stages are still pending.
+            found = pre_extract(payload.get("text", ""), self.fields or PREVIEW_FIELDS)
+            with self._lock:
+                self.pages_done += 1
+                self.pages_total = max(self.pages_total, self.pages_done)
+                for field, value in found.items():
+                    self.preview.setdefault(field, value)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "pages_total": self.pages_total,
+                "pages_done": self.pages_done,
+                "preview": dict(self.preview),
+                "result": self.result,
+                "error": self.error,
+                "elapsed_s": (self.finished_at or time.time()) - self.submitted_at,
+            }
+
+
+def job_key(data: bytes, name: str, fields: Optional[List[str]], auto_detect: bool) -> str:
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps([os.path.splitext(name)[1].lower(), fields, auto_detect]).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class JobManager:
+    """Runs extractions on a background thread pool; jobs are keyed by file content and options."""
+
+    def __init__(self, max_workers: int = UI_MAX_WORKERS, max_finished: int = UI_MAX_FINISHED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="extract")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_finished = max_finished
+        self._tmp_dir = tempfile.mkdtemp(prefix="docextract-ui-")
+        atexit.register(self.shutdown)
+
+    def submit(self, data: bytes, name: str, fields: Optional[List[str]] = None, auto_detect: bool = True) -> str:
+        """Queue a file, or return the existing job for identical content and options unless it failed."""
+        job_id = job_key(data, name, fields, auto_detect)
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if existing is not None and existing.status != FAILED:
+                self._jobs.move_to_end(job_id)
+                return job_id
+            job = Job(job_id, name, fields, auto_detect)
+            self._jobs[job_id] = job
+            self._evict()
+        job.path = os.path.join(self._tmp_dir, job_id + os.path.splitext(name)[1].lower())
+        with open(job.path, "wb") as f:
+            f.write(data)
+        self._executor.submit(self._run, job, job.path)
+        return job_id
+
+    def _run(self, job: Job, path: str) -> None:
+        from agent_loop import agentic_extraction
+        from page_source import page_count
+
+        job.update(status=RUNNING)
+        try:
+            job.update(pages_total=page_count(path))
+            result = agentic_extraction(path, job.fields, job.auto_detect, on_event=job.on_event)
+            job.update(result=result.model_dump(mode="json"), status=DONE, finished_at=time.time())
+        except Exception as e:
+            logger.exception(f"Extraction failed for {job.name}")
+            job.update(error=f"{type(e).__name__}: {e}", status=FAILED, finished_at=time.time())
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self._max_finished)]:
+            job = self._jobs.pop(job_id)
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job is not None else None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
@@ -0,0 +1,213 @@
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from utils.constants import CURRENCY_CODES
+from utils.helpers import parse_amount, parse_date
+from schemas import QAReport
+
+# Largest difference, in currency units, still treated as equal by the cross-field checks.
+VALIDATION_AMOUNT_TOLERANCE = float(os.getenv("VALIDATION_AMOUNT_TOLERANCE", "0.02"))
+
+# Field name keyword -> value format; a field is checked against every keyword it contains.
+VALIDATION_RULES: Dict[str, str] = {
+    "date": "date",
+    "amount": "amount",
+    "charges": "amount",
+    "total": "amount",
+}
+
+# (earlier, later) date fields that must not be out of order.
+DATE_ORDER = [
+    ("invoice_date", "due_date"),
+    ("admission_date", "discharge_date"),
+    ("issue_date", "valid_until"),
+]
+
+_PERCENT = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*%?\s*$")
+# (@ marker, sign and currency, digits, cents) of each number on a line_items line.
+_LINE_AMOUNT = re.compile(
+    rf"(@\s*)?(-?\s*(?:[$£€¥]|\b(?:{'|'.join(CURRENCY_CODES)})\s*)?-?)(?<![\d.,])"
+    rf"(\d{{1,3}}(?:,\d{{3}})+|\d+)(\.\d{{1,2}})?(?![\d,]|\.\d)",
+    re.IGNORECASE,
+)
+_UNIT_PRICE = re.compile(r"\s*(?:/\s*)?(?:each|ea|per\b)", re.IGNORECASE)
+
+
+def _unique_map(values: Sequence[str], parse, empty, dtype) -> np.ndarray:
+    # Each distinct string is parsed once; batches repeat dates and totals a lot.
+    parsed = {}
+    for value in values:
+        if value not in parsed:
+            result = parse(value) if value else None
+            parsed[value] = empty if result is None else result
+    return np.array([parsed[value] for value in values], dtype=dtype)
+
+
+def parse_dates(values: Sequence[str]) -> np.ndarray:
+    """datetime64[D] array of the values, NaT where a value is not a date."""
+    return _unique_map(values, parse_date, np.datetime64("NaT"), "datetime64[D]")
+
+
+def parse_amounts(values: Sequence[str]) -> np.ndarray:
+    """float64 array of the values, NaN where a value is not an amount."""
+    return _unique_map(values, parse_amount, np.nan, np.float64)
+
+
+@lru_cache(maxsize=4096)
+def _percent(value: str) -> Optional[float]:
+    match = _PERCENT.match(value)
+    return float(match.group(1)) if match else None
+
+
+def _line_total(line: str) -> Optional[float]:
+    """The total of one line item: its last amount, unless that is a unit price; None if there is none."""
+    amounts = [
+        match for match in _LINE_AMOUNT.finditer(line)
+        # Bare integers are quantities or codes; an amount has cents, thousands separators or a currency.
+        if match.group(4) or "," in match.group(3) or re.search(r"[^\s-]", match.group(2))
+    ]
+    if not amounts:
+        return None
+    last = amounts[-1]
+    if last.group(1) or _UNIT_PRICE.match(line, last.end()):
+        # "x2 @ $25.00" or "$25.00 each" gives the price, not what the line adds up to.
+        return None
+    return parse_amount(last.group(2).strip() + last.group(3) + (last.group(4) or ""))
+
+
+@lru_cache(maxsize=4096)
+def line_items_total(value: str) -> Optional[float]:
+    """Sum of the line totals in a line_items value; None when any line's total cannot be identified.
+
+    Lines are split on newlines or semicolons and the last amount on a line is
+    its total, which fits "Widget  Qty 2  $5.00  $10.00" as well as "Widget $10".
+    """
+    total, found = 0.0, False
+    for line in re.split(r"[\n;]+", value):
+        if not line.strip():
+            continue
+        amount = _line_total(line)
+        if amount is None:
+            return None
+        total += amount
+        found = True
+    return round(total, 2) if found else None
+
+
+class FormatRule(NamedTuple):
+    field: str
+    keyword: str
+    kind: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.keyword}_format_{self.field}"
+
+
+class ValidationPlan:
+    """The rules that apply to one set of field names, resolved once and applied to whole batches."""
+
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+        present = set(fields)
+        self.format_rules = [
+            FormatRule(field, keyword, kind)
+            for field in fields
+            for keyword, kind in VALIDATION_RULES.items()
+            if keyword in field.lower()
+        ]
+        self.date_fields = sorted({r.field for r in self.format_rules if r.kind == "date"} |
+                                  {f for pair in DATE_ORDER for f in pair if f in present})
+        self.date_order = [pair for pair in DATE_ORDER if set(pair) <= present]
+        self.line_items = "line_items" in present and "total_amount" in present
+        self.totals = "subtotal" in present and "total_amount" in present
+        self.tax_rate = "tax_rate" in present and "tax_amount" in present and (
+            "taxable_amount" in present or "subtotal" in present
+        )
+        self.amount_fields = sorted(
+            {r.field for r in self.format_rules if r.kind == "amount"} |
+            ({"subtotal", "tax_amount", "shipping_charges", "discount", "taxable_amount"} & present)
+        )
+
+    def validate(self, extraction: Dict[str, str]) -> QAReport:
+        return self.validate_batch([extraction])[0]
+
+    def validate_batch(self, extractions: List[Dict[str, str]]) -> List[QAReport]:
+        columns = {field: [e.get(field) or "" for e in extractions] for field in self.fields}
+        dates = {field: parse_dates(columns[field]) for field in self.date_fields}
+        amounts = {field: parse_amounts(columns[field]) for field in self.amount_fields}
+        valid = {(field, "date"): ~np.isnat(values) for field, values in dates.items()}
+        valid.update({(field, "amount"): ~np.isnan(values) for field, values in amounts.items()})
+
+        reports = [QAReport() for _ in extractions]
+        for rule in self.format_rules:
+            ok = valid[rule.field, rule.kind]
+            for i, value in enumerate(columns[rule.field]):
+                if value:
+                    (reports[i].passed_rules if ok[i] else reports[i].failed_rules).append(rule.name)
+        for name, outcome in self._cross_checks(columns, dates, amounts):
+            for i in np.flatnonzero(outcome >= 0):
+                (reports[i].passed_rules if outcome[i] else reports[i].failed_rules).append(name)
+        for report, extraction in zip(reports, extractions):
+            empty = [field for field in self.fields if not extraction.get(field)]
+            if empty:
+                report.notes = f"{len(empty)} low-confidence fields: {', '.join(empty)}"
+        return reports
+
+    def _cross_checks(self, columns: Dict[str, List[str]], dates: Dict[str, np.ndarray],
+                      amounts: Dict[str, np.ndarray]) -> Iterable[Tuple[str, np.ndarray]]:
+        """(rule name, array of 1 passed / 0 failed / -1 not applicable) per cross-field check."""
+        n = len(next(iter(columns.values()), []))
+
+        def optional(field: str) -> np.ndarray:
+            # A component missing from the schema or left empty counts as zero; a filled one must be readable.
+            if field not in amounts:
+                return np.zeros(n)
+            return np.where([not value for value in columns[field]], 0.0, amounts[field])
+
+        def outcome(actual: np.ndarray, expected: np.ndarray) -> np.ndarray:
+            known = ~(np.isnan(actual) | np.isnan(expected))
+            close = np.abs(actual - expected) <= VALIDATION_AMOUNT_TOLERANCE + 1e-9
+            return np.where(known, close.astype(int), -1)
+
+        total = amounts.get("total_amount")
+        charges = optional("tax_amount") + optional("shipping_charges") - optional("discount")
+        if self.line_items:
+            items = np.array([line_items_total(v) if v else None for v in columns["line_items"]], dtype=np.float64)
+            expected = amounts["subtotal"] if "subtotal" in amounts else total - charges
+            yield "line_items_sum", outcome(items, expected)
+        if self.totals:
+            yield "totals_match", outcome(amounts["subtotal"] + charges, total)
+        if self.tax_rate:
+            rates = np.array([_percent(v) if v else None for v in columns["tax_rate"]], dtype=np.float64)
+            base = amounts["taxable_amount"] if "taxable_amount" in amounts else amounts["subtotal"]
+            yield "tax_rate_match", outcome(np.round(base * rates / 100, 2), amounts["tax_amount"])
+        for earlier, later in self.date_order:
+            known = ~(np.isnat(dates[earlier]) | np.isnat(dates[later]))
+            ordered = (dates[later] >= dates[earlier]).astype(int)
+            yield f"{later}_after_{earlier}", np.where(known, ordered, -1)
+
+
+@lru_cache(maxsize=256)
+def compile_plan(fields: Tuple[str, ...]) -> ValidationPlan:
+    return ValidationPlan(fields)
+
+
+def validate_batch(extractions: List[Dict[str, str]]) -> List[QAReport]:
+    """QA reports for many extractions; those with the same fields share one plan and one vectorized pass."""
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for i, extraction in enumerate(extractions):
+        groups.setdefault(tuple(extraction), []).append(i)
+    reports: List[Optional[QAReport]] = [None] * len(extractions)
+    for fields, indices in groups.items():
+        for i, report in zip(indices, compile_plan(fields).validate_batch([extractions[i] for i in indices])):
+            reports[i] = report
+    return reports
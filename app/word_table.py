@@ -0,0 +1,119 @@
+from typing import Dict, Iterator, List, Union
+import numpy as np
+
+
+class WordTable:
+    """Array-backed OCR words for one page.
+
+    Word texts live in a single string buffer addressed by ``offsets``; boxes
+    and confidences are NumPy arrays. Slicing returns views that share the
+    buffers, and dict-shaped words are only built when indexed or iterated.
+    """
+
+    __slots__ = ("buffer", "offsets", "bboxes", "confidences")
+
+    def __init__(self, buffer: str, offsets: np.ndarray, bboxes: np.ndarray, confidences: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.bboxes = bboxes
+        self.confidences = confidences
+
+    @classmethod
+    def empty(cls) -> "WordTable":
+        return cls("", np.zeros(1, dtype=np.int64), np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_overlay(cls, lines: List[Dict], default_confidence: float) -> "WordTable":
+        """Build from OCR.space TextOverlay.Lines, skipping blank words."""
+        texts, boxes, confidences = [], [], []
+        for line in lines:
+            for word in line.get("Words", []):
+                text = word.get("WordText", "").strip()
+                if not text:
+                    continue
+                left, top = word.get("Left", 0), word.get("Top", 0)
+                texts.append(text)
+                boxes.append((left, top, left + word.get("Width", 0), top + word.get("Height", 0)))
+                confidences.append(word.get("Confidence", default_confidence))
+        return cls._build(texts, boxes, confidences)
+
+    @classmethod
+    def from_dicts(cls, words: List[Dict]) -> "WordTable":
+        return cls._build(
+            [w["text"] for w in words],
+            [w["bbox"] for w in words],
+            [w["confidence"] for w in words]
+        )
+
+    @classmethod
+    def _build(cls, texts: List[str], boxes: List, confidences: List[float]) -> "WordTable":
+        if not texts:
+            return cls.empty()
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in texts], out=offsets[1:])
+        return cls(
+            "".join(texts),
+            offsets,
+            np.asarray(boxes, dtype=np.int32).reshape(-1, 4),
+            np.asarray(confidences, dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.confidences)
+
+    def text(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def texts(self) -> List[str]:
+        bounds = self.offsets.tolist()
+        return [self.buffer[bounds[i]:bounds[i + 1]] for i in range(len(self))]
+
+    def word(self, i: int) -> Dict:
+        return {
+            "text": self.text(i),
+            "confidence": float(self.confidences[i]),
+            "bbox": self.bboxes[i].tolist(),
+        }
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Dict, "WordTable"]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("WordTable slices must be contiguous")
+            stop = max(start, stop)
+            return WordTable(self.buffer, self.offsets[start:stop + 1], self.bboxes[start:stop],
+                             self.confidences[start:stop])
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("word index out of range")
+        return self.word(key)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self.word(i)
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+    def to_json(self) -> Dict:
+        """Columnar, JSON-serializable form; offsets are rebased so slices round-trip."""
+        offsets = self.offsets - self.offsets[0]
+        return {
+            "buffer": self.buffer[self.offsets[0]:self.offsets[-1]],
+            "offsets": offsets.tolist(),
+            "bboxes": self.bboxes.tolist(),
+            "confidences": self.confidences.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "WordTable":
+        return cls(
+            data["buffer"],
+            np.asarray(data["offsets"], dtype=np.int64),
+            np.asarray(data["bboxes"], dtype=np.int32).reshape(-1, 4),
+            np.asarray(data["confidences"], dtype=np.float32)
+        )
+
+    def __repr__(self) -> str:
+        return f"WordTable({len(self)} words)"
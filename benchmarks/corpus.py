@@ -0,0 +1,159 @@
+"""Synthetic invoices, medical bills and prescriptions for offline benchmarks."""
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+DOC_TYPES = ["invoice", "medical_bill", "prescription"]
+PAGE_SIZE = (1700, 2200)  # US letter at 200 DPI
+LINE_HEIGHT = 44
+FONT_SIZE = 30
+MARGIN = 120
+
+VENDORS = ["Acme Supplies Ltd", "Northwind Traders", "Globex Corporation", "Initech LLC"]
+PATIENTS = ["John A Doe", "Jane Roe", "Maria Garcia", "Wei Zhang"]
+PROVIDERS = ["City General Hospital", "Riverside Clinic", "St. Mary Medical Center"]
+DOCTORS = ["Dr. Alan Grant", "Dr. Ellie Sattler", "Dr. Ian Malcolm"]
+MEDICATIONS = ["Amoxicillin 500 mg capsule", "Lisinopril 10 mg tablet", "Metformin 850 mg tablet"]
+ITEMS = ["Widget", "Gadget", "Bracket", "Cable assembly", "Service hours", "Shipping crate"]
+
+
+def _money(value: float) -> str:
+    return f"${value:,.2f}"
+
+
+def _date(rng: random.Random) -> str:
+    return f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2021, 2025)}"
+
+
+def make_fields(doc_type: str, rng: random.Random, items: int) -> Dict:
+    if doc_type == "invoice":
+        lines = [(rng.choice(ITEMS), rng.randint(1, 9), round(rng.uniform(5, 400), 2)) for _ in range(items)]
+        subtotal = round(sum(qty * price for _, qty, price in lines), 2)
+        tax = round(subtotal * 0.08, 2)
+        return {
+            "vendor_name": rng.choice(VENDORS),
+            "invoice_number": f"INV-{rng.randint(1000, 99999)}",
+            "invoice_date": _date(rng),
+            "due_date": _date(rng),
+            "line_items": lines,
+            "subtotal": _money(subtotal),
+            "tax_amount": _money(tax),
+            "total_amount": _money(subtotal + tax),
+        }
+    if doc_type == "medical_bill":
+        charges = [(f"Procedure {rng.randint(99000, 99499)}", round(rng.uniform(40, 900), 2)) for _ in range(items)]
+        return {
+            "provider_name": rng.choice(PROVIDERS),
+            "patient_name": rng.choice(PATIENTS),
+            "patient_dob": _date(rng),
+            "service_date": _date(rng),
+            "claim_number": f"CLM-{rng.randint(10000, 99999)}",
+            "charges": charges,
+            "total_charges": _money(sum(amount for _, amount in charges)),
+        }
+    return {
+        "prescriber_name": rng.choice(DOCTORS),
+        "prescriber_license": f"AB{rng.randint(1000000, 9999999)}",
+        "patient_name": rng.choice(PATIENTS),
+        "medication": rng.choice(MEDICATIONS),
+        "dosage": "Take 1 by mouth twice daily",
+        "quantity": str(rng.randint(10, 90)),
+        "refills": str(rng.randint(0, 5)),
+        "issue_date": _date(rng),
+    }
+
+
+def page_lines(doc_type: str, fields: Dict, page: int, pages: int) -> List[str]:
+    """Text lines of one page; the header is on the first page and totals on the last."""
+    lines = []
+    if page == 0:
+        if doc_type == "invoice":
+            lines += [fields["vendor_name"], "INVOICE", f"Invoice No: {fields['invoice_number']}",
+                      f"Invoice Date: {fields['invoice_date']}", f"Due Date: {fields['due_date']}", ""]
+        elif doc_type == "medical_bill":
+            lines += [fields["provider_name"], "PATIENT STATEMENT", f"Patient Name: {fields['patient_name']}",
+                      f"DOB: {fields['patient_dob']}", f"Date of Service: {fields['service_date']}",
+                      f"Claim #: {fields['claim_number']}", ""]
+        else:
+            lines += [fields["prescriber_name"], f"DEA: {fields['prescriber_license']}", "PRESCRIPTION",
+                      f"Patient: {fields['patient_name']}", f"Date Written: {fields['issue_date']}", ""]
+    rows = fields.get("line_items") or fields.get("charges") or []
+    per_page = max(1, -(-len(rows) // pages)) if rows else 0
+    for row in rows[page * per_page:(page + 1) * per_page]:
+        if doc_type == "invoice":
+            name, qty, price = row
+            lines.append(f"{name}   Qty {qty}   {_money(price)}   {_money(qty * price)}")
+        else:
+            name, amount = row
+            lines.append(f"{name}   {_money(amount)}")
+    if page == pages - 1:
+        lines.append("")
+        if doc_type == "invoice":
+            lines += [f"Subtotal: {fields['subtotal']}", f"Tax: {fields['tax_amount']}",
+                      f"Total Amount Due: {fields['total_amount']}"]
+        elif doc_type == "medical_bill":
+            lines.append(f"Total Charges: {fields['total_charges']}")
+        else:
+            lines += [fields["medication"], f"Sig: {fields['dosage']}", f"Qty: {fields['quantity']}",
+                      f"Refills: {fields['refills']}"]
+    return lines
+
+
+def layout_words(lines: List[str]) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+    """Approximate word boxes for lines drawn by render_page."""
+    char_width = int(FONT_SIZE * 0.55)
+    words = []
+    for i, line in enumerate(lines):
+        top = MARGIN + i * LINE_HEIGHT
+        left = MARGIN
+        for token in line.split(" "):
+            if token:
+                words.append((token, (left, top, char_width * len(token), FONT_SIZE)))
+            left += char_width * (len(token) + 1)
+    return words
+
+
+def render_page(lines: List[str]) -> Image.Image:
+    image = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=FONT_SIZE)
+    for i, line in enumerate(lines):
+        draw.text((MARGIN, MARGIN + i * LINE_HEIGHT), line, fill="black", font=font)
+    return image
+
+
+def generate_corpus(out_dir: str, count: int = 12, max_pages: int = 3, seed: int = 7,
+                    fmt: str = "pdf") -> str:
+    """Write `count` documents and a manifest.jsonl (file_path, doc_type, truth); returns the manifest path."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.jsonl")
+    with open(manifest_path, "w", encoding="utf-8") as manifest:
+        for n in range(count):
+            doc_type = DOC_TYPES[n % len(DOC_TYPES)]
+            pages = rng.randint(1, max_pages) if fmt == "pdf" else 1
+            fields = make_fields(doc_type, rng, items=rng.randint(3, 12) * pages)
+            images = [render_page(page_lines(doc_type, fields, p, pages)) for p in range(pages)]
+            name = f"{doc_type}_{n:04d}.{fmt}"
+            path = os.path.join(out_dir, name)
+            if fmt == "pdf":
+                images[0].save(path, save_all=True, append_images=images[1:], resolution=200)
+            else:
+                images[0].save(path)
+            truth = {k: v for k, v in fields.items() if isinstance(v, str)}
+            manifest.write(json.dumps({"id": name, "file_path": name, "doc_type": doc_type, "truth": truth}) + "\n")
+    return manifest_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic document corpus")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=12)
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--format", choices=["pdf", "png"], default="pdf")
+    args = parser.parse_args()
+    print(generate_corpus(args.out_dir, args.count, args.max_pages, fmt=args.format))
@@ -0,0 +1,210 @@
+"""Local stand-ins for the OCR.space HTTP API and the Gemini chat model."""
+import hashlib
+import json
+import random
+import threading
+import time
+import typing
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from corpus import DOC_TYPES, layout_words, make_fields, page_lines
+
+
+@dataclass
+class ServiceProfile:
+    """Latency and failure behaviour of a fake service."""
+    latency: float = 0.2
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    # Requests per minute accepted before answering 429, like a provider quota; 0 means unlimited.
+    rpm: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def outcome(self) -> str:
+        """"ok", "throttled" (HTTP 429) or "error" (HTTP 500)."""
+        with self._lock:
+            roll = self._rng.random()
+            if self.rpm > 0:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm:
+                    return "throttled"
+                self._recent.append(now)
+        if roll < self.throttle_rate:
+            return "throttled"
+        if roll < self.throttle_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.bytes_in = 0
+
+    def add(self, failed: bool, size: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += int(failed)
+            self.bytes_in += size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "failures": self.failures, "bytes_in": self.bytes_in}
+
+
+def fake_ocr_response(payload: bytes) -> dict:
+    """OCR.space-shaped response for a synthetic page chosen deterministically from the upload."""
+    seed = int(hashlib.sha1(payload).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    doc_type = DOC_TYPES[seed % len(DOC_TYPES)]
+    fields = make_fields(doc_type, rng, items=rng.randint(3, 12))
+    lines = page_lines(doc_type, fields, 0, 1)
+    words = layout_words(lines)
+    overlay, cursor = [], 0
+    for line in lines:
+        count = len([t for t in line.split(" ") if t])
+        line_words = words[cursor:cursor + count]
+        cursor += count
+        if not line_words:
+            continue
+        overlay.append({
+            "LineText": line,
+            "Words": [
+                {"WordText": text, "Left": left, "Top": top, "Width": width, "Height": height}
+                for text, (left, top, width, height) in line_words
+            ],
+            "MaxHeight": max(w[1][3] for w in line_words),
+            "MinTop": min(w[1][1] for w in line_words),
+        })
+    return {
+        "ParsedResults": [{
+            "ParsedText": "\n".join(lines),
+            "TextOverlay": {"Lines": overlay, "HasOverlay": True},
+        }],
+        "IsErroredOnProcessing": False,
+    }
+
+
+class FakeOCRServer:
+    """Threaded HTTP server mimicking POST /parse/image of OCR.space."""
+
+    def __init__(self, profile: ServiceProfile = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or ServiceProfile()
+        self.counters = _Counters()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                time.sleep(server.profile.delay())
+                outcome = server.profile.outcome()
+                server.counters.add(outcome != "ok", length)
+                if outcome == "throttled":
+                    self._send(429, {"ErrorMessage": "Rate limit exceeded"})
+                elif outcome == "error":
+                    self._send(500, {"ErrorMessage": "Internal error"})
+                else:
+                    self._send(200, fake_ocr_response(body))
+
+            def _send(self, status: int, payload: dict) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/parse/image"
+
+    def __enter__(self) -> "FakeOCRServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+class FakeChatModel:
+    """Drop-in for ChatGoogleGenerativeAI supporting invoke() and with_structured_output()."""
+
+    counters = _Counters()
+
+    def __init__(self, profile: ServiceProfile = None, **kwargs):
+        self.profile = profile or ServiceProfile(latency=0.5, jitter=0.1)
+
+    def _call(self) -> None:
+        time.sleep(self.profile.delay())
+        outcome = self.profile.outcome()
+        FakeChatModel.counters.add(outcome != "ok")
+        if outcome == "throttled":
+            raise FakeLLMError("429 Resource has been exhausted")
+        if outcome == "error":
+            raise FakeLLMError("500 Internal error")
+
+    @staticmethod
+    def _text(messages) -> str:
+        if isinstance(messages, str):
+            return messages
+        return "\n".join(getattr(m, "content", str(m)) for m in messages)
+
+    def invoke(self, messages):
+        self._call()
+        text = self._text(messages).lower()
+        label = next((t for t in ("prescription", "patient statement", "invoice") if t in text), "invoice")
+        return SimpleNamespace(content={"patient statement": "medical_bill"}.get(label, label))
+
+    def with_structured_output(self, schema):
+        return _FakeStructured(self, schema)
+
+
+class _FakeStructured:
+    def __init__(self, model: FakeChatModel, schema):
+        self.model = model
+        self.schema = schema
+
+    def invoke(self, messages):
+        self.model._call()
+        values = {}
+        for name, info in self.schema.model_fields.items():
+            if typing.get_origin(info.annotation) is typing.Literal:
+                values[name] = typing.get_args(info.annotation)[0]
+            elif "date" in name or "dob" in name:
+                values[name] = "2024-01-15"
+            elif any(k in name for k in ("amount", "total", "charges")):
+                values[name] = "$1,234.00"
+            else:
+                values[name] = f"{name} value"
+        return self.schema(**values)
@@ -0,0 +1,81 @@
+"""Measure and enforce cold import times of the app modules.
+
+    python benchmarks/import_times.py            # exits 1 when a budget is exceeded
+
+Each module is imported in a fresh interpreter without API keys; the import
+must succeed, stay within its time budget and leave the heavy SDKs unloaded.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+# Cumulative import time budgets in seconds, measured with `python -X importtime`.
+IMPORT_BUDGETS = {
+    "schemas": 0.4,
+    "confidence": 0.4,
+    "extraction": 0.5,
+    "document_processor": 0.6,
+    "agent_loop": 0.75,
+}
+# Loaded on first API call only.
+DEFERRED_MODULES = ["langchain_google_genai", "langchain_core", "google.genai", "requests", "dotenv"]
+RUNS = 3
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$")
+
+
+def measure(module: str) -> Dict:
+    """Best-of-RUNS cumulative import time and the deferred modules the import loaded."""
+    env = {k: v for k, v in os.environ.items() if k not in ("OCR_API_KEY", "GOOGLE_API_KEY")}
+    probe = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    best, loaded, error = None, [], None
+    for _ in range(RUNS):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                              cwd=APP_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            break
+        loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+        for line in proc.stderr.splitlines():
+            match = _IMPORTTIME_RE.match(line)
+            if match and match.group(2).strip() == module:
+                seconds = int(match.group(1)) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return {"seconds": best, "deferred_loaded": loaded, "error": error}
+
+
+def check(budgets: Dict[str, float] = IMPORT_BUDGETS) -> Dict:
+    results = {}
+    for module, budget in budgets.items():
+        result = measure(module)
+        result["budget_s"] = budget
+        result["ok"] = (
+            result["error"] is None
+            and not result["deferred_loaded"]
+            and result["seconds"] is not None
+            and result["seconds"] <= budget
+        )
+        results[module] = result
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check app module import times against budgets")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, e.g. for slow CI runners")
+    args = parser.parse_args(argv)
+    results = check({module: budget * args.scale for module, budget in IMPORT_BUDGETS.items()})
+    print(json.dumps(results, indent=2))
+    return 0 if all(r["ok"] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
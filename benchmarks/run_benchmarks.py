@@ -0,0 +1,330 @@
+"""Offline pipeline benchmarks against a fake OCR server and a fake chat model.
+
+    python benchmarks/run_benchmarks.py --docs 12 --out benchmarks/results/latest.json
+
+Every scenario runs `agentic_extraction` end to end; only the network services are replaced.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "app")
+for _path in (BENCH_DIR, APP_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from corpus import generate_corpus
+from fake_services import FakeChatModel, FakeOCRServer, ServiceProfile
+
+SCENARIOS = ["latency", "throughput", "pipeline", "memory", "cache", "incremental", "imports"]
+# Invoice fields plus one that no earlier pass extracted.
+INCREMENTAL_FIELDS = ["vendor_name", "invoice_number", "total_amount", "purchase_order_number"]
+
+
+def configure_env(ocr_url: str, args: argparse.Namespace) -> None:
+    """Settings the app modules read at import time; must run before they are imported."""
+    os.environ.update({
+        "OCR_API_KEY": "benchmark",
+        "GOOGLE_API_KEY": "benchmark",
+        "OCR_API_ENDPOINT": ocr_url,
+        "OCR_ENGINE": "ocrspace",
+        "OCR_REQUESTS_PER_SECOND": str(args.ocr_rps),
+        "OCR_BURST": str(max(1, int(args.ocr_rps))),
+        # Scenarios opt into caching explicitly so cold timings stay cold.
+        "OCR_CACHE_ENABLED": "false",
+        "LLM_CACHE_BACKEND": "none",
+        "ARTIFACT_STORE_ENABLED": "false",
+        "TEMPLATES_ENABLED": "false",
+        "CLASSIFIER_MODEL_PATH": os.path.join(args.work_dir, "classifier.json"),
+        "SCHEDULER_DB_PATH": os.path.join(args.work_dir, "scheduler.sqlite3"),
+        "LLM_RPM": str(args.llm_quota_rpm),
+        # Also measure each page's size before preprocessing (one extra JPEG encode per page).
+        "OCR_PREPROCESS_REPORT": "true",
+    })
+
+
+def install_fake_llm(profile: ServiceProfile) -> None:
+    import clients
+    clients.set_chat_model_factory(functools.partial(FakeChatModel, profile=profile))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(durations),
+        "mean_s": statistics.fmean(durations) if durations else 0.0,
+        "p50_s": percentile(durations, 50),
+        "p95_s": percentile(durations, 95),
+        "max_s": max(durations, default=0.0),
+    }
+
+
+def load_jobs(manifest_path: str) -> List[Dict]:
+    base = os.path.dirname(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        record["file_path"] = os.path.join(base, record["file_path"])
+    return records
+
+
+def timed_extraction(job: Dict, **options) -> Dict:
+    from agent_loop import agentic_extraction
+    start = time.perf_counter()
+    try:
+        agentic_extraction(job["file_path"], **options)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"id": job["id"], "elapsed_s": time.perf_counter() - start, "error": error}
+
+
+def scenario_latency(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    """One document at a time; the pipeline's own parallelism is the only concurrency."""
+    runs = [timed_extraction(job) for job in jobs]
+    ok = [r["elapsed_s"] for r in runs if r["error"] is None]
+    return {**summarize(ok), "errors": sum(1 for r in runs if r["error"])}
+
+
+def scenario_throughput(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        runs = list(pool.map(timed_extraction, jobs))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in runs if r["error"] is None)
+    return {
+        "workers": args.workers,
+        "docs": len(runs),
+        "errors": len(runs) - ok,
+        "elapsed_s": elapsed,
+        "docs_per_min": ok / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+def scenario_pipeline(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    """The same documents one after another, then through the async pipeline with the stages overlapping."""
+    from async_pipeline import (extract_many, OCR_STAGE_CONCURRENCY, CLASSIFY_STAGE_CONCURRENCY,
+                                EXTRACT_STAGE_CONCURRENCY)
+
+    start = time.perf_counter()
+    serial = [timed_extraction(job) for job in jobs]
+    serial_s = time.perf_counter() - start
+    start = time.perf_counter()
+    pipelined = extract_many(jobs)
+    pipelined_s = time.perf_counter() - start
+    serial_ok = sum(1 for r in serial if r["error"] is None)
+    pipelined_ok = sum(1 for _, _, error in pipelined if error is None)
+    return {
+        "docs": len(jobs),
+        "stage_concurrency": {"ocr": OCR_STAGE_CONCURRENCY, "classify": CLASSIFY_STAGE_CONCURRENCY,
+                              "extract": EXTRACT_STAGE_CONCURRENCY},
+        "errors": len(jobs) - pipelined_ok,
+        "serial_docs_per_min": serial_ok / serial_s * 60 if serial_s > 0 else 0.0,
+        "pipelined_docs_per_min": pipelined_ok / pipelined_s * 60 if pipelined_s > 0 else 0.0,
+        "speedup": serial_s / pipelined_s if pipelined_s > 0 else 0.0,
+    }
+
+
+def scenario_memory(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    """Runs in a fresh interpreter so the peak RSS is not polluted by earlier scenarios."""
+    command = [sys.executable, os.path.abspath(__file__), "--memory-child", "--manifest", args.manifest,
+               "--work-dir", args.work_dir, "--ocr-latency", str(args.ocr_latency),
+               "--llm-latency", str(args.llm_latency), "--ocr-rps", str(args.ocr_rps)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def memory_child(jobs: List[Dict]) -> Dict:
+    tracemalloc.start()
+    runs = [timed_extraction(job) for job in jobs]
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb //= 1024
+    return {
+        "docs": len(runs),
+        "errors": sum(1 for r in runs if r["error"]),
+        "peak_rss_mb": rss_kb / 1024,
+        "peak_python_heap_mb": traced_peak / (1024 * 1024),
+    }
+
+
+def scenario_cache(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    """Same documents twice with the OCR and LLM caches on: cold fills, warm should hit."""
+    import document_processor
+    import extraction
+    from llm_cache import LLMCache, MemoryBackend
+    from ocr_cache import OCRCache
+
+    ocr_cache = OCRCache(directory=tempfile.mkdtemp(dir=args.work_dir, prefix="ocr-cache-"))
+    llm_cache = LLMCache(MemoryBackend())
+    saved = document_processor.ocr_cache, extraction.llm_cache
+    document_processor.ocr_cache, extraction.llm_cache = ocr_cache, llm_cache
+    try:
+        passes = {}
+        for name in ("cold", "warm"):
+            ocr_before = _ocr_requests()
+            llm_before = FakeChatModel.counters.snapshot()["requests"]
+            runs = [timed_extraction(job) for job in jobs]
+            passes[name] = {
+                **summarize([r["elapsed_s"] for r in runs if r["error"] is None]),
+                "errors": sum(1 for r in runs if r["error"]),
+                "ocr_requests": _ocr_requests() - ocr_before,
+                "llm_requests": FakeChatModel.counters.snapshot()["requests"] - llm_before,
+            }
+        passes["ocr_cache"] = ocr_cache.stats()
+        passes["llm_cache"] = {"hits": llm_cache.hits, "misses": llm_cache.misses}
+        return passes
+    finally:
+        document_processor.ocr_cache, extraction.llm_cache = saved
+
+
+def scenario_incremental(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    """Full run, then the default fields plus one new field with the artifact store on: only the new field is extracted."""
+    import agent_loop
+    from artifact_store import ArtifactStore
+
+    saved = agent_loop.artifact_store
+    agent_loop.artifact_store = ArtifactStore(directory=tempfile.mkdtemp(dir=args.work_dir, prefix="artifacts-"))
+    try:
+        passes = {}
+        for name, fields in (("full", None), ("added_field", INCREMENTAL_FIELDS), ("repeat", INCREMENTAL_FIELDS)):
+            ocr_before = _ocr_requests()
+            llm_before = FakeChatModel.counters.snapshot()["requests"]
+            runs = [timed_extraction(job, fields=fields) for job in jobs]
+            passes[name] = {
+                **summarize([r["elapsed_s"] for r in runs if r["error"] is None]),
+                "errors": sum(1 for r in runs if r["error"]),
+                "ocr_requests": _ocr_requests() - ocr_before,
+                "llm_requests": FakeChatModel.counters.snapshot()["requests"] - llm_before,
+            }
+        return passes
+    finally:
+        agent_loop.artifact_store = saved
+
+
+def scenario_imports(jobs: List[Dict], args: argparse.Namespace) -> Dict:
+    from import_times import check
+    return check()
+
+
+_ocr_server = None
+
+
+def _ocr_requests() -> int:
+    return _ocr_server.counters.snapshot()["requests"] if _ocr_server else 0
+
+
+RUNNERS = {
+    "latency": scenario_latency,
+    "throughput": scenario_throughput,
+    "pipeline": scenario_pipeline,
+    "memory": scenario_memory,
+    "cache": scenario_cache,
+    "incremental": scenario_incremental,
+    "imports": scenario_imports,
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run offline extraction benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--docs", type=int, default=12, help="Synthetic documents to generate")
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--format", choices=["pdf", "png", "auto"], default="auto",
+                        help="PDF needs poppler installed; auto falls back to PNG without it")
+    parser.add_argument("--manifest", help="Use an existing corpus manifest instead of generating one")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ocr-latency", type=float, default=0.3)
+    parser.add_argument("--ocr-error-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-rps", type=float, default=50.0)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--llm-server-rpm", type=float, default=0.0,
+                        help="Quota enforced by the fake model (429 beyond it); 0 is unlimited")
+    parser.add_argument("--llm-quota-rpm", type=float, default=6000,
+                        help="LLM_RPM the pipeline schedules against")
+    parser.add_argument("--work-dir", help="Scratch directory (default: a temporary directory)")
+    parser.add_argument("--out", help="Write results JSON here as well as stdout")
+    parser.add_argument("--memory-child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict:
+    global _ocr_server
+    args = parse_args(argv)
+    cleanup = not args.work_dir
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="docbench-")
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "pdf" if shutil.which("pdftoppm") else "png"
+    if not args.manifest:
+        args.manifest = generate_corpus(os.path.join(args.work_dir, "corpus"), args.docs, args.max_pages, fmt=fmt)
+    jobs = load_jobs(args.manifest)
+
+    ocr_profile = ServiceProfile(args.ocr_latency, args.ocr_latency / 5, args.ocr_error_rate, args.ocr_throttle_rate)
+    llm_profile = ServiceProfile(args.llm_latency, args.llm_latency / 5, args.llm_error_rate,
+                                 args.llm_throttle_rate, args.llm_server_rpm, seed=1)
+    try:
+        with FakeOCRServer(ocr_profile) as server:
+            _ocr_server = server
+            configure_env(server.url, args)
+            install_fake_llm(llm_profile)
+            if args.memory_child:
+                print(json.dumps(memory_child(jobs)))
+                return {}
+            results = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": {k: v for k, v in vars(args).items() if k not in ("memory_child", "work_dir")},
+                "corpus": {"documents": len(jobs), "format": fmt},
+                "scenarios": {},
+            }
+            for name in args.scenarios:
+                start = time.perf_counter()
+                results["scenarios"][name] = RUNNERS[name](jobs, args)
+                results["scenarios"][name]["wall_s"] = time.perf_counter() - start
+            from preprocessing import upload_stats
+            results["services"] = {"ocr": server.counters.snapshot(), "llm": FakeChatModel.counters.snapshot(),
+                                   "ocr_uploads": upload_stats.summary()}
+    finally:
+        _ocr_server = None
+        if cleanup:
+            shutil.rmtree(args.work_dir, ignore_errors=True)
+    output = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
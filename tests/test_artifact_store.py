@@ -0,0 +1,37 @@
+import os
+
+from artifact_store import ArtifactStore
+
+
+def make_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(f"document {i}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def test_artifacts_saved_by_another_instance_are_loaded(tmp_path):
+    directory = str(tmp_path / "store")
+    reader, writer = ArtifactStore(directory), ArtifactStore(directory)
+    (path,) = make_files(tmp_path, 1)
+    assert reader.load(path).doc_type("v1") is None
+    artifacts = writer.load(path)
+    artifacts.set_doc_type("v1", "invoice")
+    writer.save(artifacts)
+    assert reader.load(path).doc_type("v1") == "invoice"
+
+
+def test_document_cap_holds_across_instances(tmp_path):
+    directory = str(tmp_path / "store")
+    stores = [ArtifactStore(directory, max_documents=10) for _ in range(3)]
+    paths = make_files(tmp_path, 40)
+    for i, path in enumerate(paths):
+        store = stores[i % 3]
+        artifacts = store.load(path)
+        artifacts.set_doc_type("v1", "invoice")
+        store.save(artifacts)
+    stored = [name for _, _, files in os.walk(directory) for name in files if name.endswith(".json")]
+    assert 0 < len(stored) <= 10
+    assert stores[0].load(paths[-1]).doc_type("v1") == "invoice"
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+import async_pipeline
+from schemas import ExtractionResult
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    calls = {"saved": [], "result_threads": set()}
+
+    def process_stage(file_path, artifacts):
+        if file_path == "broken.pdf":
+            raise ValueError("unreadable")
+        return f"doc:{file_path}"
+
+    def result_stage(processed_doc, doc_type, values, agreement, templated):
+        calls["result_threads"].add(threading.get_ident())
+        return ExtractionResult(doc_type=doc_type, fields=[])
+
+    monkeypatch.setattr(async_pipeline, "open_artifacts", lambda file_path, reuse: {"file": file_path})
+    monkeypatch.setattr(async_pipeline, "save_artifacts",
+                        lambda file_path, artifacts: calls["saved"].append(artifacts["file"]))
+    monkeypatch.setattr(async_pipeline, "process_stage", process_stage)
+    monkeypatch.setattr(async_pipeline, "detect_stage", lambda doc, auto_detect, mode, artifacts: (None, "invoice"))
+    monkeypatch.setattr(async_pipeline, "fields_stage",
+                        lambda doc, doc_type, template, fields, auto_detect, mode, artifacts: (doc_type, {}, {}, {}))
+    monkeypatch.setattr(async_pipeline, "result_stage", result_stage)
+    return calls
+
+
+def test_every_document_comes_out_and_is_saved(stages):
+    jobs = [{"file_path": f"{i}.pdf"} for i in range(10)] + [{"file_path": "broken.pdf"}]
+    out = async_pipeline.extract_many(jobs, ocr_concurrency=2, classify_concurrency=2, extract_concurrency=2,
+                                      queue_size=1, timings=True)
+    assert sorted(job["file_path"] for job, _, _ in out) == sorted(job["file_path"] for job in jobs)
+    errors = {job["file_path"]: error for job, _, error in out if error is not None}
+    assert list(errors) == ["broken.pdf"] and isinstance(errors["broken.pdf"], ValueError)
+    assert all(result.timings is not None and "total" in result.timings for _, result, error in out if error is None)
+    # Artifacts are saved for failed documents too.
+    assert sorted(stages["saved"]) == sorted(job["file_path"] for job in jobs)
+
+
+def test_results_are_built_off_the_event_loop(stages):
+    async_pipeline.extract_many([{"file_path": "a.pdf"}])
+    assert threading.get_ident() not in stages["result_threads"]
@@ -0,0 +1,21 @@
+from ocr_cache import OCRCache
+
+
+def test_entries_written_by_another_instance_are_hits(tmp_path):
+    reader, writer = OCRCache(str(tmp_path)), OCRCache(str(tmp_path))
+    key = "ab" * 32
+    assert reader.get(key) is None
+    writer.put(key, {"ParsedResults": []})
+    assert reader.get(key) == {"ParsedResults": []}
+    assert (reader.hits, reader.misses) == (1, 1)
+
+
+def test_size_cap_holds_across_instances(tmp_path):
+    caches = [OCRCache(str(tmp_path), max_bytes=10_000) for _ in range(3)]
+    for i in range(300):
+        caches[i % 3].put(f"{i:064x}", {"text": "x" * 100})
+    stats = caches[0].stats()
+    assert stats["bytes"] <= 10_000
+    assert sum(cache.evictions for cache in caches) > 0
+    # The most recent entry survives eviction.
+    assert caches[1].get(f"{299:064x}") is not None
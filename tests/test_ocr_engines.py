@@ -0,0 +1,66 @@
+import pytest
+
+from ocr_engines import FallbackOCREngine, OCREngine
+
+
+def response(text, confidence=None, exit_code=1):
+    word = {"WordText": text}
+    if confidence is not None:
+        word["Confidence"] = confidence
+    return {
+        "ParsedResults": [{"ParsedText": text, "TextOverlay": {"Lines": [{"LineText": text, "Words": [word]}]}}],
+        "OCRExitCode": exit_code,
+        "IsErroredOnProcessing": False,
+    }
+
+
+class StubEngine(OCREngine):
+    def __init__(self, name, result):
+        self.name = name
+        self.result = result
+        self.calls = 0
+
+    def recognize(self, image):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+TEXT = "INVOICE No: 1234 Total due 99.00"
+
+
+def run(primary_result, fallback_result=None):
+    primary = StubEngine("ocrspace", primary_result)
+    fallback = StubEngine("tesseract", fallback_result or response(TEXT, 0.95))
+    return FallbackOCREngine(primary, fallback).recognize(None), fallback.calls
+
+
+def test_ocrspace_page_without_confidence_is_kept():
+    result, calls = run(response(TEXT))
+    assert calls == 0
+    assert result["ParsedResults"][0]["ParsedText"] == TEXT
+
+
+@pytest.mark.parametrize("primary_result", [
+    response(""),
+    response("  - \n"),
+    response(TEXT, exit_code=3),
+    response(TEXT, confidence=0.3),
+    RuntimeError("OCR API failed"),
+])
+def test_unusable_primary_page_goes_to_fallback(primary_result):
+    result, calls = run(primary_result)
+    assert calls == 1
+    assert result["ParsedResults"][0]["TextOverlay"]["Lines"][0]["Words"][0]["Confidence"] == 0.95
+
+
+def test_primary_result_kept_when_fallback_fails():
+    result, calls = run(response(""), RuntimeError("tesseract missing"))
+    assert calls == 1
+    assert result["ParsedResults"][0]["ParsedText"] == ""
+
+
+def test_error_raised_when_both_engines_fail():
+    with pytest.raises(RuntimeError, match="tesseract missing"):
+        run(RuntimeError("OCR API failed"), RuntimeError("tesseract missing"))
@@ -0,0 +1,45 @@
+from PIL import Image, ImageDraw, ImageFont
+
+from page_filter import PageFilter, BLANK, DUPLICATE, SPARSE
+
+PAGE_SIZE = (2550, 3300)  # US letter at 300 DPI
+
+
+def render(lines, top=200):
+    image = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=40)
+    for i, line in enumerate(lines):
+        draw.text((200, top + i * 60), line, fill="black", font=font)
+    return image
+
+
+def dense_page(seed):
+    return render([f"Item {seed}-{i}   Qty {i % 9 + 1}   ${i * 13.5:,.2f}" for i in range(45)])
+
+
+def test_white_page_is_blank():
+    assert PageFilter().check(0, Image.new("RGB", PAGE_SIZE, "white")) == (BLANK, None)
+
+
+def test_sparse_last_page_is_ocrd():
+    page_filter = PageFilter()
+    page_filter.check(0, dense_page(0))
+    last = render(["Page 3 of 3", "Total Due: $1,234.00", "Thank you"], top=2800)
+    assert page_filter.check(1, last) == (SPARSE, None)
+
+
+def test_single_line_is_not_blank():
+    assert PageFilter().check(0, render(["Total Due: $1,234.00"]))[0] == SPARSE
+
+
+def test_sparse_pages_are_never_duplicates():
+    page_filter = PageFilter()
+    assert page_filter.check(0, render(["Total Due: $1,234.00"]))[0] == SPARSE
+    assert page_filter.check(1, render(["Total Due: $9,876.00"]))[0] == SPARSE
+
+
+def test_repeated_dense_page_is_duplicate():
+    page_filter = PageFilter()
+    assert page_filter.check(0, dense_page(0)) == (None, None)
+    assert page_filter.check(1, dense_page(0)) == (DUPLICATE, 0)
@@ -0,0 +1,30 @@
+import pytest
+
+from pre_extraction import pre_extract
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("INVOICE 2024-01-15\nInvoice No: INV-2024-001", {"invoice_number": "INV-2024-001"}),
+    ("Invoice # 10042", {"invoice_number": "10042"}),
+    ("Invoice: A-77", {"invoice_number": "A-77"}),
+    ("INVOICE 2024-01-15", {}),
+    ("INVOICE 01/15/2024\nBill To: ACME 42", {}),
+    ("Invoice Number: 01/15/2024", {}),
+])
+def test_invoice_number(text, expected):
+    assert pre_extract(text, ["invoice_number"]) == expected
+
+
+def test_heading_date_is_not_an_identifier():
+    text = "STATEMENT 01/15/2024\nAccount No: 88-1234\nStatement Date: 01/15/2024"
+    assert pre_extract(text, ["bill_number", "bill_date"]) == {"bill_number": "88-1234", "bill_date": "2024-01-15"}
+
+
+def test_invoice_header_fields():
+    text = "INVOICE\nInvoice No.: INV-42\nInvoice Date: 03/05/2024\nDue Date: 04/04/2024\nTotal: $1,250.00"
+    assert pre_extract(text, ["invoice_number", "invoice_date", "due_date", "total_amount"]) == {
+        "invoice_number": "INV-42",
+        "invoice_date": "2024-03-05",
+        "due_date": "2024-04-04",
+        "total_amount": "$1,250.00",
+    }
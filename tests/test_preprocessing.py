@@ -0,0 +1,40 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from preprocessing import prepare_for_upload, map_overlay_to_source
+
+PAGE_SIZE = (2550, 3300)
+MARKER = (2000, 2900, 2300, 2930)
+
+
+def skewed_page(angle):
+    image = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(40):
+        draw.rectangle((300, 300 + i * 70, 1200, 330 + i * 70), fill="black")
+    draw.rectangle(MARKER, fill="black")
+    return image.rotate(angle, fillcolor="white")
+
+
+def ink_box(mask, left=0):
+    ys, xs = np.nonzero(mask[:, left:])
+    return xs.min() + left, ys.min(), xs.max() + left, ys.max()
+
+
+@pytest.mark.parametrize("angle", [-2.5, 1.5])
+def test_boxes_map_back_through_deskew(angle):
+    page = skewed_page(angle)
+    truth = ink_box(np.asarray(page.convert("L")) < 128, left=1700)
+    prepared = prepare_for_upload(page, report=False)
+    assert prepared.angle != 0
+    uploaded = np.asarray(Image.open(io.BytesIO(prepared.payload))) < 128
+    # The marker is the only ink right of the text block.
+    left, top, right, bottom = ink_box(uploaded, left=int(uploaded.shape[1] * 0.6))
+    word = {"Left": int(left), "Top": int(top), "Width": int(right - left), "Height": int(bottom - top)}
+    result = {"ParsedResults": [{"TextOverlay": {"Lines": [{"Words": [word]}]}}]}
+    mapped = map_overlay_to_source(result, prepared)["ParsedResults"][0]["TextOverlay"]["Lines"][0]["Words"][0]
+    box = (mapped["Left"], mapped["Top"], mapped["Left"] + mapped["Width"], mapped["Top"] + mapped["Height"])
+    assert np.abs(np.subtract(box, truth)).max() <= 4
@@ -0,0 +1,31 @@
+import pytest
+
+from results_export import export_results, summary_path
+from schemas import ExtractionResult, FieldSchema, QAReport
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_fields_without_location_export_null(tmp_path):
+    result = ExtractionResult(
+        doc_type="invoice",
+        fields=[
+            FieldSchema(name="total_amount", value="$27.00", confidence=0.9,
+                        source={"page": 2, "bbox": [10, 20, 110, 40]}),
+            FieldSchema(name="due_date", value="", confidence=0.0),
+        ],
+        qa=QAReport(passed_rules=["amount_format_total_amount"]),
+    )
+    out = tmp_path / "fields.parquet"
+    export_results([("doc-1", result)], str(out))
+
+    rows = {row["field"]: row for row in pq.read_table(out).to_pylist()}
+    located, missing = rows["total_amount"], rows["due_date"]
+    assert (located["page"], located["bbox_x0"], located["bbox_y1"]) == (2, 10, 40)
+    assert located["rules_passed"] == ["amount_format_total_amount"]
+    assert missing["page"] is None
+    assert [missing[f"bbox_{c}"] for c in ("x0", "y0", "x1", "y1")] == [None] * 4
+
+    summary = {row["field"]: row for row in pq.read_table(summary_path(str(out))).to_pylist()}
+    assert summary["due_date"]["fill_rate"] == 0.0
+    assert summary["total_amount"]["fill_rate"] == 1.0
@@ -0,0 +1,99 @@
+import datetime
+
+import pytest
+
+from utils.helpers import parse_amount, parse_date
+from validation import compile_plan, line_items_total, validate_batch
+
+INVOICE = {
+    "invoice_date": "01/15/2024",
+    "due_date": "02/14/2024",
+    "line_items": "Widget x2 $20.00; Gadget $5",
+    "subtotal": "$25.00",
+    "tax_amount": "$2.00",
+    "shipping_charges": "",
+    "discount": "",
+    "total_amount": "$27.00",
+}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("$1,234.50", 1234.5),
+    ("1234.5 USD", 1234.5),
+    ("EUR 10", 10.0),
+    ("-$5", -5.0),
+    ("12 apples", None),
+    ("", None),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+def test_parse_date():
+    assert parse_date("01/15/2024") == datetime.date(2024, 1, 15)
+    assert parse_date("2024-01-15") == datetime.date(2024, 1, 15)
+    assert parse_date("not a date") is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Widget $10; Gadget $5.00", 15.0),
+    ("Widget  Qty 2  $5.00  $10.00", 10.0),
+    ("Widget x2 @ $25.00  $50.00", 50.0),
+    ("Consulting 1,200.00\nRefund -$5", 1195.0),
+    ("Widget x2 @ $25.00", None),
+    ("Widget $4.00 each", None),
+    ("Widget $10; Gadget", None),
+    ("Widget 2 x 3", None),
+])
+def test_line_items_total(value, expected):
+    assert line_items_total(value) == expected
+
+
+def rules(report):
+    return set(report.passed_rules), set(report.failed_rules)
+
+
+def test_invoice_passes_every_check():
+    passed, failed = rules(compile_plan(tuple(INVOICE)).validate(INVOICE))
+    assert not failed
+    assert {"line_items_sum", "totals_match", "due_date_after_invoice_date",
+            "amount_format_total_amount", "date_format_due_date"} <= passed
+
+
+def test_failed_checks():
+    extraction = dict(INVOICE, total_amount="$30.00", due_date="01/01/2024", subtotal="lots")
+    passed, failed = rules(compile_plan(tuple(extraction)).validate(extraction))
+    assert "due_date_after_invoice_date" in failed
+    assert "totals_match" not in passed | failed  # the subtotal is unreadable
+    assert "line_items_sum" not in passed | failed
+
+
+def test_line_items_without_totals_are_not_applicable():
+    extraction = dict(INVOICE, line_items="Widget x2 @ $12.50")
+    passed, failed = rules(compile_plan(tuple(extraction)).validate(extraction))
+    assert "line_items_sum" not in passed | failed
+    assert "totals_match" in passed
+
+
+def test_line_items_checked_against_total_without_subtotal():
+    extraction = {key: value for key, value in INVOICE.items() if key != "subtotal"}
+    assert "line_items_sum" in compile_plan(tuple(extraction)).validate(extraction).passed_rules
+    extraction["discount"] = "$1.00"
+    assert "line_items_sum" in compile_plan(tuple(extraction)).validate(extraction).failed_rules
+
+
+def test_batch_matches_single_validation():
+    extractions = [
+        INVOICE,
+        dict(INVOICE, total_amount="$99.00"),
+        {"statement_date": "13/45/2024", "total_amount": "$1"},
+        dict(INVOICE, invoice_date=""),
+    ]
+    batch = validate_batch(extractions)
+    for extraction, report in zip(extractions, batch):
+        single = compile_plan(tuple(extraction)).validate(extraction)
+        assert report.passed_rules == single.passed_rules
+        assert report.failed_rules == single.failed_rules
+    assert "totals_match" in batch[1].failed_rules
+    assert "date_format_statement_date" in batch[2].failed_rules
+    assert "invoice_date" in batch[3].notes
@@ -134,3 +134,12 @@ DEFAULT_FIELDS = {
 
 
 OCR_API_ENDPOINT = "https://api.ocr.space/parse/image"
+
+# Tried in order, so month-first wins for ambiguous dates like 03/04/2024.
+DATE_FORMATS = (
+    "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
+    "%d-%m-%Y", "%m-%d-%Y", "%d.%m.%Y",
+    "%b %d, %Y", "%d %b %Y", "%B %d, %Y", "%d %B %Y"
+)
+
+CURRENCY_CODES = ("USD", "EUR", "GBP", "INR", "CAD", "AUD", "JPY")
@@ -1,6 +1,9 @@
 # File: agentic-document-extraction/utils/helpers.py
 import re
 import datetime
+from functools import lru_cache
+from typing import Optional
+from utils.constants import DATE_FORMATS, CURRENCY_CODES
 
 def clean_text(text: str) -> str:
     """Clean OCR text output"""
@@ -8,34 +11,44 @@ def clean_text(text: str) -> str:
     text = re.sub(r'[^\x20-\x7E]', '', text)  # remove non-printable characters
     return text.strip()
 
-def validate_date(date_str: str) -> bool:
-    """Validate multiple date formats"""
-    formats = [
-        "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
-        "%d-%m-%Y", "%m-%d-%Y", "%d.%m.%Y",
-        "%b %d, %Y", "%d %b %Y", "%B %d, %Y"
-    ]
-    for fmt in formats:
+@lru_cache(maxsize=4096)
+def parse_date(date_str: str) -> Optional[datetime.date]:
+    """Parse a date in any of DATE_FORMATS; None if none of them match"""
+    value = date_str.strip()
+    for fmt in DATE_FORMATS:
         try:
-            datetime.datetime.strptime(date_str, fmt)
-            return True
+            return datetime.datetime.strptime(value, fmt).date()
         except ValueError:
             continue
-    return False
+    return None
+
+def validate_date(date_str: str) -> bool:
+    """Validate multiple date formats"""
+    return parse_date(date_str) is not None
 
 def normalize_date(date_str: str) -> str:
     """Convert various date formats to ISO (YYYY-MM-DD)"""
-    formats = [
-        "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
-        "%d-%m-%Y", "%m-%d-%Y", "%d.%m.%Y",
-        "%b %d, %Y", "%d %b %Y", "%B %d, %Y"
-    ]
-    for fmt in formats:
-        try:
-            return datetime.datetime.strptime(date_str, fmt).strftime("%Y-%m-%d")
-        except ValueError:
-            continue
-    return date_str  # return as-is if not parsed
+    parsed = parse_date(date_str)
+    return parsed.isoformat() if parsed else date_str  # return as-is if not parsed
+
+_AMOUNT = re.compile(
+    rf"^(-)?\s*(?:[$£€¥]|(?:{'|'.join(CURRENCY_CODES)})\s*)?(-)?\s*"
+    rf"(\d{{1,3}}(?:,\d{{3}})+|\d+)(\.\d{{1,2}})?(?:\s*(?:{'|'.join(CURRENCY_CODES)}))?$",
+    re.IGNORECASE
+)
+
+@lru_cache(maxsize=4096)
+def parse_amount(amount_str: str) -> Optional[float]:
+    """Parse a monetary amount like "$1,234.50" or "1234.5 USD"; None if it is not one"""
+    match = _AMOUNT.match(amount_str.strip())
+    if not match:
+        return None
+    value = float(match.group(3).replace(",", "") + (match.group(4) or ""))
+    return -value if match.group(1) or match.group(2) else value
+
+def validate_amount(amount_str: str) -> bool:
+    """Validate a monetary amount"""
+    return parse_amount(amount_str) is not None
 
 def format_confidence(confidence: float) -> str:
     """Format confidence as percentage"""